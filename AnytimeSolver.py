@@ -0,0 +1,138 @@
+"""Module for classes Progress and AnytimeSolver"""
+import time
+from LargeNeighborhoodSearch import LargeNeighborhoodSearch
+from PrioritizedPlanner import PrioritizedPlanner
+
+
+class Progress:
+    """State of anytime search reported to the caller"""
+    def __init__(self, status, elapsed, lower_bound, paths, ct_nodes_expanded, source):
+        """
+        :param status: 'searching' while the search runs, at the end 'solved', 'no_solution', 'timeout' or 'cancelled'
+        :param elapsed: seconds since the search started
+        :param lower_bound: lower bound of sum of costs of any solution
+        :param paths: best solution found so far (incumbent), None if there is none yet
+        :param ct_nodes_expanded: number of expanded CT nodes
+        :param source: name of the method that found the incumbent, None if there is none yet
+        """
+        self.status = status
+        self.elapsed = elapsed
+        self.lower_bound = lower_bound
+        self.paths = paths
+        self.ct_nodes_expanded = ct_nodes_expanded
+        self.source = source
+
+    @property
+    def cost(self):
+        """Sum of costs of incumbent, None if there is none"""
+        return sum(len(path) - 1 for path in self.paths) if self.paths else None
+
+    @property
+    def done(self):
+        return self.status != 'searching'
+
+    def __repr__(self):
+        return (f'Progress({self.status}, {self.elapsed:.2f}s, lower bound {self.lower_bound}, cost {self.cost}, '
+                f'{self.ct_nodes_expanded} CT nodes, source {self.source})')
+
+
+class AnytimeSolver:
+    """Runs HighLevel (or its subclass) within wall clock budget and reports progress while it runs
+       Solution of prioritized planning is found first, so there is an incumbent to use when the budget
+       runs out before the search finishes
+       Search can be stopped from other thread by setting cancel event, or by closing the generator
+       With refine the budget left after the search improves the solution by large neighborhood search,
+       unless it is known to be optimal, refine_share of the budget is kept for it even when the search times out
+    """
+    def __init__(self, solver, fallback=True, interval=0.1, refine=False, refine_share=0.2):
+        """
+        :param solver: HighLevel with loaded instance
+        :param fallback: find solution with prioritized planning before the search
+        :param interval: minimal number of seconds between reported progresses during the search
+        :param refine: improve found solution by LargeNeighborhoodSearch until the time runs out
+        :param refine_share: share of time limit the search leaves for refinement, from 0 to 1, used only with refine
+        """
+        self.solver = solver
+        self.fallback = fallback
+        self.interval = interval
+        self.refine = refine
+        self.refine_share = refine_share
+        self.lns = None  # LargeNeighborhoodSearch of last refinement, its log has cost over time
+
+    def iterate(self, time_limit, cancel=None):
+        """
+        Generator of Progress, the last one is done and holds the best solution found
+        :param time_limit: seconds for the whole search including the fallback
+        :param cancel: threading.Event or other object with is_set(), search stops soon after it is set
+        """
+        started = time.perf_counter()
+        deadline = started + time_limit
+        search_deadline = deadline - self.refine_share * time_limit if self.refine else deadline
+        solver = self.solver
+        paths, source, lower_bound = None, None, 0
+        if self.fallback:
+            planner = PrioritizedPlanner(solver.grid_map, solver.start_coords, solver.end_coords,
+                                         solver.solver.heuristic_cache)
+            paths = planner.plan(deadline=search_deadline, cancel=cancel) or None
+            source = paths and 'prioritized'
+            yield Progress('searching', time.perf_counter() - started, lower_bound, paths, 0, source)
+
+        steps = solver.search(float('inf'), search_deadline - time.perf_counter(), cancel)
+        reported = time.perf_counter()
+        try:
+            while True:
+                try:
+                    expanded = next(steps)
+                except StopIteration as stop:
+                    found = stop.value
+                    break
+                now = time.perf_counter()
+                if now - reported >= self.interval:
+                    reported = now
+                    lower_bound = solver.stats['lower_bound']
+                    yield Progress('searching', now - started, lower_bound, paths, expanded, source)
+        finally:
+            steps.close()
+
+        stats = solver.stats
+        lower_bound = stats['lower_bound']
+        if found:
+            if paths is None or sum(len(path) for path in found) <= sum(len(path) for path in paths):
+                paths, source = found, type(solver).__name__
+            status = 'solved'
+        elif stats['cancelled']:
+            status = 'cancelled'
+        elif stats['timeout'] or time.perf_counter() > search_deadline:
+            status = 'timeout'
+        else:
+            status = 'no_solution'
+        expanded = stats['ct_nodes_expanded']
+        if self.refine and paths and status != 'cancelled' and sum(len(path) - 1 for path in paths) > lower_bound:
+            self.lns = LargeNeighborhoodSearch(solver.grid_map, solver.start_coords, solver.end_coords,
+                                               solver.solver.heuristic_cache)
+            steps = self.lns.search(paths, deadline - time.perf_counter(), cancel=cancel)
+            cost = self.lns.get_cost(paths)
+            try:
+                for paths in steps:
+                    now = time.perf_counter()
+                    if self.lns.stats['cost'] < cost:
+                        cost, source = self.lns.stats['cost'], 'lns'
+                    if now - reported >= self.interval:
+                        reported = now
+                        yield Progress('searching', now - started, lower_bound, list(paths), expanded, source)
+            finally:
+                steps.close()
+            paths = list(paths)
+        yield Progress(status, time.perf_counter() - started, lower_bound, paths, expanded, source)
+
+    def solve(self, time_limit, callback=None, cancel=None):
+        """
+        Runs the search to the end
+        :param callback: function called with every Progress
+        :return: last Progress, its paths are the best solution found or None
+        """
+        progress = None
+        for progress in self.iterate(time_limit, cancel):
+            if callback is not None:
+                callback(progress)
+        return progress
@@ -1,6 +1,7 @@
 """This module impolements Astar algorithm"""
 import heapq
 from Node import Node
+from SearchContext import SearchContext
 
 
 class AstarSolver:
@@ -18,7 +19,8 @@ class AstarSolver:
         self.grid_size = grid
         self.start = start
         self.end = end
-        self.predecessors = {}
+        self.context = None  # SearchContext reused by every run on grid of the same size
+        self.expanded = 0
 
     def get_neighbors(self, pos: Node):
         """
@@ -65,12 +67,14 @@ class AstarSolver:
 
     def get_path(self):
         """Reconstructs path from start to finish"""
-        res = []
-        res.append(self.end.coords())
-        current = self.end
-        while current != self.start:
-            current = self.predecessors[current]
-            res.insert(0, current.coords())
+        grid = self.grid_size
+        start = self.start.y * grid + self.start.x
+        cell = self.end.y * grid + self.end.x
+        res = [self.end.coords()]
+        while cell != start:
+            cell = self.context.parent[cell]
+            res.append((cell % grid, cell // grid))
+        res.reverse()
         return res
 
     def change_config(self, start, end, constraints):
@@ -83,27 +87,45 @@ class AstarSolver:
         """Runs astar algorithm and returns path
            This implementation does not allow returning to a node later on!!!
            Waiting is not implemented
+           Cell (x, y) is integer y * grid + x like in GridMap, prices and predecessors are arrays
+           of SearchContext indexed by cell, they are allocated once and only stamped with new generation for every run
+           and heap holds single integers f * number of cells + cell, so ties are broken
+           by coordinates without comparing any objects
         """
+        grid = self.grid_size
+        size = grid * grid
+        end_x, end_y = self.end.coords()
+        end = end_y * grid + end_x
+        start = self.start.y * grid + self.start.x
+        start_t = self.start.t
+        constraints = self.constraints
+        if self.context is None or self.context.size != size:
+            self.context = SearchContext(size)
+        context = self.context
+        context.reset()
+        stamp, price, generation = context.stamp, context.g, context.generation
+        context.set(start, 0, -1)
+        q = [(abs(self.start.x - end_x) + abs(self.start.y - end_y)) * size + start]
         counter = 0
-        q = []
-        visited = set()
-        closed = set()
-        price = {}
-        heapq.heappush(q, (0, self.start))
-        visited.add(self.start)
-        price[self.start.coords()] = 0
-        while bool(q) and counter < maxiter:
+        while q and counter < maxiter:
             counter += 1
-            _, current = heapq.heappop(q)
-            closed.add(current.coords())
-            if current.coords() == self.end.coords():
-                self.end = current
+            self.expanded = counter
+            f, cell = divmod(heapq.heappop(q), size)
+            y, x = divmod(cell, grid)
+            g = price[cell]
+            if f != g + abs(x - end_x) + abs(y - end_y):
+                continue  # cell was reached again with lower price
+            if cell == end:
+                self.end = Node(x, y, start_t + g)
                 return self.get_path()
-            for neighbor in self.get_neighbors(current):
-                if ((neighbor.coords() in visited) and (price[current.coords()] + 1) >= price[neighbor.coords()]):
+            g += 1
+            t = start_t + g
+            for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                if nx < 0 or ny < 0 or nx >= grid or ny >= grid or constraints.get((nx, ny)) == t:
                     continue
-                visited.add(neighbor.coords())
-                self.predecessors[neighbor] = current
-                price[neighbor.coords()] = price[current.coords()] + 1
-                heapq.heappush(q, (self.heuristic(neighbor, price[neighbor.coords()]), neighbor))
+                neighbor = ny * grid + nx
+                if stamp[neighbor] == generation and g >= price[neighbor]:
+                    continue
+                context.set(neighbor, g, cell)
+                heapq.heappush(q, (g + abs(nx - end_x) + abs(ny - end_y)) * size + neighbor)
         return False
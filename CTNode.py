@@ -1,63 +1,169 @@
 """Module for class CTNode"""
-from Node import Node
+import sys
+from ConflictDetector import ConflictDetector
+from ConstraintTable import ConstraintTable
 
 class CTNode:
     """Class for representing node in Constraint tree in Conflict-based search algorighm
        Node has path for each agent seaprately, constraints for each agent and price of the node
+       Child nodes do not copy anything from their parent, they keep reference to it and store only
+       the one constraint and the one path that differ. Paths are never modified in place, so they
+       can be shared between all nodes of the tree.
     """
-    def __init__(self, constraints):
-        self.constraints = constraints
-        self.paths = []
-        self.cost = None
+    def __init__(self, constraints=None, parent=None, agent=None, constraint=None, path=None, conflict_pairs=None):
+        """
+        :param constraints: list with constraints for each agent, used only for root node
+        :param parent: parent CTNode, child inherits all of its constraints and paths
+        :param agent: number of agent that has new constraint in this node
+        :param constraint: the new vertex (Node) or edge ((Node, Node)) constraint of agent or list of them,
+                           None if only path of agent changed (conflict bypass)
+        :param path: path of agent replanned with the new constraint
+        :param conflict_pairs: dictionary with conflicting pair of agents as key and number of conflicts as value
+        """
+        self.parent = parent
+        self.agent = agent
+        self.constraint = constraint
+        self.path = path
+        self._constraint_cache = {}
+        self.conflict_pairs = None
+        self.num_of_conflicts = None
+        if conflict_pairs is not None:
+            self.set_conflict_pairs(conflict_pairs)
+        if parent is None:
+            self.constraints = constraints if constraints is not None else []
+            self._paths = []
+            self.cost = None
+        else:
+            self.constraints = None
+            self._paths = None
+            self.cost = parent.get_cost() - len(parent.get_path(agent)) + len(path)
 
     def __lt__(self,other):
         return self.get_cost() < other.get_cost()
 
+    @property
+    def paths(self):
+        """List of paths of all agents, built from parent only when it is first needed (node is expanded)"""
+        if self._paths is None:
+            paths = list(self.parent.paths)
+            paths[self.agent] = self.path
+            self._paths = paths
+        return self._paths
+
+    @paths.setter
+    def paths(self, paths):
+        self._paths = paths
+        self.cost = None
+
     def set_path(self, path):
         """Used when solving paths for root CT_node"""
-        self.paths.append(path)
+        self._paths.append(path)
+        self.cost = None
+
+    def set_conflict_pairs(self, conflict_pairs):
+        """Stores conflicting pairs of agents found by ConflictTable"""
+        self.conflict_pairs = conflict_pairs
+        self.num_of_conflicts = sum(conflict_pairs.values())
+
+    def get_path(self, agent_id):
+        """Returns path of given agent without building list of all paths"""
+        node = self
+        while node._paths is None:
+            if node.agent == agent_id:
+                return node.path
+            node = node.parent
+        return node._paths[agent_id]
 
     def get_constraint(self, agent_id):
-        """Returns constraints for given agent"""
-        return self.constraints[agent_id]
+        """Returns ConstraintTable with all constraints of given agent on the way from root to this node
+           Expanded nodes remember the result, so the walk stops at the closest expanded ancestor
+        """
+        chain = []
+        node = self
+        while node.parent is not None and agent_id not in node._constraint_cache:
+            if node.agent == agent_id and node.constraint is not None:
+                chain.append(node.constraint)
+            node = node.parent
+        if agent_id in node._constraint_cache:
+            res = node._constraint_cache[agent_id].copy()
+        else:
+            res = ConstraintTable(node.constraints[agent_id] if agent_id < len(node.constraints) else ())
+        for constraint in reversed(chain):
+            res.add(constraint)
+        if self._paths is not None:
+            self._constraint_cache[agent_id] = res.copy()
+        return res
 
     def get_cost(self):
         """Cost is sum of lengths of individual paths"""
-        res = 0
-        for x in self.paths:
-            res += len(x)
+        if self.cost is None:
+            res = 0
+            for x in self.paths:
+                res += len(x)
+            self.cost = res
+        return self.cost
+
+    def get_depth(self):
+        """Returns number of constraints added on the way from root"""
+        depth = 0
+        node = self
+        while node.parent is not None:
+            depth += 1
+            node = node.parent
+        return depth
+
+    def get_memory_usage(self):
+        """
+        Estimates number of bytes owned by this node only
+        Everything shared with parent (constraints, paths of other agents) is not counted,
+        so sum over all nodes of the tree is the memory taken by the whole tree
+        """
+        res = sys.getsizeof(self) + sys.getsizeof(self.__dict__)
+        if self.conflict_pairs is not None:
+            res += sys.getsizeof(self.conflict_pairs)
+        if self.parent is None:
+            res += sys.getsizeof(self.constraints)
+            for agent_constraints in self.constraints:
+                res += sys.getsizeof(agent_constraints)
+                res += sum(sys.getsizeof(x) for x in agent_constraints)
+            res += sys.getsizeof(self._paths)
+            res += sum(self._path_size(path) for path in self._paths)
+        else:
+            res += sys.getsizeof(self.constraint)
+            res += self._path_size(self.path)
+            if self._paths is not None: # list itself is owned, paths in it are shared
+                res += sys.getsizeof(self._paths)
+        for table in self._constraint_cache.values():
+            res += table.get_memory_usage()
         return res
 
+    @staticmethod
+    def _path_size(path):
+        """Size of path including its positions"""
+        return sys.getsizeof(path) + sum(sys.getsizeof(pos) for pos in path)
+
     def get_first_collision(self):
         """
-        Iterates through all timesteps
-        In each step it takes all possible pairs of agents and compares their postion
+        Finds the first collision in time, for the same timestep the one of pair of agents with lowest numbers
         If they are at the same position at the same time - collision is created
-        Swap is not allowed
+        Agent that finished its path stays at its goal
+        Swap is not allowed, it is resolved by edge constraints
+        When conflicting pairs are known, only paths of agents in them are checked
         :return: list of constraints for both agents that the first collision appeared for
         """
-        longest_path_len = len(max(self.paths, key=len))
+        if self.conflict_pairs is None:
+            return ConflictDetector(self.paths).get_first_conflict()
+        if not self.conflict_pairs:
+            return False
+        agents = sorted({agent for pair in self.conflict_pairs for agent in pair})
+        collision = ConflictDetector([self.paths[agent] for agent in agents]).get_first_conflict()
+        return [(agents[i], constraint) for i, constraint in collision]
 
-        for i in range(longest_path_len):  # timestep
-            for j, _ in enumerate(self.paths):
-                for k in range(j + 1, len(self.paths)):
-                    if i < len(self.paths[j]) and i < len(self.paths[k]): # Both have index in range
-                        if self.paths[j][i] == self.paths[k][i]:  # both agents still havent reached end
-                            x, y = self.paths[i][j]
-                            return [(j, Node(x, y, i)), (k, Node(x, y, i))]
-                        if i + 1 < len(self.paths[j]) and i + 1 < len(self.paths[k]): # Swapping
-                            if self.paths[j][i + 1] == self.paths[k][i] and self.paths[k][i+1] == self.paths[j][i]:
-                                x, y = self.paths[k][i]
-                                return [(j, Node(x, y, i + 1)), (k, Node(x, y, i))]
-                    if len(self.paths[j]) > i >= len(self.paths[k]): # one is out of the bounds
-                        if self.paths[j][i] == self.paths[k][-1]:
-                            x, y = self.paths[j][i]
-                            return [(j, Node(x, y, i)), (k, Node(x, y, i))]
-                    if len(self.paths[k]) > i >= len(self.paths[j]):
-                        if self.paths[j][-1] == self.paths[k][i]:
-                            x, y = self.paths[j][-1]
-                            return [(j, Node(x, y, i)), (k, Node(x, y, i))]
-        return False
+    def count_collisions(self):
+        """Returns number of collisions between paths of all agents"""
+        if self.num_of_conflicts is not None:
+            return self.num_of_conflicts
+        return ConflictDetector(self.paths).count_conflicts()
 
     # def get_agent_position(self, timestep, agent_nr):
     #     """Returns """
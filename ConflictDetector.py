@@ -0,0 +1,140 @@
+"""Module for vectorised detection of conflicts between paths"""
+import numpy as np
+from Node import Node
+
+VERTEX = 0
+SWAP = 1
+
+
+class ConflictDetector:
+    """Finds conflicts between paths of all agents at once
+       All paths are packed into one (agents x T) array of cell ids, padded with the last position,
+       because agent that finished its path stays at its goal
+       Vertex and goal-occupancy conflicts are found by sorting (timestep, cell) keys,
+       swaps by matching (timestep, from, to) keys of one agent with (timestep, to, from) keys of another
+       Conflicts are ordered the same way as in CTNode.get_first_collision:
+       by timestep, then by pair of agents, vertex conflict before swap
+    """
+    def __init__(self, paths):
+        """
+        :param paths: list of paths, path is list of (x, y) coordinates
+        """
+        self.paths = paths
+        self.lengths = np.array([len(path) for path in paths], dtype=np.int64)
+        self.makespan = int(self.lengths.max()) if len(paths) else 0
+        self.positions = self._pack()
+        self._conflicts = None
+
+    def _pack(self):
+        """Packs paths into padded (agents x T) array of cell ids y * width + x"""
+        agents = len(self.paths)
+        if agents == 0:
+            self.width = 1
+            return np.zeros((0, 0), dtype=np.int64)
+        coords = np.array([pos for path in self.paths for pos in path], dtype=np.int64).reshape(-1, 2)
+        self.width = int(coords[:, 0].max()) + 1
+        cells = coords[:, 1] * self.width + coords[:, 0]
+        ends = np.cumsum(self.lengths)
+        starts = ends - self.lengths
+        positions = np.repeat(cells[ends - 1][:, None], self.makespan, axis=1)
+        rows = np.repeat(np.arange(agents), self.lengths)
+        timesteps = np.arange(len(cells)) - np.repeat(starts, self.lengths)
+        positions[rows, timesteps] = cells
+        return positions
+
+    def _cell(self, cell_id):
+        """Converts cell id back to coordinates"""
+        return int(cell_id % self.width), int(cell_id // self.width)
+
+    def _vertex_conflicts(self):
+        """Returns arrays (timestep, agent1, agent2, cell) of agents at the same cell at the same time"""
+        agents, makespan = self.positions.shape
+        cells = int(self.positions.max()) + 1
+        keys = (np.arange(makespan, dtype=np.int64)[None, :] * cells + self.positions).ravel()
+        order = np.argsort(keys, kind='stable')  # agents with equal key stay ordered
+        sorted_keys = keys[order]
+        same = sorted_keys[1:] == sorted_keys[:-1]
+        if not same.any():
+            return [np.zeros(0, dtype=np.int64)] * 4
+        group_starts = np.flatnonzero(np.concatenate(([True], ~same)))
+        group_sizes = np.diff(np.concatenate((group_starts, [len(keys)])))
+        first, second = [], []
+        pairs = group_starts[group_sizes == 2]
+        first.append(order[pairs])
+        second.append(order[pairs + 1])
+        for start, size in zip(group_starts[group_sizes > 2], group_sizes[group_sizes > 2]):
+            members = order[start:start + size]
+            for a in range(size):
+                for b in range(a + 1, size):
+                    first.append(members[a:a + 1])
+                    second.append(members[b:b + 1])
+        first = np.concatenate(first)
+        second = np.concatenate(second)
+        timesteps = first % makespan
+        agent1, agent2 = first // makespan, second // makespan
+        # both agents already at their goals - conflict was reported when the later one arrived
+        active = timesteps < np.maximum(self.lengths[agent1], self.lengths[agent2])
+        return timesteps[active], agent1[active], agent2[active], self.positions[agent1[active], timesteps[active]]
+
+    def _swap_conflicts(self):
+        """Returns arrays (timestep, agent1, agent2) of agents swapping positions between timestep and timestep + 1"""
+        agents, makespan = self.positions.shape
+        if makespan < 2:
+            return [np.zeros(0, dtype=np.int64)] * 3
+        cells = int(self.positions.max()) + 1
+        before, after = self.positions[:, :-1], self.positions[:, 1:]
+        agent, timestep = np.nonzero(before != after)
+        from_cell, to_cell = before[agent, timestep], after[agent, timestep]
+        forward = (timestep * cells + from_cell) * cells + to_cell
+        backward = (timestep * cells + to_cell) * cells + from_cell
+        order = np.argsort(forward, kind='stable')
+        forward = forward[order]
+        left = np.searchsorted(forward, backward, 'left')
+        right = np.searchsorted(forward, backward, 'right')
+        counts = right - left
+        moves = np.repeat(np.arange(len(backward)), counts)
+        offsets = np.arange(len(moves)) - np.repeat(np.cumsum(counts) - counts, counts)
+        other = order[left[moves] + offsets]
+        agent1, agent2 = agent[moves], agent[other]
+        keep = agent1 < agent2
+        return timestep[moves][keep], agent1[keep], agent2[keep]
+
+    def _find_all(self):
+        """Finds all conflicts, sorted the same way as get_first_collision visits them"""
+        if self._conflicts is None:
+            v_time, v_agent1, v_agent2, v_cell = self._vertex_conflicts()
+            s_time, s_agent1, s_agent2 = self._swap_conflicts()
+            timesteps = np.concatenate((v_time, s_time))
+            agent1 = np.concatenate((v_agent1, s_agent1))
+            agent2 = np.concatenate((v_agent2, s_agent2))
+            kinds = np.concatenate((np.full(len(v_time), VERTEX), np.full(len(s_time), SWAP)))
+            cells = np.concatenate((v_cell, np.zeros(len(s_time), dtype=np.int64)))
+            order = np.lexsort((kinds, agent2, agent1, timesteps))
+            self._conflicts = (timesteps[order], agent1[order], agent2[order], kinds[order], cells[order])
+        return self._conflicts
+
+    def _to_constraints(self, timestep, agent1, agent2, kind, cell):
+        """Converts one conflict to pair of constraints in format of CTNode.get_first_collision"""
+        timestep, agent1, agent2 = int(timestep), int(agent1), int(agent2)
+        if kind == VERTEX:
+            x, y = self._cell(cell)
+            return [(agent1, Node(x, y, timestep)), (agent2, Node(x, y, timestep))]
+        x1, y1 = self._cell(self.positions[agent1, timestep])
+        x2, y2 = self._cell(self.positions[agent2, timestep])
+        return [(agent1, (Node(x1, y1, timestep), Node(x2, y2, timestep + 1))),
+                (agent2, (Node(x2, y2, timestep), Node(x1, y1, timestep + 1)))]
+
+    def get_first_conflict(self):
+        """:return: constraints for both agents of the first conflict or False if paths are conflict free"""
+        conflicts = self._find_all()
+        if len(conflicts[0]) == 0:
+            return False
+        return self._to_constraints(*(x[0] for x in conflicts))
+
+    def get_all_conflicts(self):
+        """:return: list with constraints for both agents of every conflict"""
+        return [self._to_constraints(*conflict) for conflict in zip(*self._find_all())]
+
+    def count_conflicts(self):
+        """:return: number of conflicts"""
+        return len(self._find_all()[0])
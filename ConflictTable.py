@@ -0,0 +1,141 @@
+"""Module for class ConflictTable"""
+
+
+class ConflictTable:
+    """Space-time occupancy map of paths of one CT node
+       One table is shared by the whole constraint tree. It reflects paths of node it was last moved to
+       and it is moved between nodes by replacing only the paths that differ on the way through the tree.
+       Conflicts of a new path with all other paths are counted in O(path length) lookups,
+       conflicting pairs of agents are stored in every CTNode.
+       Counting follows ConflictDetector: agent that finished its path stays at its goal
+    """
+    def __init__(self, root):
+        """
+        :param root: root CTNode with paths of all agents, its conflicting pairs are filled in
+        """
+        self.occupancy = {}  # (x, y, t) -> agents at the cell in timestep, before they finish
+        self.goals = {}  # (x, y) -> list of (agent, timestep of arrival) staying at the cell forever
+        self.lengths = []
+        self.node = root
+        pairs = {}
+        for agent, path in enumerate(root.paths):
+            self.lengths.append(0)
+            for other, count in self.count_path_conflicts(agent, path).items():
+                pairs[(other, agent)] = count
+            self._insert(agent, path)
+        root.set_conflict_pairs(pairs)
+
+    def _insert(self, agent, path):
+        """Adds path of agent to the table"""
+        for t, (x, y) in enumerate(path):
+            self.occupancy.setdefault((x, y, t), []).append(agent)
+        self.goals.setdefault(path[-1], []).append((agent, len(path) - 1))
+        self.lengths[agent] = len(path)
+
+    def _remove(self, agent, path):
+        """Removes path of agent from the table"""
+        for t, (x, y) in enumerate(path):
+            agents = self.occupancy[(x, y, t)]
+            agents.remove(agent)
+            if not agents:
+                del self.occupancy[(x, y, t)]
+        goal = self.goals[path[-1]]
+        goal.remove((agent, len(path) - 1))
+        if not goal:
+            del self.goals[path[-1]]
+        self.lengths[agent] = 0
+
+    def _replace(self, agent, old_path, new_path):
+        self._remove(agent, old_path)
+        self._insert(agent, new_path)
+
+    def move_to(self, node):
+        """
+        Changes table to reflect paths of given node
+        Walks from current node up to common ancestor and down to given node, replacing one path per step
+        """
+        if node is self.node:
+            return
+        ancestors = set()
+        current = self.node
+        while current is not None:
+            ancestors.add(current)
+            current = current.parent
+        down = []
+        current = node
+        while current not in ancestors:
+            down.append(current)
+            current = current.parent
+        common = current
+        current = self.node
+        while current is not common:
+            self._replace(current.agent, current.path, current.parent.get_path(current.agent))
+            current = current.parent
+        for current in reversed(down):
+            self._replace(current.agent, current.parent.get_path(current.agent), current.path)
+        self.node = node
+
+    def count_path_conflicts(self, agent, path):
+        """
+        Counts conflicts of path with paths of all other agents in the table
+        :return: dictionary with other agent as key and number of conflicts as value
+        """
+        occupancy = self.occupancy
+        goals = self.goals
+        counts = {}
+        last = len(path) - 1
+        for t, (x, y) in enumerate(path):
+            for other in occupancy.get((x, y, t), ()):  # vertex
+                if other != agent:
+                    counts[other] = counts.get(other, 0) + 1
+            for other, arrival in goals.get((x, y), ()):  # other agent already waits at its goal
+                if other != agent and t > arrival:
+                    counts[other] = counts.get(other, 0) + 1
+            if t < last:  # swap
+                nx, ny = path[t + 1]
+                if (nx, ny) != (x, y):
+                    there = occupancy.get((nx, ny, t))
+                    back = occupancy.get((x, y, t + 1)) if there else None
+                    if back:
+                        for other in there:
+                            if other != agent and other in back:
+                                counts[other] = counts.get(other, 0) + 1
+        gx, gy = path[-1]
+        longest = max((length for other, length in enumerate(self.lengths) if other != agent), default=0)
+        for t in range(len(path), longest):  # other agents passing through goal after agent finished
+            for other in occupancy.get((gx, gy, t), ()):
+                if other != agent:
+                    counts[other] = counts.get(other, 0) + 1
+        return counts
+
+    def count_move_conflicts(self, agent, x, y, t, from_x, from_y):
+        """
+        Counts conflicts of one move of agent from (from_x, from_y) in timestep t - 1 to (x, y) in timestep t
+        Used by low level search to prefer paths with fewer conflicts
+        """
+        count = 0
+        for other in self.occupancy.get((x, y, t), ()):
+            if other != agent:
+                count += 1
+        for other, arrival in self.goals.get((x, y), ()):
+            if other != agent and t > arrival:
+                count += 1
+        if (x, y) != (from_x, from_y):
+            there = self.occupancy.get((x, y, t - 1))
+            back = self.occupancy.get((from_x, from_y, t)) if there else None
+            if back:
+                for other in there:
+                    if other != agent and other in back:
+                        count += 1
+        return count
+
+    def get_child_pairs(self, parent, agent, path):
+        """
+        Conflicting pairs of child of parent which differs only in path of agent
+        :return: dictionary with pair of agents as key and number of conflicts as value
+        """
+        self.move_to(parent)
+        pairs = {pair: count for pair, count in parent.conflict_pairs.items() if agent not in pair}
+        for other, count in self.count_path_conflicts(agent, path).items():
+            pairs[(min(agent, other), max(agent, other))] = count
+        return pairs
@@ -0,0 +1,120 @@
+"""Module for class ConstraintTable"""
+import sys
+from Node import Node
+
+
+class ConstraintTable:
+    """Constraints of one agent indexed by timestep
+       Vertex constraint is Node - agent cannot be at its coordinates at its timestep
+       Edge constraint is tuple of two Nodes - agent cannot move from first to second,
+       timestep of the second Node is the time of arrival
+       List of constraints (for example barrier or range of timesteps on one cell) is added as a whole
+       Any number of constraints can be placed on one cell, each check is one dictionary lookup
+    """
+    def __init__(self, constraints=()):
+        """
+        :param constraints: iterable of vertex (Node) and edge ((Node, Node)) constraints
+        """
+        self.vertex = {}  # timestep -> set of forbidden cells
+        self.edge = {}  # timestep of arrival -> set of forbidden moves (from_cell, to_cell)
+        self.last_vertex = {}  # cell -> latest timestep with vertex constraint on the cell
+        self.max_timestep = 0
+        self.cell_tables = {}  # map width -> (vertex, edge) with cell ids instead of coordinates, updated by add
+        for constraint in constraints:
+            self.add(constraint)
+
+    @classmethod
+    def from_dict(cls, constraints: dict):
+        """Creates table from old style dictionary with coordinates as key and timestep as value"""
+        return cls(Node(x, y, t) for (x, y), t in constraints.items())
+
+    def __len__(self):
+        return sum(len(x) for x in self.vertex.values()) + sum(len(x) for x in self.edge.values())
+
+    def add(self, constraint):
+        """Adds vertex or edge constraint or list of them"""
+        if isinstance(constraint, list):
+            for x in constraint:
+                self.add(x)
+            return
+        if isinstance(constraint, Node):
+            cell, t = constraint.coords(), constraint.timestep()
+            self.vertex.setdefault(t, set()).add(cell)
+            self.last_vertex[cell] = max(self.last_vertex.get(cell, -1), t)
+            for width, (vertex, _) in self.cell_tables.items():
+                vertex.setdefault(t, set()).add(cell[1] * width + cell[0])
+        else:
+            start, end = constraint
+            t = end.timestep()
+            self.edge.setdefault(t, set()).add((start.coords(), end.coords()))
+            for width, (_, edge) in self.cell_tables.items():
+                edge.setdefault(t, set()).add((start.y * width + start.x, end.y * width + end.x))
+        self.max_timestep = max(self.max_timestep, t)
+
+    def add_path(self, path, until=0):
+        """
+        Reserves path of other agent - its cells, moves swapping with it and its goal up to timestep until
+        Does the same as adding the vertex and edge constraints one by one without creating Nodes
+        :param path: list of coordinates, one for each timestep
+        """
+        cells = path + [path[-1]] * (until + 1 - len(path))
+        swaps = [(t, path[t], path[t - 1]) for t in range(1, len(path)) if path[t] != path[t - 1]]
+        for t, cell in enumerate(cells):
+            self.vertex.setdefault(t, set()).add(cell)
+            if self.last_vertex.get(cell, -1) < t:
+                self.last_vertex[cell] = t
+        for t, from_cell, to_cell in swaps:
+            self.edge.setdefault(t, set()).add((from_cell, to_cell))
+        for width, (vertex, edge) in self.cell_tables.items():
+            for t, (x, y) in enumerate(cells):
+                vertex.setdefault(t, set()).add(y * width + x)
+            for t, (fx, fy), (tx, ty) in swaps:
+                edge.setdefault(t, set()).add((fy * width + fx, ty * width + tx))
+        self.max_timestep = max(self.max_timestep, len(cells) - 1)
+
+    def cell_ids(self, width):
+        """
+        Constraints with cells as ids y * width + x, converted once for every width and then updated by add
+        :return: tuple of dictionaries timestep -> set of cells and timestep -> set of (from cell, to cell)
+        """
+        tables = self.cell_tables.get(width)
+        if tables is None:
+            vertex = {t: {y * width + x for x, y in cells} for t, cells in self.vertex.items()}
+            edge = {t: {(fy * width + fx, ty * width + tx) for (fx, fy), (tx, ty) in moves}
+                    for t, moves in self.edge.items()}
+            tables = self.cell_tables[width] = (vertex, edge)
+        return tables
+
+    def copy(self):
+        """Returns independent copy of the table"""
+        res = ConstraintTable()
+        res.vertex = {t: set(cells) for t, cells in self.vertex.items()}
+        res.edge = {t: set(moves) for t, moves in self.edge.items()}
+        res.last_vertex = dict(self.last_vertex)
+        res.max_timestep = self.max_timestep
+        return res
+
+    def is_constrained(self, cell, t):
+        """True if agent cannot be at cell in timestep t"""
+        cells = self.vertex.get(t)
+        return cells is not None and cell in cells
+
+    def is_edge_constrained(self, from_cell, to_cell, t):
+        """True if agent cannot move from from_cell to to_cell arriving at timestep t"""
+        moves = self.edge.get(t)
+        return moves is not None and (from_cell, to_cell) in moves
+
+    def goal_hold_time(self, cell):
+        """
+        Earliest timestep from which agent can stay at cell forever
+        Path ending at cell in this timestep or later stays valid after agent finishes
+        """
+        return self.last_vertex.get(cell, -1) + 1
+
+    def get_memory_usage(self):
+        """Estimates number of bytes taken by the table"""
+        res = sys.getsizeof(self) + sys.getsizeof(self.vertex) + sys.getsizeof(self.edge)
+        res += sys.getsizeof(self.last_vertex)
+        res += sum(sys.getsizeof(x) for x in self.vertex.values())
+        res += sum(sys.getsizeof(x) for x in self.edge.values())
+        return res
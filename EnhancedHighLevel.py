@@ -0,0 +1,303 @@
+"""Module for class EnhancedHighLevel"""
+from collections import OrderedDict
+from ConflictDetector import ConflictDetector
+from CTNode import CTNode
+from HighLevel import HighLevel
+from MDD import MDD
+from Heuristic import unreachable_value
+from Node import Node
+
+CARDINAL = 0
+SEMI_CARDINAL = 1
+NON_CARDINAL = 2
+
+
+class EnhancedHighLevel(HighLevel):
+    """Conflict-based search improved by
+       - prioritizing conflicts: cardinal conflicts (both children cost more) are split first,
+         then semi-cardinal and non-cardinal ones, classified using MDDs of both agents
+       - bypass: child with the same cost and fewer conflicts replaces its parent instead of branching
+       - rectangle reasoning: agents crossing the same rectangle on shortest paths get barrier constraints
+       - corridor reasoning: agents meeting in corridor from opposite sides get range constraints
+         on corridor endpoints
+       Every part can be switched off to measure its effect
+    """
+    def __init__(self, workers=0, prioritize=True, bypass=True, symmetry=True, incremental=False, max_mdds=1024):
+        """
+        :param workers: number of processes running low level searches in parallel
+        :param prioritize: split cardinal conflicts first
+        :param bypass: adopt paths of same cost children with fewer conflicts
+        :param symmetry: use rectangle and corridor reasoning
+        :param incremental: continue search of parent when replanning agent in child
+        :param max_mdds: number of MDDs kept for classifying conflicts
+        """
+        super().__init__(workers, incremental)
+        self.prioritize = prioritize
+        self.bypass = bypass
+        self.symmetry = symmetry
+        self.max_mdds = max_mdds
+        self.mdds = OrderedDict()  # (CTNode, agent) -> MDD, least recently used first
+
+    def search(self, max_iterations, time_limit=None, cancel=None):
+        self.mdds = OrderedDict()
+        return (yield from super().search(max_iterations, time_limit, cancel))
+
+    def _count(self, key):
+        self.stats[key] = self.stats.get(key, 0) + 1
+
+    def get_mdd(self, node: CTNode, agent):
+        """
+        MDD of agent in node, cached by the CT node where constraints of agent last changed
+        (constraints of agent change only in nodes that replan it with a new constraint)
+        Least recently used MDD is dropped when there are more than max_mdds of them
+        """
+        source = node
+        while source.parent is not None and (source.agent != agent or source.constraint is None):
+            source = source.parent
+        key = (source, agent)
+        if key in self.mdds:
+            self.mdds.move_to_end(key)
+            return self.mdds[key]
+        self.solver.change_config(self.start_coords[agent], self.end_coords[agent], node.get_constraint(agent))
+        mdd = self.mdds[key] = MDD(self.solver, len(node.get_path(agent)) - 1)
+        if len(self.mdds) > self.max_mdds:
+            self.mdds.popitem(last=False)
+        return mdd
+
+    def _is_cardinal(self, node, agent, constraint):
+        """True if constraint removes all paths of agent with its current cost"""
+        mdd = self.get_mdd(node, agent)
+        if isinstance(constraint, Node):
+            return mdd.is_singleton(constraint.coords(), constraint.timestep())
+        start, end = constraint
+        return mdd.is_singleton(start.coords(), start.timestep()) and mdd.is_singleton(end.coords(), end.timestep())
+
+    def classify(self, node, collision):
+        """Returns CARDINAL, SEMI_CARDINAL or NON_CARDINAL"""
+        cardinal = sum(1 for agent, constraint in collision if self._is_cardinal(node, agent, constraint))
+        return (NON_CARDINAL, SEMI_CARDINAL, CARDINAL)[cardinal]
+
+    def choose_collision(self, node: CTNode):
+        """Picks the first cardinal conflict, if there is none the first semi-cardinal, then the first one"""
+        if not self.prioritize:
+            collision = node.get_first_collision()
+        else:
+            if node.conflict_pairs is None:
+                agents = list(range(len(self.start_coords)))
+            else:
+                agents = sorted({agent for pair in node.conflict_pairs for agent in pair})
+            collisions = agents and ConflictDetector([node.paths[agent] for agent in agents]).get_all_conflicts()
+            if not collisions:
+                return False
+            best, best_type = None, None
+            for collision in collisions:
+                collision = [(agents[i], constraint) for i, constraint in collision]
+                conflict_type = self.classify(node, collision)
+                if best_type is None or conflict_type < best_type:
+                    best, best_type = collision, conflict_type
+                    if conflict_type == CARDINAL:
+                        break
+            collision = best
+            self._count(('cardinal', 'semi_cardinal', 'non_cardinal')[best_type] + '_conflicts')
+        if collision and self.symmetry:
+            collision = self.rectangle_constraints(node, collision) or self.corridor_constraints(node, collision) \
+                or collision
+        return collision
+
+    def expand(self, q, node: CTNode, collision):
+        """Creates children, child with same cost and fewer conflicts bypasses the conflict instead"""
+        children = self.create_child_ct_nodes(collision, node)
+        if self.bypass:
+            for child in children:
+                if child and child.get_cost() == node.get_cost() and child.num_of_conflicts < node.num_of_conflicts:
+                    bypass = CTNode(parent=node, agent=child.agent, constraint=None, path=child.path,
+                                    conflict_pairs=child.conflict_pairs)
+                    self._count('bypasses')
+                    self._push(q, bypass)
+                    return
+        for child in children:
+            if child:
+                self._push(q, child)
+
+    def rectangle_constraints(self, node, collision):
+        """
+        Barrier constraints for vertex conflict of two agents moving on shortest (Manhattan) paths
+        through the same rectangle, one crossing it horizontally and the other vertically
+        Each child forbids one agent to cross exit side of the rectangle at the time of shortest path
+        :return: list of (agent, list of constraints) or None if conflict is not rectangle conflict
+        """
+        (a1, c1), (a2, _) = collision
+        if not isinstance(c1, Node):
+            return None
+        path1, path2 = node.get_path(a1), node.get_path(a2)
+        s1, g1, s2, g2 = path1[0], path1[-1], path2[0], path2[-1]
+        if len(path1) - 1 != _manhattan(s1, g1) or len(path2) - 1 != _manhattan(s2, g2):
+            return None
+        # both agents have to be at conflict cell on their way, not waiting at goal
+        if c1.timestep() != _manhattan(s1, c1.coords()) or c1.timestep() != _manhattan(s2, c1.coords()):
+            return None
+        signs = []
+        for axis in (0, 1):
+            d1, d2 = _sign(g1[axis] - s1[axis]), _sign(g2[axis] - s2[axis])
+            if d1 * d2 < 0 or d1 == d2 == 0:
+                return None
+            signs.append(d1 or d2)
+
+        def norm(cell):  # both agents move in positive direction in normalized coordinates
+            return cell[0] * signs[0], cell[1] * signs[1]
+
+        n_s1, n_g1, n_s2, n_g2, n_v = map(norm, (s1, g1, s2, g2, c1.coords()))
+        rs = (max(n_s1[0], n_s2[0]), max(n_s1[1], n_s2[1]))
+        rg = (min(n_g1[0], n_g2[0]), min(n_g1[1], n_g2[1]))
+        if not (rs[0] <= n_v[0] <= rg[0] and rs[1] <= n_v[1] <= rg[1]):
+            return None
+        # horizontal agent enters through left side and leaves through right side, vertical one top and bottom
+        if n_s1[1] == rs[1] and n_g1[1] == rg[1] and n_s2[0] == rs[0] and n_g2[0] == rg[0]:
+            horizontal, vertical = (a1, n_s1), (a2, n_s2)
+        elif n_s2[1] == rs[1] and n_g2[1] == rg[1] and n_s1[0] == rs[0] and n_g1[0] == rg[0]:
+            horizontal, vertical = (a2, n_s2), (a1, n_s1)
+        else:
+            return None
+        if horizontal[1] == vertical[1]:
+            return None
+        right_side = [(rg[0], y) for y in range(rs[1], rg[1] + 1)]
+        bottom_side = [(x, rg[1]) for x in range(rs[0], rg[0] + 1)]
+        result = []
+        for (agent, start), side in ((horizontal, right_side), (vertical, bottom_side)):
+            barrier = [Node(x * signs[0], y * signs[1], _manhattan(start, (x, y))) for x, y in side]
+            result.append((agent, barrier))
+        self._count('rectangle_conflicts')
+        return sorted(result, key=lambda x: x[0])
+
+    def _free_neighbours(self, cell):
+        grid_map = self.grid_map
+        return [grid_map.coords(x) for x in grid_map.neighbours(grid_map.cell(*cell))]
+
+    def get_corridor(self, cell):
+        """
+        Returns list of cells of corridor through cell - chain of cells with two free neighbours
+        and the first cell at both of its ends that is not part of the chain, None if cell is not in corridor
+        """
+        if not self.grid_map.is_passable(*cell) or len(self._free_neighbours(cell)) != 2:
+            return None
+        ends = []
+        for current in self._free_neighbours(cell):
+            previous, chain = cell, []
+            while len(self._free_neighbours(current)) == 2:
+                if current == cell:  # corridor is a cycle
+                    return None
+                chain.append(current)
+                previous, current = current, [x for x in self._free_neighbours(current) if x != previous][0]
+            ends.append(chain + [current])
+        return ends[0][::-1] + [cell] + ends[1]
+
+    def corridor_constraints(self, node, collision):
+        """
+        Range constraints for two agents that meet in corridor going in opposite directions
+        Agent moving from e1 to e2 cannot be at e2 until the other agent could have reached e1 and then
+        it passed the whole corridor, unless it could get to e2 sooner around the corridor.
+        Earliest arrival times respect constraints of agents, so ranges grow as constraints pile up.
+        :return: list of (agent, list of constraints) or None if conflict is not corridor conflict
+        """
+        (a1, c1), (a2, _) = collision
+        cell = c1.coords() if isinstance(c1, Node) else c1[1].coords()
+        t = c1.timestep() if isinstance(c1, Node) else c1[1].timestep()
+        corridor = self.get_corridor(cell)
+        if corridor is None:
+            return None
+        index = {x: i for i, x in enumerate(corridor)}
+        directions = []
+        for agent in (a1, a2):
+            entry, leave = self._corridor_segment(node.get_path(agent), index, t)
+            if entry is None or {entry, leave} != {0, len(corridor) - 1}:
+                return None
+            directions.append(entry < leave)
+        if directions[0] == directions[1]:
+            return None
+        length = len(corridor) - 1
+        result = []
+        for agent, other, forward in ((a1, a2, directions[0]), (a2, a1, directions[1])):
+            entry_cell, exit_cell = (corridor[0], corridor[-1]) if forward else (corridor[-1], corridor[0])
+            around = self._earliest_arrival(node, agent, exit_cell, frozenset(corridor[1:-1]))
+            last = min(around - 1, self._earliest_arrival(node, other, entry_cell) + length)
+            path = node.get_path(agent)
+            # current path has to violate the constraint, otherwise child would not change anything
+            if not any(cell == exit_cell for cell in path[:last + 1]):
+                return None
+            result.append((agent, [Node(exit_cell[0], exit_cell[1], time) for time in range(last + 1)]))
+        self._count('corridor_conflicts')
+        return result
+
+    @staticmethod
+    def _corridor_segment(path, index, t):
+        """Indexes in corridor where agent enters and leaves it around timestep t, None if it is not in corridor"""
+        t = min(t, len(path) - 1)
+        if path[t] not in index:
+            return None, None
+        first = t
+        while first > 0 and path[first - 1] in index:
+            first -= 1
+        last = t
+        while last + 1 < len(path) and path[last + 1] in index:
+            last += 1
+        return index[path[first]], index[path[last]]
+
+    def _earliest_arrival(self, node, agent, target, blocked=frozenset()):
+        """
+        Earliest timestep agent can be at target with its constraints in node, not passing blocked cells
+        Cells reachable in each timestep are expanded until the last constraint, then static distance is added,
+        with blocked cells it is found by breadth first search, so the shared heuristic cache gets no tables
+        of maps that exist only for one corridor
+        """
+        grid_map = self.grid_map
+        moves = grid_map.moves
+        self.solver.change_config(self.start_coords[agent], self.end_coords[agent], node.get_constraint(agent))
+        vertex, edge = self.solver.cell_constraints()
+        blocked_cells = {grid_map.cell(x, y) for x, y in blocked}
+        goal = grid_map.cell(*target)
+        level = {grid_map.cell(*node.get_path(agent)[0])}
+        t = 0
+        while goal not in level:
+            if not level:
+                return float('inf')
+            if t >= self.solver.constraints.max_timestep:
+                if blocked:
+                    return t + self._distance(level, goal, blocked_cells)
+                table = self.solver.heuristic_cache.get_for_map(grid_map, target)
+                unreachable = unreachable_value(table)
+                best = min(int(table[cell]) for cell in level)
+                return float('inf') if best == unreachable else t + best
+            t += 1
+            forbidden = vertex.get(t, ())
+            forbidden_moves = edge.get(t, ())
+            level = {neighbor for cell in level for neighbor in moves[cell]
+                     if neighbor not in blocked_cells and neighbor not in forbidden
+                     and (cell, neighbor) not in forbidden_moves}
+        return t
+
+    def _distance(self, sources, goal, blocked_cells):
+        """Number of moves from the nearest of sources to goal avoiding blocked cells, inf if goal is unreachable"""
+        moves = self.grid_map.moves
+        visited = set(sources)
+        frontier = sources
+        distance = 0
+        while frontier:
+            if goal in frontier:
+                return distance
+            distance += 1
+            next_frontier = set()
+            for cell in frontier:
+                for neighbor in moves[cell]:
+                    if neighbor not in visited and neighbor not in blocked_cells:
+                        visited.add(neighbor)
+                        next_frontier.add(neighbor)
+            frontier = next_frontier
+        return float('inf')
+
+
+def _manhattan(a, b):
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+def _sign(x):
+    return (x > 0) - (x < 0)
@@ -0,0 +1,120 @@
+"""This module implements focal variant of space-time Astar algorithm"""
+import heapq
+from Heuristic import DEFAULT_CACHE, unreachable_value
+from Node import Node
+from SpaceTimeAstar import TIME_SPAN, SpaceTimeAstarSolver
+
+
+class FocalAstarSolver(SpaceTimeAstarSolver):
+    """Bounded suboptimal space-time Astar
+       Open list holds all generated states ordered by f, focal list holds states with f <= weight * minimal f
+       and is ordered by number of conflicts with paths of other agents, so the returned path
+       is at most weight times longer than the shortest one but avoids other agents where it can
+       Minimal f when goal is found is a lower bound on cost of the shortest path, it is kept in lower_bound
+    """
+    def __init__(self, constraints, grid: int, start: Node, end: Node, weight=1.5, heuristic_cache=DEFAULT_CACHE,
+                 obstacles=frozenset(), grid_map=None):
+        """
+        :param weight: suboptimality factor, 1 gives shortest paths
+        (other parameters are the same as in SpaceTimeAstarSolver)
+        """
+        super().__init__(constraints, grid, start, end, heuristic_cache, obstacles, grid_map)
+        self.weight = weight
+        self.conflict_counter = None
+        self.lower_bound = 0
+
+    def set_conflict_counter(self, counter):
+        """
+        :param counter: function (x, y, t, from_x, from_y) returning number of conflicts of the move,
+                        None when there are no other paths to avoid
+        """
+        self.conflict_counter = counter
+
+    def run(self, maxiter):
+        """Runs focal search and returns path as list of coordinates, one for each timestep
+           States that do not fit into focal list wait in buckets by their f value
+           and are moved to focal list when minimal f grows
+           Focal entries are single integers ordered by conflicts, f, later timestep and cell,
+           packed in the same way as heap keys of SpaceTimeAstarSolver
+        """
+        self.expanded = 0
+        self.generated = 0
+        grid_map = self.grid_map
+        moves = grid_map.moves
+        vertex, edge = self.cell_constraints()
+        counter = self.conflict_counter
+        width = grid_map.width
+        size = grid_map.size
+        goal = grid_map.cell(*self.end.coords())
+        hold_time = self.constraints.goal_hold_time(self.end.coords())
+        time_limit = self.get_time_limit()
+        table = self.get_distance_table()
+        unreachable = unreachable_value(table)
+        dist = memoryview(table)
+
+        start = grid_map.cell(*self.start.coords())
+        h = dist[start]
+        if h == unreachable or start in vertex.get(0, ()):
+            return False
+        predecessors = {start: None}
+        open_count = {h: 1}  # f -> number of open states with this f
+        f_values = [h]  # heap of f values of open states
+        waiting = {}  # f -> focal entries of open states with f above bound
+        span = TIME_SPAN
+        f_span = (time_limit + size + 1) * span  # every f + 1 fits, f = t + h is at most time_limit + size
+        focal = [(h * span + span - 1) * size + start]
+        f_min = h
+        bound = self.weight * f_min
+        while focal and self.expanded < maxiter:
+            rest, cell = divmod(heapq.heappop(focal), size)
+            conflicts, rest = divmod(rest, f_span)
+            f, back = divmod(rest, span)
+            open_count[f] -= 1
+            self.expanded += 1
+            if not self.expanded & 1023 and self.is_stopped():
+                break
+            t = span - 1 - back
+            current = t * size + cell
+            if cell == goal and t >= hold_time:
+                self.lower_bound = f_min
+                self.generated = len(predecessors) - 1
+                return self._reconstruct(predecessors, current)
+            nt = t + 1
+            if nt <= time_limit:
+                base = nt * size
+                forbidden = vertex.get(nt, ())
+                forbidden_moves = edge.get(nt, ())
+                for neighbor_cell in moves[cell]:
+                    neighbor = base + neighbor_cell
+                    if neighbor in predecessors:
+                        continue
+                    h = dist[neighbor_cell]
+                    if h == unreachable or neighbor_cell in forbidden:
+                        continue
+                    if forbidden_moves and (cell, neighbor_cell) in forbidden_moves:
+                        continue
+                    predecessors[neighbor] = current
+                    nf = nt + h
+                    neighbor_conflicts = conflicts
+                    if counter:
+                        x, y = neighbor_cell % width, neighbor_cell // width
+                        neighbor_conflicts += counter(x, y, nt, cell % width, cell // width)
+                    entry = (neighbor_conflicts * f_span + nf * span + span - 1 - nt) * size + neighbor_cell
+                    if nf not in open_count or open_count[nf] == 0:
+                        heapq.heappush(f_values, nf)
+                    open_count[nf] = open_count.get(nf, 0) + 1
+                    if nf <= bound:
+                        heapq.heappush(focal, entry)
+                    else:
+                        waiting.setdefault(nf, []).append(entry)
+            while f_values and open_count[f_values[0]] == 0:
+                heapq.heappop(f_values)
+            if f_values and f_values[0] > f_min:
+                f_min = f_values[0]
+                new_bound = self.weight * f_min
+                for value in sorted(x for x in waiting if bound < x <= new_bound):
+                    for entry in waiting.pop(value):
+                        heapq.heappush(focal, entry)
+                bound = new_bound
+        self.generated = len(predecessors) - 1
+        return False
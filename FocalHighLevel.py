@@ -0,0 +1,127 @@
+"""Module for class FocalHighLevel"""
+import functools
+import heapq
+from ConstraintTable import ConstraintTable
+from FocalAstar import FocalAstarSolver
+from HighLevel import HighLevel
+from Node import Node
+
+
+class FocalList:
+    """Open list of bounded suboptimal search
+       Every node is in open heap ordered by its lower bound, nodes that cost at most weight * minimal
+       lower bound are in focal heap ordered by number of conflicts, other nodes wait in heap ordered by cost
+    """
+    def __init__(self, weight):
+        self.weight = weight
+        self.open = []  # (lower bound, count, CTNode)
+        self.waiting = []  # (cost, count, CTNode)
+        self.focal = []  # (number of conflicts, cost, count, CTNode)
+        self.closed = set()
+        self.count = 0
+        self.lower_bound = 0
+
+    def __len__(self):
+        return len(self.focal) + len(self.waiting)
+
+    def push(self, node, cost, lower_bound):
+        """Adds node with its cost and lower bound of cost of solutions under it"""
+        self.count += 1
+        heapq.heappush(self.open, (lower_bound, self.count, node))
+        heapq.heappush(self.waiting, (cost, self.count, node))
+
+    def pop(self):
+        """Pops node with fewest conflicts among nodes within bound, minimal lower bound is kept in lower_bound"""
+        while self.open[0][2] in self.closed:
+            heapq.heappop(self.open)
+        self.lower_bound = self.open[0][0]
+        bound = self.weight * self.lower_bound
+        while self.waiting and self.waiting[0][0] <= bound:
+            cost, count, node = heapq.heappop(self.waiting)
+            heapq.heappush(self.focal, (node.count_collisions(), cost, count, node))
+        while True:  # minimal lower bound can drop, nodes that no longer fit go back to waiting
+            conflicts, cost, count, node = heapq.heappop(self.focal)
+            if cost <= bound:
+                break
+            heapq.heappush(self.waiting, (cost, count, node))
+        self.closed.add(node)
+        return node
+
+
+class FocalHighLevel(HighLevel):
+    """Enhanced conflict-based search (ECBS)
+       Both levels use focal search with the same weight, low level prefers paths with fewer conflicts
+       with paths of other agents, high level expands node with fewest conflicts among nodes within bound
+       Each low level search gives lower bound of its agent's path cost, their sum is lower bound of CT node
+       Returned solution costs at most weight times the optimal one, achieved factor is in stats['suboptimality']
+    """
+    def __init__(self, weight=1.5):
+        """
+        :param weight: suboptimality factor, 1 gives optimal solutions
+        """
+        super().__init__()
+        self.weight = weight
+        # CTNode -> (lower bound of path of its agent, lower bound of node), in number of moves
+        self.lower_bounds = {}
+        self.root_bounds = []
+
+    def create_solver(self):
+        self.solver = FocalAstarSolver(ConstraintTable(), self.grid_size, Node(0, 0, 0), Node(0, 0, 0),
+                                       weight=self.weight, grid_map=self.grid_map)
+
+    def create_open_list(self):
+        return FocalList(self.weight)
+
+    def _push(self, q, node):
+        # bound is kept on sum of costs, each path of CTNode cost counts also its starting position
+        q.push(node, node.get_cost() - len(self.start_coords), self.lower_bounds[node][1])
+        self._track_push(node)
+
+    def _pop(self, q):
+        node = q.pop()
+        self._track_pop(node)
+        self.stats['lower_bound'] = q.lower_bound
+        return node
+
+    def search(self, max_iterations, time_limit=None, cancel=None):
+        paths = yield from super().search(max_iterations, time_limit, cancel)
+        if paths:
+            cost = sum(len(path) - 1 for path in paths)
+            self.stats['suboptimality'] = cost / self.stats['lower_bound'] if self.stats['lower_bound'] else 1.0
+        return paths
+
+    def solve_ct_node(self, ctnode):
+        """Plans paths of all agents in root and their lower bounds"""
+        self.solver.set_conflict_counter(None)
+        bounds = []
+        for agent in range(len(self.start_coords)):
+            path = not self._stopped() and self.plan_path(agent, ctnode.get_constraint(agent))
+            if not path:
+                return False
+            ctnode.set_path(path)
+            bounds.append(self.solver.lower_bound)
+        self.root_bounds = bounds
+        self.lower_bounds = {ctnode: (None, sum(bounds))}
+        return True
+
+    def create_child_ct_node(self, agent, constraint, parent_node):
+        """Replans agent avoiding paths of other agents in parent"""
+        self.conflict_table.move_to(parent_node)
+        self.solver.set_conflict_counter(functools.partial(self.conflict_table.count_move_conflicts, agent))
+        return super().create_child_ct_node(agent, constraint, parent_node)
+
+    def _make_child(self, agent, constraint, parent_node, path):
+        child = super()._make_child(agent, constraint, parent_node, path)
+        if child:
+            bound = self.solver.lower_bound
+            parent_bound = self.lower_bounds[parent_node][1]
+            self.lower_bounds[child] = (bound, parent_bound - self._agent_bound(parent_node, agent) + bound)
+        return child
+
+    def _agent_bound(self, node, agent):
+        """Lower bound of path cost of agent in node"""
+        while node.parent is not None:
+            if node.agent == agent:
+                return self.lower_bounds[node][0]
+            node = node.parent
+        return self.root_bounds[agent]
@@ -0,0 +1,220 @@
+"""Module for classes FrameRenderer, PngWriter and FfmpegWriter"""
+import colorsys
+import os
+import shutil
+import subprocess
+import numpy as np
+import pygame
+from PlanArchive import Plan, PositionView
+
+AGENT_COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (125, 125, 125), (125, 125, 0), (125, 0, 125)]
+OBSTACLE_COLOR = (90, 90, 90)
+GRID_COLOR = (60, 60, 60)
+# Grid lines are drawn only when cells are at least this many pixels wide
+MIN_GRID_CELL = 4
+# Hues of further agents are this fraction of circle apart, so neighbouring agents differ the most
+GOLDEN_RATIO = 0.618033988749895
+
+
+def get_agent_colors(count):
+    """Colors of count agents, the first ones are AGENT_COLORS, further hues are spread by golden ratio"""
+    colors = AGENT_COLORS[:count]
+    for i in range(len(colors), count):
+        hue = (i * GOLDEN_RATIO) % 1
+        saturation = 0.9 - 0.3 * (i % 3) / 2
+        value = 1.0 - 0.3 * (i // 3 % 2)
+        colors.append(tuple(int(c * 255) for c in colorsys.hsv_to_rgb(hue, saturation, value)))
+    return colors
+
+
+def pack_positions(paths):
+    """
+    Positions of all agents in all timesteps as array (timestep, agent, 2) of cell coordinates,
+    agent stays at its goal after its path ends
+    Plan gives PositionView, which decodes timesteps only when they are accessed
+    """
+    if isinstance(paths, Plan):
+        return PositionView(paths)
+    makespan = max((len(path) for path in paths), default=1) - 1
+    positions = np.zeros((makespan + 1, len(paths), 2), dtype=np.float64)
+    for agent, path in enumerate(paths):
+        coords = np.array(path, dtype=np.float64).reshape(-1, 2)
+        positions[:len(coords), agent] = coords
+        positions[len(coords):, agent] = coords[-1]
+    return positions
+
+
+def interpolate(positions, time):
+    """Positions of all agents at time from array of pack_positions, fractional time is between two timesteps"""
+    makespan = len(positions) - 1
+    time = min(max(time, 0), makespan)
+    step = min(int(time), makespan - 1) if makespan else 0
+    before = positions[step]
+    after = positions[min(step + 1, makespan)]
+    return before + (after - before) * (time - step)
+
+
+def draw_map(grid_map):
+    """Surface of map with one pixel per cell, obstacles are gray"""
+    cells = np.zeros((grid_map.width, grid_map.height, 3), dtype=np.uint8)
+    cells[~grid_map.passable.reshape(grid_map.height, grid_map.width).T] = OBSTACLE_COLOR
+    return pygame.surfarray.make_surface(cells)
+
+
+class FrameRenderer:
+    """Draws frames of solved paths onto pygame Surface, no display is needed
+       Map, grid lines and goals do not change, so they are drawn once onto background surface
+       Frame restores background only under agents that moved since the previous frame and draws them again
+       Agents move smoothly, their positions between timesteps are interpolated,
+       cell positions of all agents in all timesteps are kept in one NumPy array,
+       positions of Plan are read from (memory mapped) file only for the two timesteps of a frame
+    """
+    def __init__(self, grid_map, paths, goals, cell_size=10, fps=30, step_time=0.5):
+        """
+        :param grid_map: GridMap the agents move on
+        :param paths: list of paths, path is list of (x, y) coordinates, or Plan
+        :param goals: list of goal Nodes
+        :param cell_size: width of cell in pixels
+        :param fps: frames per second of output
+        :param step_time: seconds one timestep takes in output
+        """
+        self.grid_map = grid_map
+        self.paths = paths
+        self.goals = goals
+        self.cell_size = cell_size
+        self.fps = fps
+        self.frames_per_step = max(1, round(fps * step_time))
+        self.agent_size = max(1, cell_size // 2)
+        self.colors = get_agent_colors(len(paths))
+        self.size = (grid_map.width * cell_size, grid_map.height * cell_size)
+        self.surface = pygame.Surface(self.size)
+        self.background = self.draw_background()
+        # cell coordinates of agents, PositionView of Plan is decoded two timesteps per frame
+        self.positions = pack_positions(paths)
+        self.makespan = len(self.positions) - 1
+        self._drawn = None  # pixel positions of agents in the last frame
+
+    def draw_background(self):
+        """Draws map, grid lines and goals once, map is scaled from one pixel per cell"""
+        background = pygame.transform.scale(draw_map(self.grid_map), self.size)
+        if self.cell_size >= MIN_GRID_CELL:
+            width, height = self.size
+            for x in range(0, width, self.cell_size):
+                pygame.draw.line(background, GRID_COLOR, (x, 0), (x, height - 1))
+            for y in range(0, height, self.cell_size):
+                pygame.draw.line(background, GRID_COLOR, (0, y), (width - 1, y))
+        radius = max(1, self.agent_size // 2)
+        for goal, color in zip(self.goals, self.colors):
+            x, y = goal.coords()
+            center = (x * self.cell_size + self.cell_size // 2, y * self.cell_size + self.cell_size // 2)
+            pygame.draw.circle(background, color, center, radius)
+        return background
+
+    def get_frame_count(self):
+        return self.makespan * self.frames_per_step + 1
+
+    def get_positions(self, time):
+        """Pixel positions (top left corners of agent squares) of all agents at time, timestep may be fractional"""
+        pixels = interpolate(self.positions, time) * self.cell_size + (self.cell_size - self.agent_size) // 2
+        return np.rint(pixels).astype(np.int64)
+
+    def draw(self, time):
+        """
+        Draws frame at time onto surface
+        :param time: timestep, fractional time is between two timesteps
+        :return: list of changed rectangles
+        """
+        positions = self.get_positions(time)
+        size = self.agent_size
+        if self._drawn is None:
+            self.surface.blit(self.background, (0, 0))
+            moved = np.arange(len(positions))
+            changed = [self.surface.get_rect()]
+        else:
+            moved = np.flatnonzero((positions != self._drawn).any(axis=1))
+            changed = []
+            for x, y in self._drawn[moved].tolist():
+                rect = pygame.Rect(x, y, size, size)
+                self.surface.blit(self.background, rect, rect)
+                changed.append(rect)
+        for agent, (x, y) in zip(moved.tolist(), positions[moved].tolist()):
+            rect = pygame.Rect(x, y, size, size)
+            self.surface.fill(self.colors[agent], rect)
+            changed.append(rect)
+        self._drawn = positions
+        return changed
+
+    def frames(self):
+        """Generator drawing all frames one after another, yields the surface after every frame"""
+        self._drawn = None
+        for frame in range(self.get_frame_count()):
+            self.draw(frame / self.frames_per_step)
+            yield self.surface
+
+
+class PngWriter:
+    """Saves frames as numbered PNG files, run.png gives run_00000.png, run_00001.png, ..."""
+    def __init__(self, path):
+        self.stem = os.path.splitext(path)[0]
+        self.count = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def write(self, surface):
+        pygame.image.save(surface, f'{self.stem}_{self.count:05d}.png')
+        self.count += 1
+
+    def close(self):
+        pass
+
+
+class FfmpegWriter:
+    """Streams raw frames to ffmpeg process, which encodes them to MP4, GIF or any format it knows by extension"""
+    def __init__(self, path, size, fps):
+        """
+        :param path: output file
+        :param size: (width, height) of frames in pixels
+        :param fps: frames per second
+        """
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is None:
+            raise RuntimeError(f"{path}: ffmpeg is needed to write videos, save .png frames instead")
+        if path.endswith('.gif'):
+            output = ['-filter_complex', 'split[a][b];[a]palettegen[p];[b][p]paletteuse']
+        else:  # yuv420p keeps video playable everywhere, it needs even size
+            output = ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p']
+        command = [ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                   '-s', f'{size[0]}x{size[1]}', '-r', str(fps), '-i', '-'] + output + [path]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)  # pylint: disable=consider-using-with
+        self.count = 0
+
+    def write(self, surface):
+        self.process.stdin.write(pygame.image.tobytes(surface, 'RGB'))
+        self.count += 1
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed with exit code {self.process.returncode}")
+
+
+def open_writer(path, size, fps):
+    """PngWriter for .png path, FfmpegWriter for any other"""
+    if path.endswith('.png'):
+        return PngWriter(path)
+    return FfmpegWriter(path, size, fps)
+
+
+def export(grid_map, paths, goals, path, cell_size=10, fps=30, step_time=0.5):
+    """
+    Renders paths into video, GIF or PNG frames, works with dummy video driver (SDL_VIDEODRIVER=dummy)
+    :param path: output file, .png saves numbered frames
+    :return: number of written frames
+    """
+    renderer = FrameRenderer(grid_map, paths, goals, cell_size, fps, step_time)
+    writer = open_writer(path, renderer.size, fps)
+    try:
+        for surface in renderer.frames():
+            writer.write(surface)
+    finally:
+        writer.close()
+    return writer.count
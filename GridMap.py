@@ -0,0 +1,109 @@
+"""Module for class GridMap"""
+import numpy as np
+from Heuristic import UNREACHABLE
+
+
+class GridMap:
+    """Rectangular grid with obstacles
+       Cell (x, y) has integer id y * width + x, passable cells are kept in NumPy array
+       Neighbours of every cell are precomputed in CSR form - neighbours of cell are
+       targets[offsets[cell]:offsets[cell + 1]] - and as tuples of ids used by low level search,
+       the tuple of moves of cell starts with the cell itself (waiting) and is empty for blocked cells
+    """
+    def __init__(self, width, height, obstacles=frozenset()):
+        """
+        :param width: width of map
+        :param height: height of map
+        :param obstacles: frozenset of blocked (x, y) cells
+        """
+        self.width = width
+        self.height = height
+        self.size = width * height
+        self.obstacles = frozenset(obstacles)
+        self.passable = np.ones(self.size, dtype=bool)
+        blocked = [y * width + x for x, y in self.obstacles if 0 <= x < width and 0 <= y < height]
+        self.passable[np.array(blocked, dtype=np.int64)] = False
+        self.offsets, self.targets = self._build_csr()
+        targets = self.targets.tolist()
+        offsets = self.offsets.tolist()
+        self.moves = [(cell,) + tuple(targets[offsets[cell]:offsets[cell + 1]]) if self.passable[cell] else ()
+                      for cell in range(self.size)]
+
+    @property
+    def map_id(self):
+        """Key of map in HeuristicCache, same as the one used for width, height and obstacles"""
+        return self.width, self.height, self.obstacles
+
+    def _build_csr(self):
+        """Neighbours of all cells in order right, left, down, up, computed for whole grid at once"""
+        width, height = self.width, self.height
+        cells = np.arange(self.size, dtype=np.int64)
+        x, y = cells % width, cells // width
+        columns = []
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            inside = (x + dx >= 0) & (x + dx < width) & (y + dy >= 0) & (y + dy < height)
+            target = np.where(inside, cells + dy * width + dx, 0)
+            columns.append(np.where(inside & self.passable & self.passable[target], target, -1))
+        neighbours = np.stack(columns, axis=1)
+        valid = neighbours >= 0
+        offsets = np.zeros(self.size + 1, dtype=np.int32)
+        np.cumsum(valid.sum(axis=1), out=offsets[1:])
+        return offsets, neighbours[valid].astype(np.int32)
+
+    def cell(self, x, y):
+        """Id of cell (x, y)"""
+        return y * self.width + x
+
+    def coords(self, cell):
+        """Coordinates (x, y) of cell id"""
+        return cell % self.width, cell // self.width
+
+    def contains(self, x, y):
+        """True if (x, y) lies on map"""
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def is_passable(self, x, y):
+        """True if (x, y) lies on map and is not an obstacle"""
+        return self.contains(x, y) and bool(self.passable[y * self.width + x])
+
+    def neighbours(self, cell):
+        """Ids of passable cells next to cell"""
+        return self.moves[cell][1:]
+
+    def degree(self, cell):
+        """Number of passable cells next to cell"""
+        return int(self.offsets[cell + 1] - self.offsets[cell])
+
+    def neighbours_of(self, cells):
+        """Ids of passable neighbours of all cells in NumPy array, gathered from CSR arrays at once"""
+        starts = self.offsets[cells]
+        counts = self.offsets[cells + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            return np.zeros(0, dtype=self.targets.dtype)
+        # position of every gathered neighbour inside its cell's slice of targets
+        shift = np.repeat(np.cumsum(counts) - counts, counts)
+        return self.targets[np.repeat(starts, counts) + np.arange(total) - shift]
+
+    def distances(self, goal):
+        """
+        Distance of every cell to goal by breadth-first search, all cells of one distance are expanded at once
+        :param goal: (x, y) coordinates of goal
+        :return: flat NumPy array indexed by cell id, unreachable cells hold maximum of the dtype
+        """
+        dtype = np.uint16 if self.size < np.iinfo(np.uint16).max else np.uint32
+        unreachable = UNREACHABLE[np.dtype(dtype)]
+        dist = np.full(self.size, unreachable, dtype=dtype)
+        frontier = np.array([self.cell(*goal)], dtype=np.int64)
+        dist[frontier] = 0
+        d = 0
+        while frontier.size:
+            d += 1
+            candidates = self.neighbours_of(frontier)
+            frontier = np.unique(candidates[dist[candidates] == unreachable])
+            dist[frontier] = d
+        return dist
+
+    def get_memory_usage(self):
+        """Number of bytes taken by arrays of the map, without tuples of moves"""
+        return self.passable.nbytes + self.offsets.nbytes + self.targets.nbytes
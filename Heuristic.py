@@ -0,0 +1,124 @@
+"""Module with true distance heuristic for low level search"""
+import weakref
+from collections import OrderedDict, deque
+import numpy as np
+
+MOVES = ((1, 0), (-1, 0), (0, 1), (0, -1))
+# Unreachable cells hold maximum of the table dtype
+UNREACHABLE = {np.dtype(dtype): int(np.iinfo(dtype).max) for dtype in (np.uint16, np.uint32)}
+
+
+def backward_bfs(width, height, obstacles, goal):
+    """
+    Computes distance of every cell to goal by breadth-first search from goal
+    :param width: width of map
+    :param height: height of map
+    :param obstacles: set of blocked (x, y) cells
+    :param goal: (x, y) coordinates of goal
+    :return: flat NumPy array indexed by y * width + x, unreachable cells hold maximum of the dtype
+    """
+    unknown = -1
+    dist = [unknown] * (width * height)
+    gx, gy = goal
+    dist[gy * width + gx] = 0
+    queue = deque([goal])
+    while queue:
+        x, y = queue.popleft()
+        d = dist[y * width + x] + 1
+        for dx, dy in MOVES:
+            nx, ny = x + dx, y + dy
+            if nx < 0 or ny < 0 or nx >= width or ny >= height:
+                continue
+            index = ny * width + nx
+            if dist[index] != unknown or (nx, ny) in obstacles:
+                continue
+            dist[index] = d
+            queue.append((nx, ny))
+    dtype = np.uint16 if width * height < np.iinfo(np.uint16).max else np.uint32
+    res = np.array(dist, dtype=np.int64)
+    res[res == unknown] = UNREACHABLE[np.dtype(dtype)]
+    return res.astype(dtype)
+
+
+def unreachable_value(table):
+    """Value marking cells from which goal cannot be reached"""
+    return UNREACHABLE[table.dtype]
+
+
+class HeuristicCache:
+    """Bounded LRU cache of distance tables
+       Tables are keyed by (map id, goal), so the same goal is never searched twice on one map
+       Cache is bounded by number of tables and by bytes they take, so it holds a table for every agent
+       of large instances on small maps without growing without limit on large maps
+    """
+    def __init__(self, maxsize=4096, max_bytes=512 * 1024 * 1024):
+        """
+        :param maxsize: maximum number of tables kept in memory
+        :param max_bytes: maximum number of bytes taken by tables
+        """
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.tables = OrderedDict()
+        # equal maps share one map id object, so keys are compared by identity instead of comparing obstacles
+        self.map_ids = {}
+        self.grid_maps = weakref.WeakKeyDictionary()  # GridMap -> its shared map id
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, width, height, obstacles, goal, map_id=None):
+        """
+        Returns distance table to goal, computes it only when it is not cached yet
+        :param obstacles: frozenset of blocked cells
+        :param map_id: hashable identifier of map, width, height and obstacles are used if not given
+        """
+        if map_id is None:
+            map_id = (width, height, obstacles)
+        table = self._lookup((map_id, goal))
+        if table is None:
+            table = self._store((map_id, goal), backward_bfs(width, height, obstacles, goal))
+        return table
+
+    def get_for_map(self, grid_map, goal):
+        """Returns distance table to goal on GridMap, tables are shared with get for the same obstacles"""
+        map_id = self.grid_maps.get(grid_map)
+        if map_id is None:
+            map_id = self.grid_maps[grid_map] = self.map_ids.setdefault(grid_map.map_id, grid_map.map_id)
+        key = (map_id, goal)
+        table = self._lookup(key)
+        if table is None:
+            table = self._store(key, grid_map.distances(goal))
+        return table
+
+    def _lookup(self, key):
+        table = self.tables.get(key)
+        if table is not None:
+            self.hits += 1
+            self.tables.move_to_end(key)
+        return table
+
+    def _store(self, key, table):
+        self.misses += 1
+        self.tables[key] = table
+        self.nbytes += table.nbytes
+        while len(self.tables) > 1 and (len(self.tables) > self.maxsize or self.nbytes > self.max_bytes):
+            _, evicted = self.tables.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+        return table
+
+    def clear(self):
+        """Removes all cached tables"""
+        self.tables.clear()
+        self.map_ids.clear()
+        self.grid_maps.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_memory_usage(self):
+        """Number of bytes taken by cached tables"""
+        return self.nbytes
+
+
+# Cache shared by all solvers, so repeated runs on the same map reuse tables
+DEFAULT_CACHE = HeuristicCache()
@@ -1,9 +1,14 @@
 """Module for class HighLevel"""
 import heapq
-import copy
-from Astar import AstarSolver
+import time
+from collections import OrderedDict
+from ConflictTable import ConflictTable
+from ConstraintTable import ConstraintTable
+from GridMap import GridMap
+from SpaceTimeAstar import SpaceTimeAstarSolver
 from CTNode import CTNode
 from Node import Node
+from ParallelPlanner import ParallelPlanner, can_start_workers
 
 class HighLevel():
     """High Level represents the solver of MAPF problem using Conflict-based search
@@ -11,11 +16,29 @@ class HighLevel():
        Each instance of problem with given set of constraints is in CTNode class
        This class just creates CTNode instances and then solves them using Astar search implemented in AstarSolver
     """
-    def __init__(self):
+    def __init__(self, workers=0, incremental=False, max_search_trees=128):
+        """
+        :param workers: number of processes running low level searches in parallel, 0 or 1 plans in this process,
+                        so does solver running in daemonic process
+        :param incremental: child replans its agent by continuing search of the parent instead of from scratch
+        :param max_search_trees: number of saved low level searches kept for incremental replanning
+        """
+        self.workers = workers
+        self.incremental = incremental
+        self.max_search_trees = max_search_trees
+        self.search_trees = OrderedDict()  # (CTNode, agent) -> SearchTree, least recently used first
+        self.planner = None
         self.grid_size = 0
+        self.obstacles = frozenset()
+        self.grid_map = None
         self.start_coords = []
         self.end_coords = []
         self.solver = None
+        self.stats = {}
+        self._open_list_bytes = 0
+        self.conflict_table = None
+        self._deadline = None  # time.perf_counter() value when search runs out of time
+        self._cancel = None
 
     def _get_valid_int(self, prompt):
         """Helper to ensure user inputs an integer."""
@@ -82,79 +105,258 @@ class HighLevel():
             self.end_coords.append(Node(coords[0], coords[1], 0))
             
         print("\nInput successful. Initializing solver...")
-        self.solver = AstarSolver({}, self.grid_size, Node(0, 0, 0), Node(0, 0, 0))
-    
+        self.grid_map = GridMap(self.grid_size, self.grid_size, self.obstacles)
+        self.create_solver()
+
+    def load_instance(self, instance):
+        """Sets up solver for Instance loaded from file instead of reading user inputs"""
+        self.grid_size = instance.grid_size
+        self.obstacles = instance.obstacles
+        self.grid_map = GridMap(instance.width, instance.height, instance.obstacles)
+        self.start_coords = list(instance.starts)
+        self.end_coords = list(instance.goals)
+        self.create_solver()
+
+    def create_solver(self):
+        """Creates low level solver for current map"""
+        self.solver = SpaceTimeAstarSolver(ConstraintTable(), self.grid_size, Node(0, 0, 0), Node(0, 0, 0),
+                                           grid_map=self.grid_map)
+
+    def plan_path(self, agent, constraints, tree=None, added=None):
+        """
+        Finds path for agent with given ConstraintTable and counts low level expansions
+        :param tree: SearchTree of search with constraints without the added ones, continued when given
+        :param added: constraints added since the tree was saved
+        """
+        self.solver.change_config(self.start_coords[agent], self.end_coords[agent], constraints)
+        if tree is not None:
+            path = self.solver.replan(tree, added, 99999)
+        else:
+            path = self.solver.run(99999)
+        self.stats['low_level_expansions'] = self.stats.get('low_level_expansions', 0) + self.solver.expanded
+        return path
+
     def solve_ct_node(self,ctnode: CTNode):
         """
         Uses solver to get paths for all agents with constraints inside CTNode
         """
-        for i,(start,end) in enumerate(zip(self.start_coords,self.end_coords)):
-            self.solver.change_config(start,end,ctnode.get_constraint(i))
-            path = self.solver.run(99999)
+        if self.planner is not None:
+            paths = self._plan_parallel([(i, ctnode.get_constraint(i)) for i in range(len(self.start_coords))])
+        else:
+            paths = (False if self._stopped() else self.plan_path(i, ctnode.get_constraint(i))
+                     for i in range(len(self.start_coords)))
+        for agent, path in enumerate(paths):
             if not path:
                 return False
             ctnode.set_path(path)
+            self._save_search_tree(ctnode, agent)
         return True
 
-    def create_child_ct_node(self, agent,constraint: Node, parent_node: CTNode):
+    def _plan_parallel(self, tasks):
+        """
+        Plans paths for list of (agent, ConstraintTable) in worker processes
+        Workers get the time left, cancel is checked only before the tasks are sent
+        """
+        if self._stopped():
+            return [False] * len(tasks)
+        time_left = None if self._deadline is None else self._deadline - time.perf_counter()
+        paths = []
+        for path, expanded in self.planner.plan(tasks, time_left):
+            self.stats['low_level_expansions'] = self.stats.get('low_level_expansions', 0) + expanded
+            paths.append(path)
+        return paths
+
+    def create_child_ct_node(self, agent, constraint, parent_node: CTNode):
         """
         Creates child CT_node based on constraint specified in constraint
         Finds updated path only for the agent with new constraint
         :param agent - number of agent which will have new constraint added in new CTNode:
-        :param constraint - constraint of given agent:
+        :param constraint - vertex (Node) or edge ((Node, Node)) constraint of given agent:
         :param parent_node - parent node, which has all the constraints that the child will inherit:
         :return: CTNode child
         """
-        #creating copies and updating constraints
-        constraints = copy.deepcopy(parent_node.constraints)
-        constraints[agent][constraint.coords()] = constraint.timestep()
-        paths = copy.deepcopy(parent_node.paths)
+        #updating path for affected agent
+        tree = self._find_search_tree(parent_node, agent)
+        path = self.plan_path(agent, self._child_constraints(agent, constraint, parent_node), tree, constraint)
+        child = self._make_child(agent, constraint, parent_node, path)
+        if child:
+            self._save_search_tree(child, agent)
+        return child
+
+    def create_child_ct_nodes(self, collision, parent_node: CTNode):
+        """
+        Creates both children for collision, with parallel planner their paths are searched at the same time
+        :param collision - list of tuples (agent, constraint) returned by CTNode.get_first_collision:
+        :return: list of CTNode children, False for child whose path does not exist
+        """
+        if self.planner is None:
+            return [False if self._stopped() else self.create_child_ct_node(agent, constraint, parent_node)
+                    for agent, constraint in collision]
+        tasks = [(agent, self._child_constraints(agent, constraint, parent_node)) for agent, constraint in collision]
+        paths = self._plan_parallel(tasks)
+        return [self._make_child(agent, constraint, parent_node, path)
+                for (agent, constraint), path in zip(collision, paths)]
 
-        #creating child node
-        child_node = CTNode(constraints)
-        child_node.paths = paths
+    @staticmethod
+    def _child_constraints(agent, constraint, parent_node):
+        """ConstraintTable of agent in child - constraints of parent and the new one"""
+        #child shares constraints and paths with parent, only new constraint is stored
+        child_constraints = parent_node.get_constraint(agent)
+        child_constraints.add(constraint)
+        return child_constraints
 
-        #updating path for affected agent
-        start = self.start_coords[agent]
-        end = self.end_coords[agent]
-        self.solver.change_config(start, end, child_node.get_constraint(agent))
-        path = self.solver.run(99999)
-        #Path does not exist
+    def _find_search_tree(self, node, agent):
+        """Saved search of agent in node - search of nearest ancestor that added constraint for the agent"""
+        if not self.incremental:
+            return None
+        while node.parent is not None and (node.agent != agent or node.constraint is None):
+            node = node.parent
+        tree = self.search_trees.get((node, agent))
+        if tree is not None:
+            self.search_trees.move_to_end((node, agent))
+        return tree
+
+    def _save_search_tree(self, node, agent):
+        """Keeps last search of solver for agent in node, least recently used search is dropped"""
+        if not self.incremental or self.planner is not None or self.solver.last_tree is None:
+            return
+        self.search_trees[(node, agent)] = self.solver.last_tree
+        if len(self.search_trees) > self.max_search_trees:
+            self.search_trees.popitem(last=False)
+
+    def _make_child(self, agent, constraint, parent_node, path):
+        """Creates child CTNode with replanned path, False if path does not exist"""
         if not path:
             return False
-        child_node.paths[agent] = path
-        return child_node
+        conflict_pairs = self.conflict_table.get_child_pairs(parent_node, agent, path)
+        return CTNode(parent=parent_node, agent=agent, constraint=constraint, path=path, conflict_pairs=conflict_pairs)
 
+    def create_open_list(self):
+        """Open list of search, heap of (cost, number of conflicts, CTNode)"""
+        return []
 
-    def run(self,max_iterations):
+    def _push(self, q, node):
+        """Pushes CTNode to open list and keeps track of memory taken by the open list
+           Nodes with equal cost are ordered by number of conflicts
+        """
+        heapq.heappush(q, (node.get_cost(), node.count_collisions(), node))
+        self._track_push(node)
+
+    def _pop(self, q):
+        """Pops cheapest CTNode from open list, its sum of costs is lower bound of cost of any solution"""
+        _, _, node = heapq.heappop(q)
+        self._track_pop(node)
+        self.stats['lower_bound'] = node.get_cost() - len(self.start_coords)
+        return node
+
+    def _track_push(self, node):
+        """Counts generated node and memory taken by the open list"""
+        node_memory = node.get_memory_usage()
+        self.stats['ct_nodes_generated'] += 1
+        self.stats['ct_nodes_bytes'] += node_memory
+        self._open_list_bytes += node_memory
+        self.stats['peak_open_list_bytes'] = max(self.stats['peak_open_list_bytes'], self._open_list_bytes)
+
+    def _track_pop(self, node):
+        self._open_list_bytes -= node.get_memory_usage()
+
+    def get_average_node_memory(self):
+        """Average number of bytes owned by one generated CTNode in last run"""
+        if not self.stats.get('ct_nodes_generated'):
+            return 0
+        return self.stats['ct_nodes_bytes'] / self.stats['ct_nodes_generated']
+
+    def run(self, max_iterations, time_limit=None, cancel=None):
         """main method of HighLevel
            Starts without any constraints
            Uses min heap for storing CTNode instances
-           Whenever new CTNode is created it is saved to heap sorted by CTNode price
+           Whenever new CTNode is created it is saved to heap sorted by CTNode price and number of conflicts
            If CTNode has no conflicting paths - result is returned as 2D array of paths for each agent
+           :param max_iterations: maximum number of expanded CT nodes
+           :param time_limit: maximum number of seconds, low level searches of root and children give up
+                              when it runs out too
+           :param cancel: threading.Event or other object with is_set(), search stops soon after it is set
+        """
+        steps = self.search(max_iterations, time_limit, cancel)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as stop:
+                return stop.value
+
+    def search(self, max_iterations, time_limit=None, cancel=None):
+        """
+        Generator doing the same as run, yields number of expanded CT nodes after every expansion,
+        so the caller can watch stats['lower_bound'] or stop iterating at any time
+        Found paths (False if there are none) are returned as value of StopIteration
         """
-        q = []
-        start_constraints = [{} for x in self.start_coords] # creates empty dict of constraints
+        started = time.perf_counter()
+        self._deadline = None if time_limit is None else started + time_limit
+        self._cancel = cancel
+        self.solver.deadline, self.solver.cancel = self._deadline, cancel
+        self.stats = {'ct_nodes_generated': 0, 'ct_nodes_expanded': 0, 'ct_nodes_bytes': 0, 'peak_open_list_bytes': 0,
+                      'low_level_expansions': 0, 'lower_bound': 0, 'timeout': False, 'cancelled': False}
+        self.search_trees = OrderedDict()
+        if self.workers > 1 and can_start_workers():
+            self.planner = ParallelPlanner(self.grid_map, self.start_coords, self.end_coords, self.workers)
+        try:
+            paths = yield from self._search(max_iterations, time_limit, started, cancel)
+        finally:
+            if self.planner is not None:
+                self.planner.close()
+                self.planner = None
+            self.solver.deadline = self.solver.cancel = self._deadline = self._cancel = None
+            self.stats['wall_time'] = time.perf_counter() - started
+        return paths
+
+    def _search(self, max_iterations, time_limit, started, cancel):
+        """Best first search over constraint tree"""
+        q = self.create_open_list()
+        self._open_list_bytes = 0
+        start_constraints = [[] for x in self.start_coords] # creates empty list of constraints
         start_node = CTNode(start_constraints)
         if not self.solve_ct_node(start_node):
+            self._stopped()  # root may have failed because search ran out of time
             return False
-        heapq.heappush(q, (0, start_node))
+        self.conflict_table = ConflictTable(start_node)
+        self._push(q, start_node)
         cnt = 0
         while bool(q) and cnt < max_iterations:
-            _,current_node = heapq.heappop(q)
+            if self._stopped():
+                return False
+            current_node = self._pop(q)
 
-            # Collision returns list of tuples (Agent, Node)
-            collision = current_node.get_first_collision()
+            # Collision returns list of tuples (Agent, constraint)
+            collision = self.choose_collision(current_node)
 
             if not collision:
                 return current_node.paths
 
-            child1 = self.create_child_ct_node(collision[0][0],collision[0][1],current_node)
-            child2 = self.create_child_ct_node(collision[1][0],collision[1][1],current_node)
-            if not child1 or not child2:
-                return False
-
-            heapq.heappush(q,(child1.get_cost(),child1))
-            heapq.heappush(q,(child2.get_cost(),child2))
+            self.expand(q, current_node, collision)
             cnt += 1
+            self.stats['ct_nodes_expanded'] = cnt
+            yield cnt
+        return False
+
+    def _stopped(self):
+        """True when deadline of search passed or search was cancelled, the reason is set in stats"""
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            self.stats['timeout'] = True
+            return True
+        if self._cancel is not None and self._cancel.is_set():
+            self.stats['cancelled'] = True
+            return True
         return False
+
+    def choose_collision(self, node: CTNode):
+        """Returns collision the node is split on, False if its paths are conflict free"""
+        return node.get_first_collision()
+
+    def expand(self, q, node: CTNode, collision):
+        """
+        Creates children of node for both constraints of collision and pushes them to open list
+        Child whose agent has no path is dropped, its sibling is still explored
+        """
+        for child in self.create_child_ct_nodes(collision, node):
+            if child:
+                self._push(q, child)
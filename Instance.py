@@ -0,0 +1,150 @@
+"""Module for loading MAPF instances from files"""
+import os
+import numpy as np
+from Node import Node
+
+# Cells of MovingAI maps that agents can enter
+PASSABLE = '.GS'
+
+
+class Instance:
+    """Instance of MAPF problem - map with obstacles and start and goal position of every agent"""
+    def __init__(self, name, width, height, obstacles, starts, goals):
+        """
+        :param name: name used in benchmark results
+        :param width: width of map
+        :param height: height of map
+        :param obstacles: frozenset of blocked (x, y) cells
+        :param starts: list of starting Nodes
+        :param goals: list of goal Nodes
+        """
+        self.name = name
+        self.width = width
+        self.height = height
+        self.obstacles = obstacles
+        self.starts = starts
+        self.goals = goals
+
+    @property
+    def grid_size(self):
+        """Size of square grid the solver works on"""
+        return max(self.width, self.height)
+
+    def with_agents(self, count):
+        """Returns instance with only first count agents"""
+        if count > len(self.starts):
+            raise ValueError(f"{self.name} has only {len(self.starts)} agents, {count} requested")
+        return Instance(f"{self.name}:{count}", self.width, self.height, self.obstacles,
+                        self.starts[:count], self.goals[:count])
+
+
+def load_txt(path):
+    """
+    Loads instance in format of tests/*.txt - answers to prompts of HighLevel.get_inputs
+    Grid size, starting positions one per line, empty line, goal positions one per line
+    """
+    with open(path, encoding='utf-8') as file:
+        lines = [line.strip() for line in file]
+    size = int(lines[0])
+    starts, goals = [], []
+    i = 1
+    while i < len(lines) and lines[i]:
+        x, y = map(int, lines[i].split())
+        starts.append(Node(x, y, 0))
+        i += 1
+    for line in lines[i + 1:i + 1 + len(starts)]:
+        x, y = map(int, line.split())
+        goals.append(Node(x, y, 0))
+    if len(goals) != len(starts):
+        raise ValueError(f"{path}: expected {len(starts)} goal positions, found {len(goals)}")
+    return Instance(os.path.basename(path), size, size, frozenset(), starts, goals)
+
+
+def load_map(path):
+    """
+    Loads MovingAI .map file
+    :return: tuple of width, height and frozenset of blocked cells
+    """
+    with open(path, encoding='utf-8') as file:
+        lines = file.read().splitlines()
+    header = {}
+    i = 0
+    while lines[i].strip() != 'map':
+        key, value = lines[i].split()
+        header[key] = value
+        i += 1
+    width, height = int(header['width']), int(header['height'])
+    obstacles = set()
+    for y, row in enumerate(lines[i + 1:i + 1 + height]):
+        for x, cell in enumerate(row[:width]):
+            if cell not in PASSABLE:
+                obstacles.add((x, y))
+    return width, height, frozenset(obstacles)
+
+
+def load_scen(path, map_dir=None):
+    """
+    Loads MovingAI .scen file with all its agents, map is searched in map_dir or next to the scenario
+    """
+    with open(path, encoding='utf-8') as file:
+        lines = file.read().splitlines()
+    starts, goals = [], []
+    map_name = None
+    for line in lines[1:]:
+        if not line.strip():
+            continue
+        fields = line.split('\t')
+        map_name = fields[1]
+        starts.append(Node(int(fields[4]), int(fields[5]), 0))
+        goals.append(Node(int(fields[6]), int(fields[7]), 0))
+    if map_name is None:
+        raise ValueError(f"{path}: scenario has no agents")
+    map_path = os.path.join(map_dir if map_dir else os.path.dirname(path), os.path.basename(map_name))
+    width, height, obstacles = load_map(map_path)
+    return Instance(os.path.basename(path), width, height, obstacles, starts, goals)
+
+
+def save_npz(instance, path):
+    """
+    Saves instance as compressed .npz file, obstacles are kept as bitmap of map
+    Loading it does not parse any text, which matters for large maps with many agents
+    """
+    blocked = np.zeros((instance.height, instance.width), dtype=bool)
+    if instance.obstacles:
+        xs, ys = np.array(sorted(instance.obstacles)).T
+        blocked[ys, xs] = True
+    np.savez_compressed(path, name=np.array(instance.name), size=np.array([instance.width, instance.height]),
+                        blocked=np.packbits(blocked),
+                        starts=np.array([x.coords() for x in instance.starts], dtype=np.int32).reshape(-1, 2),
+                        goals=np.array([x.coords() for x in instance.goals], dtype=np.int32).reshape(-1, 2))
+
+
+def load_npz(path):
+    """Loads instance saved by save_npz"""
+    with np.load(path) as data:
+        width, height = data['size'].tolist()
+        blocked = np.unpackbits(data['blocked'], count=width * height).reshape(height, width)
+        ys, xs = np.nonzero(blocked)
+        return Instance(str(data['name']), width, height, frozenset(zip(xs.tolist(), ys.tolist())),
+                        [Node(x, y, 0) for x, y in data['starts'].tolist()],
+                        [Node(x, y, 0) for x, y in data['goals'].tolist()])
+
+
+def load_instances(paths, agent_counts=None, map_dir=None):
+    """
+    Loads instances from .txt, .scen and .npz files
+    :param agent_counts: list of numbers of agents, every .scen or .npz instance is split into instances
+                         with first n agents
+    :return: list of Instance
+    """
+    res = []
+    for path in paths:
+        if path.endswith('.scen') or path.endswith('.npz'):
+            instance = load_scen(path, map_dir) if path.endswith('.scen') else load_npz(path)
+            if agent_counts:
+                res.extend(instance.with_agents(n) for n in agent_counts if n <= len(instance.starts))
+            else:
+                res.append(instance)
+        else:
+            res.append(load_txt(path))
+    return res
@@ -0,0 +1,175 @@
+"""Module for class Instrumentation"""
+import json
+import sys
+import time
+import tracemalloc
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Methods of HighLevel and its subclasses that are timed, method name -> timer name
+# Timers are inclusive, time of expansion contains time of low level searches it started
+TIMED_METHODS = {
+    'expand': 'high_level_expansion',
+    'plan_path': 'low_level_search',
+    'choose_collision': 'conflict_detection',
+    '_make_child': 'child_creation',  # counting conflicts of child path included
+    '_child_constraints': 'constraint_copy',
+    '_push': 'open_list_push',
+    '_pop': 'open_list_pop',
+}
+
+
+class Instrumentation:
+    """Counters, timers and peaks of one run of solver
+       Timed methods are wrapped on the solver instance by attach and unwrapped by detach,
+       so solver that is not instrumented runs its methods directly and pays nothing
+       With trace every timed call is kept as event of Chrome trace format (chrome://tracing, Perfetto)
+    """
+    def __init__(self, trace=False, max_events=200000, trace_memory=False):
+        """
+        :param trace: keep every timed call as trace event
+        :param max_events: calls over this number are only counted, so long runs do not fill memory
+        :param trace_memory: measure peak memory allocated by Python during the run with tracemalloc, slows it down
+        """
+        self.trace = trace
+        self.max_events = max_events
+        self.trace_memory = trace_memory
+        self.counters = {}
+        self.timers = {}  # timer name -> [number of calls, seconds]
+        self.peaks = {}
+        self.events = []  # (name, start, duration) in seconds since creation
+        self.dropped_events = 0
+        self.origin = time.perf_counter()
+        self.stats = {}
+        self._solver = None
+
+    def attach(self, solver):
+        """Wraps timed methods of solver (HighLevel or its subclass), starts memory tracing if enabled"""
+        self._solver = solver
+        for method, timer in TIMED_METHODS.items():
+            if hasattr(solver, method):
+                setattr(solver, method, self._timed(getattr(solver, method), timer))
+        solver.plan_path = self._counted_plan_path(solver.plan_path, solver)
+        solver._push = self._measured_push(solver._push)  # pylint: disable=protected-access
+        planner = getattr(solver, 'prioritized', None)
+        if planner is not None:  # prioritized planning and PBS plan agents without plan_path
+            planner.plan_agent = self._counted_plan_agent(self._timed(planner.plan_agent, 'low_level_search'),
+                                                          planner)
+        if self.trace_memory:
+            tracemalloc.start()
+        return self
+
+    def detach(self):
+        """Restores methods of solver and keeps its stats"""
+        solver = self._solver
+        for method in TIMED_METHODS:
+            solver.__dict__.pop(method, None)
+        planner = getattr(solver, 'prioritized', None)
+        if planner is not None:
+            planner.__dict__.pop('plan_agent', None)
+        if self.trace_memory:
+            self.peaks['traced_bytes'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        if resource is not None:
+            # high-water mark of whole process since it started, not of this run - runs after the first one
+            # report the same or larger value, trace_memory measures the run alone
+            scale = 1 if sys.platform == 'darwin' else 1024  # kilobytes on Linux, bytes on macOS
+            self.peaks['process_peak_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+        self.stats = dict(solver.stats)
+        self._solver = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        if self._solver is not None:
+            self.detach()
+
+    def _timed(self, method, name):
+        """Returns method that adds its time to timer name"""
+        timer = self.timers.setdefault(name, [0, 0.0])
+        events = self.events
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                duration = time.perf_counter() - start
+                timer[0] += 1
+                timer[1] += duration
+                if self.trace:
+                    if len(events) < self.max_events:
+                        events.append((name, start - self.origin, duration))
+                    else:
+                        self.dropped_events += 1
+        return timed
+
+    def _counted_plan_path(self, plan_path, solver):
+        """Returns plan_path that counts low level searches and their expanded and generated states"""
+        def counted(*args, **kwargs):
+            path = plan_path(*args, **kwargs)
+            self.count('low_level_searches')
+            self.count('low_level_expanded', solver.solver.expanded)
+            self.count('low_level_generated', solver.solver.generated)
+            return path
+        return counted
+
+    def _counted_plan_agent(self, plan_agent, planner):
+        """Returns plan_agent of PrioritizedPlanner that counts low level searches and their states"""
+        def counted(*args, **kwargs):
+            expanded, generated = planner.expanded, planner.generated
+            result = plan_agent(*args, **kwargs)
+            self.count('low_level_searches')
+            self.count('low_level_expanded', planner.expanded - expanded)
+            self.count('low_level_generated', planner.generated - generated)
+            return result
+        return counted
+
+    def _measured_push(self, push):
+        """Returns _push that keeps the largest size of open list"""
+        def measured(q, node):
+            push(q, node)
+            self.peak('open_list', len(q))
+        return measured
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def peak(self, name, value):
+        if value > self.peaks.get(name, 0):
+            self.peaks[name] = value
+
+    def report(self):
+        """Dictionary with counters, timers, peaks and stats of solver, ready for json"""
+        return {
+            'counters': dict(self.counters),
+            'timers': {name: {'calls': calls, 'seconds': seconds} for name, (calls, seconds) in self.timers.items()},
+            'peaks': dict(self.peaks),
+            'dropped_events': self.dropped_events,
+            'stats': self.stats,
+        }
+
+    def get_trace_events(self, pid=0, label=None):
+        """Trace events in Chrome trace format, times are in microseconds"""
+        events = [{'name': name, 'ph': 'X', 'ts': start * 1e6, 'dur': duration * 1e6, 'pid': pid, 'tid': 0}
+                  for name, start, duration in self.events]
+        if label is not None:
+            events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': label}})
+        return events
+
+
+def save_trace(path, runs):
+    """
+    Saves reports and trace events of runs into one JSON file, which can be opened in chrome://tracing or Perfetto
+    :param runs: list of tuples (label, Instrumentation), every run is shown as separate process
+    """
+    data = {
+        'runs': [dict(label=label, **instrumentation.report()) for label, instrumentation in runs],
+        'traceEvents': [event for pid, (label, instrumentation) in enumerate(runs)
+                        for event in instrumentation.get_trace_events(pid, label)],
+    }
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(data, file)
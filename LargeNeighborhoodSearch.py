@@ -0,0 +1,249 @@
+"""Module for class LargeNeighborhoodSearch"""
+import csv
+import random
+import time
+from ConflictDetector import ConflictDetector
+from Heuristic import DEFAULT_CACHE
+from ParallelPlanner import ParallelPlanner, can_start_workers
+from PlanArchive import Plan
+from PrioritizedPlanner import PrioritizedPlanner
+
+# Ways of choosing neighborhood - agents whose paths are destroyed and planned again
+OPERATORS = ('random', 'agent', 'map')
+# Weight of operator never drops below this, so every operator keeps being tried
+MIN_WEIGHT = 0.01
+
+
+class LargeNeighborhoodSearch:
+    """Large neighborhood search improving sum of costs of conflict free paths (MAPF-LNS)
+       In every iteration a small group of agents (neighborhood) is chosen, their paths are removed and planned
+       again by prioritized planning in random order against paths of all other agents
+       New paths are kept only if they are cheaper, so every kept solution is conflict free
+       Neighborhood is chosen by one of operators:
+       random - random agents
+       agent - agent with the largest delay and agents whose paths visit cells of its shortest path
+       map - agents whose paths visit cells around random visited cell
+       Operator is picked at random with adaptive weights, weight of operator moves towards
+       improvement per agent it achieved (adaptive LNS)
+       With workers > 1 several disjoint neighborhoods are planned at once in worker processes,
+       improvements are kept from the best one while they do not collide with each other,
+       workers get paths packed in Plan, which is packed again only after paths changed
+    """
+    def __init__(self, grid_map, starts, goals, heuristic_cache=DEFAULT_CACHE, neighborhood_size=8, workers=0,
+                 seed=0, reaction=0.1):
+        """
+        :param grid_map: GridMap the agents move on
+        :param starts: list of starting Nodes
+        :param goals: list of goal Nodes
+        :param heuristic_cache: HeuristicCache with distance tables
+        :param neighborhood_size: number of agents planned again in one iteration
+        :param workers: number of processes planning neighborhoods in parallel, 0 or 1 plans in this process,
+                        so does search running in daemonic process
+        :param seed: seed of random choices, the same seed gives the same result without workers
+        :param reaction: how fast weights of operators follow their recent improvements, from 0 to 1
+        """
+        self.grid_map = grid_map
+        self.starts = starts
+        self.goals = goals
+        self.heuristic_cache = heuristic_cache
+        self.neighborhood_size = neighborhood_size
+        self.workers = workers
+        self.seed = seed
+        self.reaction = reaction
+        self.planner = PrioritizedPlanner(grid_map, starts, goals, heuristic_cache)
+        # costs of shortest paths ignoring other agents
+        self.distances = [int(heuristic_cache.get_for_map(grid_map, goal.coords())[grid_map.cell(*start.coords())])
+                          for start, goal in zip(starts, goals)]
+        self.weights = dict.fromkeys(OPERATORS, 1.0)
+        self.log = []  # (seconds since start, iteration, sum of costs) at start and after every improvement
+        self.stats = {}
+        self._rng = random.Random(seed)
+        self._tabu = set()
+        self._plan = None  # paths packed for workers, None when paths changed since packing
+
+    def get_cost(self, paths):
+        """Sum of costs of paths"""
+        return sum(len(path) - 1 for path in paths)
+
+    def improve(self, paths, time_limit, max_iterations=float('inf'), cancel=None):
+        """
+        Improves paths until time limit or number of iterations runs out
+        :param paths: conflict free paths of all agents, e.g. result of HighLevel.run
+        :param time_limit: seconds for whole search
+        :param max_iterations: maximum number of iterations, iteration plans one neighborhood in every worker
+        :param cancel: threading.Event or other object with is_set(), search stops after iteration when it is set
+        :return: the cheapest paths found
+        """
+        steps = self.search(paths, time_limit, max_iterations, cancel)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as stop:
+                return stop.value
+
+    def search(self, paths, time_limit, max_iterations=float('inf'), cancel=None):
+        """
+        Generator doing the same as improve, yields the cheapest paths after every iteration
+        The cheapest paths are returned as value of StopIteration
+        Search stops early when every agent follows its shortest path
+        """
+        started = time.perf_counter()
+        self._rng = random.Random(self.seed)
+        self._tabu = set()
+        self._plan = None
+        self.weights = dict.fromkeys(OPERATORS, 1.0)
+        paths = list(paths)
+        cost = self.get_cost(paths)
+        lower_bound = sum(self.distances)
+        self.stats = {'iterations': 0, 'improvements': 0, 'initial_cost': cost, 'cost': cost,
+                      'lower_bound': lower_bound, 'low_level_expansions': 0,
+                      'operators': dict.fromkeys(OPERATORS, 0), 'cancelled': False}
+        self.log = [(0.0, 0, cost)]
+        pool = None
+        if self.workers > 1 and can_start_workers():
+            pool = ParallelPlanner(self.grid_map, self.starts, self.goals, self.workers, self.heuristic_cache)
+        try:
+            iteration = 0
+            while iteration < max_iterations and cost > lower_bound and time.perf_counter() - started < time_limit:
+                if cancel is not None and cancel.is_set():
+                    self.stats['cancelled'] = True
+                    break
+                iteration += 1
+                if self._iterate(paths, pool):
+                    new_cost = self.get_cost(paths)
+                    if new_cost < cost:
+                        cost = new_cost
+                        self.stats['improvements'] += 1
+                        self.log.append((time.perf_counter() - started, iteration, cost))
+                self.stats['iterations'] = iteration
+                self.stats['cost'] = cost
+                yield paths
+        finally:
+            if pool is not None:
+                pool.close()
+            self.stats['wall_time'] = time.perf_counter() - started
+        return paths
+
+    def _iterate(self, paths, pool):
+        """Destroys and replans neighborhoods once, improvements are written into paths, True if there was any"""
+        count = pool.workers if pool is not None else 1
+        neighborhoods = []
+        used = set()
+        for _ in range(count):
+            operator = self._rng.choices(OPERATORS, [self.weights[x] for x in OPERATORS])[0]
+            agents = [agent for agent in self.choose_neighborhood(operator, paths) if agent not in used]
+            if agents:
+                self._rng.shuffle(agents)  # random priorities
+                used.update(agents)
+                neighborhoods.append((operator, agents))
+        if pool is not None:
+            if self._plan is None:
+                self._plan = Plan.from_paths(paths, self.grid_map.width, self.grid_map.height)
+            results = pool.replan(self._plan, [agents for _, agents in neighborhoods])
+        else:
+            results = []
+            for _, agents in neighborhoods:
+                new_paths = self.planner.replan(paths, agents)
+                results.append((new_paths, self.planner.expanded))
+
+        candidates = []
+        for (operator, agents), (new_paths, expanded) in zip(neighborhoods, results):
+            self.stats['low_level_expansions'] += expanded
+            self.stats['operators'][operator] += 1
+            gain = 0
+            if new_paths:
+                gain = sum(len(paths[agent]) for agent in agents) - sum(len(path) for path in new_paths)
+            self._update_weight(operator, max(gain, 0) / len(agents))
+            if gain > 0:
+                candidates.append((gain, agents, new_paths))
+
+        # neighborhoods were planned against old paths of each other, the later ones must not collide with kept ones
+        candidates.sort(key=lambda x: x[0], reverse=True)
+        kept = []
+        for _, agents, new_paths in candidates:
+            if kept and ConflictDetector(kept + new_paths).count_conflicts():
+                continue
+            kept.extend(new_paths)
+            for agent, path in zip(agents, new_paths):
+                paths[agent] = path
+            self._plan = None
+        return bool(kept)
+
+    def _update_weight(self, operator, improvement):
+        self.weights[operator] = max(MIN_WEIGHT, self.reaction * improvement +
+                                     (1 - self.reaction) * self.weights[operator])
+
+    def choose_neighborhood(self, operator, paths):
+        """Returns list of agents chosen by operator, at most neighborhood_size of them"""
+        size = min(self.neighborhood_size, len(paths))
+        if operator == 'agent':
+            agents = self._agent_neighborhood(paths, size)
+            if agents:
+                return agents
+        elif operator == 'map':
+            return self._map_neighborhood(paths, size)
+        return self._rng.sample(range(len(paths)), size)
+
+    def _agent_neighborhood(self, paths, size):
+        """
+        The most delayed agent that was not chosen recently and agents that may block its shortest path
+        :return: list of agents, empty if no agent is delayed
+        """
+        delays = [len(path) - 1 - distance for path, distance in zip(paths, self.distances)]
+        candidates = [agent for agent, delay in enumerate(delays) if delay > 0 and agent not in self._tabu]
+        if not candidates:
+            self._tabu = set()
+            candidates = [agent for agent, delay in enumerate(delays) if delay > 0]
+            if not candidates:
+                return []
+        agent = max(candidates, key=lambda x: delays[x])
+        self._tabu.add(agent)
+
+        # shortest path ignoring other agents follows decreasing distance to goal
+        grid_map = self.grid_map
+        table = self.heuristic_cache.get_for_map(grid_map, self.goals[agent].coords())
+        cell = grid_map.cell(*self.starts[agent].coords())
+        cells = {cell}
+        while table[cell] > 0:
+            cell = min(grid_map.moves[cell], key=lambda x: table[x])
+            cells.add(cell)
+        blocking = [other for other, path in enumerate(paths)
+                    if other != agent and any(grid_map.cell(x, y) in cells for x, y in path)]
+        if len(blocking) > size - 1:
+            blocking = self._rng.sample(blocking, size - 1)
+        return [agent] + blocking
+
+    def _map_neighborhood(self, paths, size):
+        """Agents visiting cells around random visited cell, cells are added by breadth first search"""
+        grid_map = self.grid_map
+        visitors = {}  # cell -> agents whose paths visit it
+        for agent, path in enumerate(paths):
+            for x, y in path:
+                visitors.setdefault(grid_map.cell(x, y), set()).add(agent)
+        path = paths[self._rng.randrange(len(paths))]
+        center = grid_map.cell(*path[self._rng.randrange(len(path))])
+        agents = []
+        chosen = set()
+        visited = {center}
+        frontier = [center]
+        while frontier and len(agents) < size:
+            next_frontier = []
+            for cell in frontier:
+                new = sorted(visitors.get(cell, set()) - chosen)
+                self._rng.shuffle(new)
+                new = new[:size - len(agents)]
+                agents.extend(new)
+                chosen.update(new)
+                for neighbor in grid_map.moves[cell]:
+                    if neighbor not in visited:
+                        visited.add(neighbor)
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+        return agents
+
+    def save_log(self, path):
+        """Saves cost over time as CSV with columns seconds, iteration, sum_of_costs"""
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['seconds', 'iteration', 'sum_of_costs'])
+            writer.writerows(self.log)
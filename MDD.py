@@ -0,0 +1,49 @@
+"""Module for class MDD"""
+
+
+class MDD:
+    """Multi-valued decision diagram of one agent
+       Level t holds every cell the agent can occupy at timestep t on some path of the given cost
+       that satisfies its constraints. Level with single cell means all such paths go through it.
+    """
+    def __init__(self, solver, cost):
+        """
+        :param solver: SpaceTimeAstarSolver configured with start, goal and constraints of agent
+        :param cost: number of moves of the paths, length of path - 1
+        """
+        self.cost = cost
+        self.levels = self._build(solver, cost)
+
+    @staticmethod
+    def _build(solver, cost):
+        """Forward pass collects cells reachable in time that can still reach goal, backward pass removes dead ends"""
+        grid_map = solver.grid_map
+        moves = grid_map.moves
+        vertex, edge = solver.cell_constraints()
+        goal = grid_map.cell(*solver.end.coords())
+        dist = memoryview(solver.get_distance_table())
+        levels = [{grid_map.cell(*solver.start.coords())}]
+        for t in range(1, cost + 1):
+            forbidden = vertex.get(t, ())
+            forbidden_moves = edge.get(t, ())
+            levels.append({neighbor for cell in levels[-1] for neighbor in moves[cell]
+                           if dist[neighbor] <= cost - t and neighbor not in forbidden
+                           and (cell, neighbor) not in forbidden_moves})
+        levels[cost] &= {goal}
+        for t in range(cost - 1, -1, -1):
+            following = levels[t + 1]
+            forbidden_moves = edge.get(t + 1, ())
+            levels[t] = {cell for cell in levels[t]
+                         if any(neighbor in following and (cell, neighbor) not in forbidden_moves
+                                for neighbor in moves[cell])}
+        return [{grid_map.coords(cell) for cell in level} for level in levels]
+
+    def width(self, t):
+        """Number of cells at level t, agent stays at goal after its cost"""
+        return len(self.levels[t]) if t <= self.cost else 1
+
+    def is_singleton(self, cell, t):
+        """True if every path of this cost is at cell in timestep t"""
+        if t > self.cost:
+            return cell in self.levels[self.cost]
+        return self.levels[t] == {cell}
@@ -1,4 +1,6 @@
 class Node:
+    __slots__ = ('x', 'y', 't')
+
     def __init__(self,x,y,timestep):
         self.x = x
         self.y = y
@@ -9,7 +11,7 @@ class Node:
     def __eq__(self, other):
         if not isinstance(other, Node):
             return False
-        return (self.x, self.y, self.t) == (other.x, other.y, other.t)
+        return self.x == other.x and self.y == other.y and self.t == other.t
 
     def __hash__(self):
         return hash((self.x, self.y, self.t))
@@ -0,0 +1,113 @@
+"""Module for class ParallelPlanner"""
+import multiprocessing
+import time
+from ConstraintTable import ConstraintTable
+from Heuristic import DEFAULT_CACHE
+from Node import Node
+from PlanArchive import Plan
+from PrioritizedPlanner import PrioritizedPlanner
+from SpaceTimeAstar import SpaceTimeAstarSolver
+
+# Solver of worker process, created once when worker starts
+_solver = None
+_prioritized = None
+_starts = []
+_goals = []
+
+
+def _init_worker(grid_map, starts, goals, heuristic_cache):
+    """Creates solver of worker, map and heuristic tables are inherited from parent and never sent again"""
+    global _solver, _prioritized, _starts, _goals  # pylint: disable=global-statement
+    _solver = SpaceTimeAstarSolver(ConstraintTable(), 0, Node(0, 0, 0), Node(0, 0, 0),
+                                   heuristic_cache=heuristic_cache, grid_map=grid_map)
+    _prioritized = PrioritizedPlanner(grid_map, starts, goals, heuristic_cache)
+    _starts = starts
+    _goals = goals
+
+
+def _plan(task):
+    """
+    Finds path for one agent, task is tuple of agent number, its ConstraintTable
+    and time.time() value when the search gives up (perf_counter of parent is not comparable in worker)
+    """
+    agent, constraints, give_up = task
+    _solver.change_config(_starts[agent], _goals[agent], constraints)
+    _solver.deadline = None if give_up is None else time.perf_counter() + give_up - time.time()
+    path = _solver.run(99999)
+    return path, _solver.expanded
+
+
+def _replan(task):
+    """
+    Plans group of agents again against paths of other agents
+    Task is tuple of cells and lengths of Plan with paths of all agents and agents to plan again,
+    only paths of other agents are decoded
+    """
+    cells, lengths, agents = task
+    grid_map = _prioritized.grid_map
+    plan = Plan(cells, lengths, grid_map.width, grid_map.height)
+    replanned = set(agents)
+    paths = [None if agent in replanned else plan[agent] for agent in range(plan.agents)]
+    new_paths = _prioritized.replan(paths, agents)
+    return new_paths, _prioritized.expanded
+
+
+def can_start_workers():
+    """
+    Daemonic processes, e.g. workers of benchmark sweep, are not allowed to have children,
+    solvers running in them plan in their own process instead
+    """
+    return not multiprocessing.current_process().daemon
+
+
+class ParallelPlanner:
+    """Pool of processes running independent low level searches
+       Map, starting and goal positions and heuristic tables are given to workers once when they start
+       (with fork they are shared with parent without copying), only constraints are sent with every search
+    """
+    def __init__(self, grid_map, starts, goals, workers, heuristic_cache=DEFAULT_CACHE):
+        """
+        :param grid_map: GridMap agents move on
+        :param starts: list of starting Nodes
+        :param goals: list of goal Nodes
+        :param workers: number of processes
+        :param heuristic_cache: HeuristicCache, tables for all goals are computed before workers start
+        """
+        for goal in goals:
+            heuristic_cache.get_for_map(grid_map, goal.coords())
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        self.workers = workers
+        self.pool = context.Pool(workers, _init_worker, (grid_map, starts, goals, heuristic_cache))
+
+    def plan(self, tasks, time_left=None):
+        """
+        Runs searches in parallel
+        :param tasks: list of tuples (agent, ConstraintTable)
+        :param time_left: seconds after which searches give up and return False, None for no limit
+        :return: list of tuples (path or False, number of expanded states) in order of tasks
+        """
+        give_up = None if time_left is None else time.time() + time_left
+        chunksize = max(1, len(tasks) // (self.workers * 4))
+        return self.pool.map(_plan, [(agent, constraints, give_up) for agent, constraints in tasks], chunksize)
+
+    def replan(self, plan, neighborhoods):
+        """
+        Replans groups of agents in parallel with PrioritizedPlanner.replan
+        Paths are sent packed as arrays of cell ids, not as lists of coordinates
+        :param plan: Plan with paths of all agents, the groups avoid paths of other agents in it
+        :param neighborhoods: list of lists of agents to plan again
+        :return: list of tuples (new paths of agents or False, number of expanded states) in order of neighborhoods
+        """
+        return self.pool.map(_replan, [(plan.cells, plan.lengths, agents) for agents in neighborhoods], 1)
+
+    def close(self):
+        """Stops worker processes"""
+        self.pool.terminate()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
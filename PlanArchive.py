@@ -0,0 +1,180 @@
+"""Module for classes Plan and PlanArchive"""
+import json
+import os
+import numpy as np
+from Node import Node
+
+INDEX_FILE = 'index.json'
+
+
+def get_cell_dtype(width, height):
+    """The smallest unsigned type holding every cell id y * width + x of map"""
+    return np.uint16 if width * height <= 1 << 16 else np.uint32
+
+
+class Plan:
+    """Paths of all agents stored as array (timestep, agent) of cell ids y * width + x
+       Agent stays at its goal after its path ends, lengths keep number of positions of every path
+       Array may be memory mapped from file, so plan of any size is opened at once
+       Plan behaves like list of paths, path is decoded to (x, y) coordinates only when it is asked for
+       Rows are timesteps, so positions of all agents at one timestep are read from one place of file
+    """
+    def __init__(self, cells, lengths, width, height, name=''):
+        """
+        :param cells: array (timestep, agent) of cell ids, may be numpy.memmap
+        :param lengths: array with number of positions of every path
+        :param width: width of map
+        :param height: height of map
+        :param name: name of plan, e.g. instance it solves
+        """
+        self.cells = cells
+        self.lengths = lengths
+        self.width = width
+        self.height = height
+        self.name = name
+
+    @classmethod
+    def from_paths(cls, paths, width, height, name=''):
+        """Packs list of paths (lists of (x, y) coordinates) into Plan"""
+        lengths = np.fromiter((len(path) for path in paths), dtype=np.int32, count=len(paths))
+        steps = int(lengths.max()) if len(paths) else 1
+        coords = np.array([xy for path in paths for xy in path], dtype=np.int64).reshape(-1, 2)
+        ids = coords[:, 1] * width + coords[:, 0]
+        starts = np.cumsum(lengths) - lengths
+        agents = np.repeat(np.arange(len(paths)), lengths)
+        cells = np.empty((steps, len(paths)), dtype=get_cell_dtype(width, height))
+        cells[np.arange(len(ids)) - starts[agents], agents] = ids
+        if len(paths):
+            goals = ids[starts + lengths - 1]
+            padding = np.arange(steps)[:, None] >= lengths[None, :]
+            cells[padding] = np.broadcast_to(goals, cells.shape)[padding]
+        return cls(cells, lengths, width, height, name)
+
+    @property
+    def agents(self):
+        return self.cells.shape[1]
+
+    @property
+    def makespan(self):
+        return int(self.lengths.max()) - 1 if self.agents else 0
+
+    def get_sum_of_costs(self):
+        return int((np.asarray(self.lengths, dtype=np.int64) - 1).sum())
+
+    def __len__(self):
+        return self.agents
+
+    def __getitem__(self, agent):
+        """Path of agent as list of (x, y) coordinates"""
+        if not -self.agents <= agent < self.agents:
+            raise IndexError(f"plan has {self.agents} agents")
+        cells = np.asarray(self.cells[:self.lengths[agent], agent], dtype=np.int64)
+        return list(zip((cells % self.width).tolist(), (cells // self.width).tolist()))
+
+    def __iter__(self):
+        return (self[agent] for agent in range(self.agents))
+
+    def to_paths(self):
+        """All paths as lists of (x, y) coordinates, reads whole plan into memory"""
+        return list(self)
+
+    def get_positions(self, timestep):
+        """Cell coordinates of all agents at timestep as array (agent, 2)"""
+        cells = np.asarray(self.cells[timestep], dtype=np.int64)
+        return np.stack((cells % self.width, cells // self.width), axis=1).astype(np.float64)
+
+    def get_goals(self):
+        """Goal Nodes - the last positions of paths"""
+        return [Node(int(x), int(y), 0) for x, y in self.get_positions(-1)]
+
+    def save(self, path):
+        """Saves plan as compressed .npz file, for plans that are loaded whole, see PlanArchive for large ones"""
+        np.savez_compressed(path, cells=np.asarray(self.cells), lengths=np.asarray(self.lengths),
+                            size=np.array([self.width, self.height]), name=np.array(self.name))
+
+
+class PositionView:
+    """Positions of agents of Plan indexed by timestep like array of FrameRenderer.pack_positions
+       Timestep is decoded when it is accessed, so memory mapped plan is never read as a whole
+    """
+    def __init__(self, plan):
+        self.plan = plan
+
+    def __len__(self):
+        return self.plan.makespan + 1
+
+    def __getitem__(self, timestep):
+        return self.plan.get_positions(timestep)
+
+
+def load_plan(path):
+    """Loads Plan saved by Plan.save"""
+    with np.load(path) as data:
+        width, height = data['size'].tolist()
+        return Plan(data['cells'], data['lengths'], width, height, str(data['name']))
+
+
+class PlanArchive:
+    """Directory with many plans, e.g. all plans of benchmark sweep
+       Every plan is one .npy file with its cells and one with its lengths, index.json keeps names and sizes
+       Plans are opened as memory mapped arrays, only the parts that are read are loaded from disk
+    """
+    def __init__(self, directory):
+        """
+        :param directory: directory of archive, it is created when the first plan is added
+        """
+        self.directory = directory
+        self.index = {}
+        index_path = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, encoding='utf-8') as file:
+                self.index = json.load(file)['plans']
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __getitem__(self, name):
+        """Opens plan name lazily"""
+        if name not in self.index:
+            raise KeyError(f"{self.directory}: no plan {name}")
+        entry = self.index[name]
+        stem = os.path.join(self.directory, entry['file'])
+        cells = np.load(stem + '.npy', mmap_mode='r')
+        lengths = np.load(stem + '.lengths.npy', mmap_mode='r')
+        return Plan(cells, lengths, entry['width'], entry['height'], name)
+
+    def add(self, name, paths, width=None, height=None):
+        """
+        Saves plan under name, plan of the same name is replaced
+        :param paths: Plan or list of paths, paths need width and height of map
+        """
+        plan = paths if isinstance(paths, Plan) else Plan.from_paths(paths, width, height, name)
+        os.makedirs(self.directory, exist_ok=True)
+        entry = self.index.get(name) or {'file': f'plan_{len(self.index):05d}'}
+        stem = os.path.join(self.directory, entry['file'])
+        np.save(stem + '.npy', np.asarray(plan.cells))
+        np.save(stem + '.lengths.npy', np.asarray(plan.lengths))
+        entry.update(width=plan.width, height=plan.height, agents=plan.agents, makespan=plan.makespan,
+                     sum_of_costs=plan.get_sum_of_costs())
+        self.index[name] = entry
+        self._save_index()
+
+    def _save_index(self):
+        """Writes index after every plan, so archive stays readable when sweep is interrupted"""
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump({'version': 1, 'plans': self.index}, file, indent=1)
+        os.replace(path + '.tmp', path)
+
+
+def open_plan(path, name=None):
+    """Opens plan from .npz file or plan name from PlanArchive directory"""
+    if os.path.isdir(path):
+        return PlanArchive(path)[name]
+    return load_plan(path)
@@ -0,0 +1,249 @@
+"""Module for classes PlanValidator and Violation"""
+import time
+from itertools import chain
+import numpy as np
+from GridMap import GridMap
+from PlanArchive import Plan
+
+# Kinds of violations
+AGENTS = 'agents'  # number of paths differs from number of agents
+EMPTY = 'empty'  # path without any position
+START = 'start'  # path does not begin at start of agent
+GOAL = 'goal'  # path does not end at goal of agent
+OFF_MAP = 'off_map'
+OBSTACLE = 'obstacle'
+MOVE = 'move'  # step to cell that is not neighbour
+VERTEX = 'vertex'  # agents at the same cell at the same time
+EDGE = 'edge'  # agents swapping cells
+GOAL_CONFLICT = 'goal_conflict'  # agent entering cell of agent that finished its path and stays at goal
+COST = 'cost'  # claimed sum of costs differs from the real one
+MAKESPAN = 'makespan'
+
+
+class Violation:
+    """One violation of rules of MAPF found in plan"""
+    def __init__(self, kind, timestep=None, agents=(), cell=None, message=''):
+        """
+        :param kind: one of kinds of violations, e.g. VERTEX
+        :param timestep: timestep of violation, edge conflict happens between timestep and timestep + 1
+        :param agents: tuple of agents involved
+        :param cell: (x, y) coordinates of cell where it happened
+        :param message: details, e.g. expected and real value
+        """
+        self.kind = kind
+        self.timestep = timestep
+        self.agents = agents
+        self.cell = cell
+        self.message = message
+
+    def __eq__(self, other):
+        return isinstance(other, Violation) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"Violation({self})"
+
+    def __str__(self):
+        parts = [self.kind]
+        if self.timestep is not None:
+            parts.append(f"t={self.timestep}")
+        if self.agents:
+            parts.append(f"agents={list(self.agents)}")
+        if self.cell is not None:
+            parts.append(f"cell={self.cell}")
+        if self.message:
+            parts.append(self.message)
+        return ' '.join(parts)
+
+    def to_dict(self):
+        return {'kind': self.kind, 'timestep': self.timestep, 'agents': list(self.agents),
+                'cell': list(self.cell) if self.cell is not None else None, 'message': self.message}
+
+
+class PlanValidator:
+    """Checks paths of all agents independently of the solver that found them
+       Paths are packed into padded (timestep, agent) array of cell ids, agent stays at its goal after its path ends
+       Every check runs on whole rows of the array at once: starts and goals, cells outside map and obstacles,
+       moves to cells that are not neighbours, vertex and goal conflicts by sorting (timestep, cell) keys,
+       edge conflicts by matching (timestep, from, to) keys with (timestep, to, from) keys
+       Every violation is reported, not only the first one, conflict of more agents in one cell is one violation
+       Long plans are checked in chunks of timesteps, so memory mapped Plan is never read as a whole
+    """
+    def __init__(self, grid_map, starts, goals, chunk_size=1 << 22):
+        """
+        :param grid_map: GridMap the agents move on
+        :param starts: list of starting Nodes
+        :param goals: list of goal Nodes
+        :param chunk_size: number of positions (timesteps * agents) checked at once
+        """
+        self.grid_map = grid_map
+        self.starts = np.array([grid_map.cell(*x.coords()) for x in starts], dtype=np.int64)
+        self.goals = np.array([grid_map.cell(*x.coords()) for x in goals], dtype=np.int64)
+        self.chunk_size = chunk_size
+        self.stats = {}
+        self._outside = {}  # (timestep, agent) -> coordinates outside map in paths being validated
+
+    @classmethod
+    def from_instance(cls, instance, grid_map=None):
+        """
+        Validator of paths solving Instance
+        :param grid_map: GridMap of instance if it is already built, e.g. by solver, building it costs more than
+                         checking the plan
+        """
+        if grid_map is None:
+            grid_map = GridMap(instance.width, instance.height, instance.obstacles)
+        return cls(grid_map, instance.starts, instance.goals)
+
+    def is_valid(self, paths):
+        return not self.validate(paths)
+
+    def validate(self, paths, sum_of_costs=None, makespan=None):
+        """
+        Checks paths, computed sum of costs and makespan are kept in stats
+        :param paths: list of paths (lists of (x, y) coordinates) or Plan
+        :param sum_of_costs: claimed sum of costs, e.g. reported by solver, checked when given
+        :param makespan: claimed makespan, checked when given
+        :return: list of Violations ordered by timestep, empty if paths are a valid solution
+        """
+        started = time.perf_counter()
+        violations = []
+        agents = len(self.starts)
+        if len(paths) != agents:
+            violations.append(Violation(AGENTS, message=f"{len(paths)} paths for {agents} agents"))
+        cells, lengths = self._pack(paths, violations)
+        self._check_ends(cells, lengths, violations)
+        steps = cells.shape[0]
+        rows = max(2, self.chunk_size // max(1, cells.shape[1]))
+        # chunks overlap by one timestep, so moves between them are checked too
+        for first in range(0, steps, rows - 1):
+            chunk = np.array(cells[first:first + rows], dtype=np.int64)
+            last = first + rows >= steps
+            outside = chunk >= self.grid_map.size
+            chunk[outside] = self.grid_map.size + np.nonzero(outside)[1]
+            self._check_cells(chunk, first, lengths, last, violations)
+            self._check_conflicts(chunk, first, lengths, last, violations)
+            if last:
+                break
+        self._outside = {}
+        real_cost = int((lengths - 1).sum())
+        real_makespan = int(lengths.max()) - 1 if len(lengths) else 0
+        if sum_of_costs is not None and sum_of_costs != real_cost:
+            violations.append(Violation(COST, message=f"claimed {sum_of_costs}, real {real_cost}"))
+        if makespan is not None and makespan != real_makespan:
+            violations.append(Violation(MAKESPAN, message=f"claimed {makespan}, real {real_makespan}"))
+        violations.sort(key=lambda x: -1 if x.timestep is None else x.timestep)
+        self.stats = {'sum_of_costs': real_cost, 'makespan': real_makespan, 'violations': len(violations),
+                      'wall_time': time.perf_counter() - started}
+        return violations
+
+    def _pack(self, paths, violations):
+        """
+        Padded (timestep, agent) array of cell ids of the first len(starts) paths and their lengths
+        Empty path is replaced by start, cells outside map get id size + agent, which no other agent uses
+        """
+        grid_map = self.grid_map
+        count = min(len(paths), len(self.starts))
+        if isinstance(paths, Plan) and (paths.width, paths.height) == (grid_map.width, grid_map.height):
+            return paths.cells[:, :count], np.asarray(paths.lengths[:count], dtype=np.int64)
+        paths = [paths[agent] for agent in range(count)]
+        for agent, path in enumerate(paths):
+            if not path:
+                violations.append(Violation(EMPTY, agents=(agent,)))
+                paths[agent] = [grid_map.coords(int(self.starts[agent]))]
+        lengths = np.fromiter((len(path) for path in paths), dtype=np.int64, count=count)
+        coords = np.fromiter(chain.from_iterable(chain.from_iterable(paths)), dtype=np.int64,
+                             count=2 * int(lengths.sum())).reshape(-1, 2)
+        x, y = coords[:, 0], coords[:, 1]
+        ids = y * grid_map.width + x
+        path_starts = np.cumsum(lengths) - lengths
+        agents = np.repeat(np.arange(count), lengths)
+        timesteps = np.arange(len(ids)) - path_starts[agents]
+        outside = np.flatnonzero((x < 0) | (x >= grid_map.width) | (y < 0) | (y >= grid_map.height))
+        self._outside = {(int(timesteps[i]), int(agents[i])): (int(x[i]), int(y[i])) for i in outside.tolist()}
+        ids[outside] = grid_map.size + agents[outside]
+        cells = np.empty((int(lengths.max(initial=1)), count), dtype=np.int64)
+        cells[timesteps, agents] = ids
+        goals = ids[path_starts + lengths - 1]
+        padding = np.arange(len(cells))[:, None] >= lengths[None, :]
+        cells[padding] = np.broadcast_to(goals, cells.shape)[padding]
+        return cells, lengths
+
+    def _coords(self, cell):
+        return None if cell >= self.grid_map.size else tuple(int(x) for x in self.grid_map.coords(cell))
+
+    def _check_ends(self, cells, lengths, violations):
+        """Paths must begin at starts and end at goals"""
+        agents = np.arange(len(lengths))
+        first = np.asarray(cells[0], dtype=np.int64) if len(lengths) else np.zeros(0, dtype=np.int64)
+        last = np.asarray(cells[-1], dtype=np.int64) if len(lengths) else np.zeros(0, dtype=np.int64)
+        for agent in agents[first != self.starts[:len(agents)]].tolist():
+            violations.append(Violation(START, 0, (agent,), self._coords(first[agent]),
+                                        f"start is {self._coords(self.starts[agent])}"))
+        for agent in agents[last != self.goals[:len(agents)]].tolist():
+            violations.append(Violation(GOAL, int(lengths[agent]) - 1, (agent,), self._coords(last[agent]),
+                                        f"goal is {self._coords(self.goals[agent])}"))
+
+    def _check_cells(self, chunk, first, lengths, last, violations):
+        """
+        Cells outside map, obstacles and moves to cells that are not neighbours
+        :param chunk: padded cell ids of timesteps from first
+        :param last: whether chunk ends with the last timestep, otherwise its last row belongs to the next chunk
+        """
+        grid_map = self.grid_map
+        rows = len(chunk) if last else len(chunk) - 1
+        inside = chunk < grid_map.size
+        in_path = np.arange(first, first + rows)[:, None] < lengths[None, :]
+        for timestep, agent in zip(*np.nonzero(~inside[:rows] & in_path)):
+            timestep, agent = first + int(timestep), int(agent)
+            violations.append(Violation(OFF_MAP, timestep, (agent,), self._outside.get((timestep, agent))))
+        blocked = inside[:rows] & in_path
+        blocked[blocked] = ~grid_map.passable[chunk[:rows][blocked]]
+        for timestep, agent in zip(*np.nonzero(blocked)):
+            violations.append(Violation(OBSTACLE, first + int(timestep), (int(agent),),
+                                        self._coords(chunk[timestep, agent])))
+        before, after = chunk[:-1], chunk[1:]
+        dx = np.abs(before % grid_map.width - after % grid_map.width)
+        dy = np.abs(before // grid_map.width - after // grid_map.width)
+        jumps = (dx + dy > 1) & inside[:-1] & inside[1:]
+        for timestep, agent in zip(*np.nonzero(jumps)):
+            violations.append(Violation(MOVE, first + int(timestep), (int(agent),),
+                                        self._coords(before[timestep, agent]),
+                                        f"to {self._coords(after[timestep, agent])}"))
+
+    def _check_conflicts(self, chunk, first, lengths, last, violations):
+        """Vertex, goal and edge conflicts of timesteps in chunk, see _check_cells"""
+        steps, agents = chunk.shape
+        cells = self.grid_map.size + agents
+        rows = steps if last else steps - 1
+        keys = (np.arange(rows, dtype=np.int64)[:, None] * cells + chunk[:rows]).ravel()
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        same = sorted_keys[1:] == sorted_keys[:-1]
+        if same.any():
+            group_starts = np.flatnonzero(np.concatenate(([True], ~same)))
+            group_sizes = np.diff(np.concatenate((group_starts, [len(keys)])))
+            for start, size in zip(group_starts[group_sizes > 1].tolist(), group_sizes[group_sizes > 1].tolist()):
+                members = order[start:start + size]
+                timestep = first + int(members[0]) // agents
+                group = members % agents
+                finished = timestep >= lengths[group]
+                if finished.all():  # agents sharing goal, reported when the later one arrived
+                    continue
+                violations.append(Violation(GOAL_CONFLICT if finished.any() else VERTEX, timestep,
+                                            tuple(sorted(group.tolist())),
+                                            self._coords(chunk[timestep - first, group[0]])))
+        if steps < 2:
+            return
+        before, after = chunk[:-1], chunk[1:]
+        timestep, agent = np.nonzero(before != after)
+        from_cell, to_cell = before[timestep, agent], after[timestep, agent]
+        forward = (timestep * cells + from_cell) * cells + to_cell
+        backward = (timestep * cells + to_cell) * cells + from_cell
+        order = np.argsort(forward, kind='stable')
+        left = np.searchsorted(forward[order], backward, 'left')
+        right = np.searchsorted(forward[order], backward, 'right')
+        for move in np.flatnonzero(right > left).tolist():
+            for other in order[left[move]:right[move]].tolist():
+                if agent[move] < agent[other]:
+                    violations.append(Violation(EDGE, first + int(timestep[move]),
+                                                (int(agent[move]), int(agent[other])),
+                                                self._coords(from_cell[move]), f"to {self._coords(to_cell[move])}"))
@@ -0,0 +1,69 @@
+"""Module for class PrioritizedHighLevel"""
+import random
+import time
+from Heuristic import unreachable_value
+from HighLevel import HighLevel
+from PrioritizedPlanner import PrioritizedPlanner
+
+
+class PrioritizedHighLevel(HighLevel):
+    """Prioritized planning with random restarts, used in place of HighLevel
+       Agents are planned in order of their numbers first, when some agent has no path
+       the order is shuffled and all agents are planned again
+       Every tried order counts as expanded CT node in stats, so max_iterations limits number of orders
+       It scales to hundreds of agents, but solution is not optimal and may not be found even if it exists,
+       stats['suboptimality'] is ratio of its cost to sum of shortest paths ignoring other agents
+    """
+    def __init__(self, seed=0):
+        """
+        :param seed: seed of random orders, the same seed gives the same solution
+        """
+        super().__init__()
+        self.seed = seed
+        self.prioritized = None
+
+    def create_solver(self):
+        super().create_solver()
+        self.prioritized = PrioritizedPlanner(self.grid_map, self.start_coords, self.end_coords,
+                                              self.solver.heuristic_cache)
+
+    def get_lower_bound(self):
+        """Sum of costs of shortest paths ignoring other agents, None if some agent cannot reach its goal"""
+        cost = 0
+        for start, end in zip(self.start_coords, self.end_coords):
+            table = self.solver.heuristic_cache.get_for_map(self.grid_map, end.coords())
+            distance = table[self.grid_map.cell(*start.coords())]
+            if distance == unreachable_value(table):
+                return None
+            cost += int(distance)
+        return cost
+
+    def _search(self, max_iterations, time_limit, started, cancel):
+        """Plans agents in random orders until all of them have paths"""
+        lower_bound = self.get_lower_bound()
+        if lower_bound is None:
+            return False
+        self.stats['lower_bound'] = lower_bound
+        planner = self.prioritized
+        rng = random.Random(self.seed)
+        deadline = None if time_limit is None else started + time_limit
+        order = list(range(len(self.start_coords)))
+        cnt = 0
+        while cnt < max_iterations:
+            paths = planner.plan(order, deadline, cancel)
+            cnt += 1
+            self.stats['ct_nodes_expanded'] = self.stats['ct_nodes_generated'] = cnt
+            self.stats['low_level_expansions'] += planner.expanded
+            if paths:
+                cost = sum(len(path) - 1 for path in paths)
+                self.stats['suboptimality'] = cost / lower_bound if lower_bound else 1.0
+                return paths
+            if deadline is not None and time.perf_counter() > deadline:
+                self.stats['timeout'] = True
+                return False
+            if cancel is not None and cancel.is_set():
+                self.stats['cancelled'] = True
+                return False
+            rng.shuffle(order)
+            yield cnt
+        return False
@@ -0,0 +1,114 @@
+"""Module for class PrioritizedPlanner"""
+import time
+from ConstraintTable import ConstraintTable
+from Heuristic import DEFAULT_CACHE
+from Node import Node
+from SpaceTimeAstar import SpaceTimeAstarSolver
+
+
+class PrioritizedPlanner:
+    """Prioritized planning
+       Agents are planned one by one in order of priority, every agent avoids paths of agents planned before it,
+       which are reserved in one ConstraintTable - cells they visit, swaps with their moves and their goals
+       after they arrive (goals are reserved up to horizon, which grows when longer path is planned)
+       It is fast but incomplete, agent may have no path in given order although solution exists
+    """
+    def __init__(self, grid_map, starts, goals, heuristic_cache=DEFAULT_CACHE):
+        """
+        :param grid_map: GridMap the agents move on
+        :param starts: list of starting Nodes
+        :param goals: list of goal Nodes
+        :param heuristic_cache: HeuristicCache with distance tables
+        """
+        self.grid_map = grid_map
+        self.starts = starts
+        self.goals = goals
+        self.solver = SpaceTimeAstarSolver(ConstraintTable(), 0, Node(0, 0, 0), Node(0, 0, 0), heuristic_cache,
+                                           grid_map=grid_map)
+        self.expanded = 0
+        self.generated = 0
+
+    def plan(self, order=None, deadline=None, cancel=None):
+        """
+        Plans agents in given order
+        :param order: agents from highest priority, default is order of agents
+        :param deadline: time.perf_counter() value after which planning stops
+        :param cancel: object with is_set(), planning stops when it is set
+        :return: list of paths indexed by agent, False if some agent has no path or planning was stopped
+        """
+        self.expanded = self.generated = 0
+        self.solver.deadline, self.solver.cancel = deadline, cancel
+        order = range(len(self.starts)) if order is None else order
+        reservations = ConstraintTable()
+        paths = [None] * len(self.starts)
+        planned = []
+        horizon = 0  # goals of planned agents are reserved up to this timestep
+        for agent in order:
+            if deadline is not None and time.perf_counter() > deadline or cancel is not None and cancel.is_set():
+                return False
+            path, horizon = self.plan_agent(agent, reservations, [paths[x] for x in planned], horizon)
+            if not path:
+                return False
+            horizon = max(horizon, len(path) - 1)
+            self.reserve(reservations, path, horizon)
+            paths[agent] = path
+            planned.append(agent)
+        return paths
+
+    def replan(self, paths, agents):
+        """
+        Plans agents again in given order, they avoid paths of all other agents
+        :param paths: list of paths of all agents, it is not modified
+        :param agents: agents to plan again, from highest priority
+        :return: list of new paths of agents in the same order, False if some agent has no path
+        """
+        self.expanded = self.generated = 0
+        self.solver.deadline = self.solver.cancel = None
+        replanned = set(agents)
+        planned = [path for agent, path in enumerate(paths) if agent not in replanned]
+        horizon = max((len(path) - 1 for path in planned), default=0)
+        reservations = ConstraintTable()
+        for path in planned:
+            self.reserve(reservations, path, horizon)
+        new_paths = []
+        for agent in agents:
+            path, horizon = self.plan_agent(agent, reservations, planned, horizon)
+            if not path:
+                return False
+            horizon = max(horizon, len(path) - 1)
+            self.reserve(reservations, path, horizon)
+            planned.append(path)
+            new_paths.append(path)
+        return new_paths
+
+    def plan_agent(self, agent, reservations, planned, horizon):
+        """
+        Plans one agent avoiding reservations of planned paths
+        :param reservations: ConstraintTable with planned paths
+        :param planned: list of paths in reservations
+        :param horizon: goals of planned paths are reserved up to this timestep
+        :return: path (False if it does not exist) and horizon of reservations after planning
+        """
+        self.solver.change_config(self.starts[agent], self.goals[agent], reservations)
+        while True:
+            path = self.solver.run(99999)
+            self.expanded += self.solver.expanded
+            self.generated += self.solver.generated
+            if not path or len(path) - 1 <= horizon or not planned:
+                return path, horizon
+            # path may cross goal of planned agent after its reservation is over
+            horizon = self._extend_goals(reservations, planned, horizon, len(path) - 1)
+
+    @staticmethod
+    def reserve(reservations, path, horizon):
+        """Adds path to reservation table, agent stays at its goal up to horizon"""
+        reservations.add_path(path, horizon)
+
+    @staticmethod
+    def _extend_goals(reservations, paths, horizon, length):
+        """Reserves goals of planned paths up to new horizon, at least length, returns the new horizon"""
+        new_horizon = max(length, 2 * horizon)
+        for path in paths:
+            gx, gy = path[-1]
+            reservations.add([Node(gx, gy, t) for t in range(max(horizon + 1, len(path)), new_horizon + 1)])
+        return new_horizon
@@ -0,0 +1,150 @@
+"""Module for classes PriorityNode and PriorityBasedHighLevel"""
+import time
+from ConflictDetector import ConflictDetector
+from ConstraintTable import ConstraintTable
+from HighLevel import HighLevel
+from PrioritizedPlanner import PrioritizedPlanner
+
+
+class PriorityNode:
+    """Node of priority tree in Priority-based search
+       Holds paths of all agents and partial order of their priorities,
+       higher[agent] is frozenset of all agents with higher priority than agent (already closed transitively)
+    """
+    def __init__(self, paths, higher):
+        """
+        :param paths: list of paths indexed by agent
+        :param higher: list of frozensets indexed by agent
+        """
+        self.paths = paths
+        self.higher = higher
+        self.cost = sum(len(path) for path in paths)
+
+    def get_cost(self):
+        return self.cost
+
+    def get_first_collision(self):
+        """Constraints of the first conflict in the same format as CTNode.get_first_collision, False if there is none"""
+        return ConflictDetector(self.paths).get_first_conflict()
+
+    def add_priority(self, high, low):
+        """
+        Partial order with high agent before low agent added
+        :return: list of frozensets like higher, None if low agent already has higher priority than high agent
+        """
+        if high == low or low in self.higher[high]:
+            return None
+        gained = self.higher[high] | {high}
+        return [agents | gained if agent == low or low in agents else agents
+                for agent, agents in enumerate(self.higher)]
+
+
+class PriorityBasedHighLevel(HighLevel):
+    """Priority-based search (PBS), used in place of HighLevel
+       Root has paths planned for every agent alone and no priorities
+       Node is split on its first conflict into two children, each gives priority to one agent of the conflict
+       In child the lower agent and agents below it that collide with agents above them are replanned
+       by prioritized planning, agents without priority between them may still collide
+       Tree is searched depth first, cheaper child first, so it finds solutions of large instances quickly,
+       but they are not optimal and search is not complete
+    """
+    def __init__(self):
+        super().__init__()
+        self.prioritized = None
+
+    def create_solver(self):
+        super().create_solver()
+        self.prioritized = PrioritizedPlanner(self.grid_map, self.start_coords, self.end_coords,
+                                              self.solver.heuristic_cache)
+
+    def _search(self, max_iterations, time_limit, started, cancel):
+        """Depth first search over priority tree"""
+        agents = len(self.start_coords)
+        paths = []
+        for agent in range(agents):
+            path = not self._stopped() and self._plan(agent, [])
+            if not path:
+                return False
+            paths.append(path)
+        root = PriorityNode(paths, [frozenset()] * agents)
+        self.stats['lower_bound'] = root.get_cost() - agents
+        self.stats['ct_nodes_generated'] = 1
+        stack = [root]
+        cnt = 0
+        while stack and cnt < max_iterations:
+            if time_limit is not None and time.perf_counter() - started > time_limit:
+                self.stats['timeout'] = True
+                return False
+            if cancel is not None and cancel.is_set():
+                self.stats['cancelled'] = True
+                return False
+            node = stack.pop()
+            collision = node.get_first_collision()
+            if not collision:
+                cost = node.get_cost() - agents
+                self.stats['suboptimality'] = cost / self.stats['lower_bound'] if self.stats['lower_bound'] else 1.0
+                return node.paths
+
+            (first, _), (second, _) = collision
+            children = [child for child in (self.create_child(node, first, second),
+                                            self.create_child(node, second, first)) if child]
+            self.stats['ct_nodes_generated'] += len(children)
+            children.sort(key=PriorityNode.get_cost, reverse=True)  # cheaper child is popped first
+            stack.extend(children)
+            cnt += 1
+            self.stats['ct_nodes_expanded'] = cnt
+            yield cnt
+        return False
+
+    def create_child(self, node, high, low):
+        """
+        Creates child with high agent before low agent
+        Agents are replanned in topological order of priorities, agent has more agents above it than any agent
+        above it, so sorting by number of agents above is enough
+        :return: PriorityNode, None if priorities would form cycle or some agent has no path
+        """
+        higher = node.add_priority(high, low)
+        if higher is None:
+            return None
+        paths = list(node.paths)
+        affected = sorted((agent for agent, agents in enumerate(higher) if agent == low or low in agents),
+                          key=lambda agent: len(higher[agent]))
+        for agent in affected:
+            above = [paths[x] for x in higher[agent]]
+            if agent != low and not any(self._collide(paths[agent], path) for path in above):
+                continue
+            path = self._plan(agent, above)
+            if not path:
+                return None
+            paths[agent] = path
+        return PriorityNode(paths, higher)
+
+    def _plan(self, agent, above):
+        """Plans agent avoiding paths of agents above it and counts low level expansions"""
+        reservations, horizon = self._reserve(above)
+        path, _ = self.prioritized.plan_agent(agent, reservations, above, horizon)
+        self.stats['low_level_expansions'] += self.prioritized.expanded
+        self.prioritized.expanded = 0
+        return path
+
+    @staticmethod
+    def _collide(path, other):
+        """True if two paths conflict, agent that finished its path stays at its goal"""
+        length = max(len(path), len(other))
+        path = path + [path[-1]] * (length - len(path))
+        other = other + [other[-1]] * (length - len(other))
+        if any(a == b for a, b in zip(path, other)):
+            return True
+        return any(a == d and b == c for a, b, c, d in zip(path, path[1:], other, other[1:]))
+
+    @staticmethod
+    def _reserve(paths):
+        """
+        ConstraintTable with paths reserved
+        :return: the table and timestep up to which goals are reserved
+        """
+        reservations = ConstraintTable()
+        horizon = max((len(path) - 1 for path in paths), default=0)
+        for path in paths:
+            PrioritizedPlanner.reserve(reservations, path, horizon)
+        return reservations, horizon
@@ -0,0 +1,69 @@
+"""Module for classes SearchContext and SearchTree"""
+from array import array
+
+
+class SearchContext:
+    """Arrays of search over cells that are reused by every run of a solver
+       Value of cell is valid only when its stamp equals current generation, so reset
+       just starts new generation instead of clearing or reallocating the arrays
+    """
+    def __init__(self, size):
+        """
+        :param size: number of cells
+        """
+        self.size = size
+        self.generation = 1
+        self.stamp = array('I', [0]) * size
+        self.g = array('i', [0]) * size
+        self.parent = array('i', [-1]) * size
+
+    def reset(self):
+        """Forgets values of all cells"""
+        self.generation += 1
+        if self.generation == 2 ** 32:  # stamps would overflow, clear them once
+            self.stamp = array('I', [0]) * self.size
+            self.generation = 1
+
+    def is_reached(self, cell):
+        """True if cell got value in current generation"""
+        return self.stamp[cell] == self.generation
+
+    def set(self, cell, g, parent):
+        """Stores cost and predecessor of cell"""
+        self.stamp[cell] = self.generation
+        self.g[cell] = g
+        self.parent[cell] = parent
+
+    def get_memory_usage(self):
+        """Number of bytes taken by the arrays"""
+        return sum(a.itemsize * len(a) for a in (self.stamp, self.g, self.parent))
+
+
+class SearchTree:
+    """Search of space-time Astar saved after it found a path, so it can be continued after
+       constraints are added instead of searching from scratch
+       States are integers timestep * number of cells + cell as in SpaceTimeAstarSolver
+       Tree is never modified, so one saved search can be continued by any number of later searches
+    """
+    def __init__(self, start, goal, predecessors, expanded, sizes, truncated, time_limit, goal_state):
+        """
+        :param start: cell id of start
+        :param goal: cell id of goal
+        :param predecessors: dictionary state -> predecessor state of every generated state, in order of generation
+        :param expanded: array of expanded states in order of expansion
+        :param sizes: array with number of generated states before every expansion
+        :param truncated: index of the first expansion whose successors were over time limit, None if there was none
+        :param time_limit: time limit of the search
+        :param goal_state: state the found path ends in
+        """
+        self.start = start
+        self.goal = goal
+        self.predecessors = predecessors
+        self.expanded = expanded
+        self.sizes = sizes
+        self.truncated = truncated
+        self.time_limit = time_limit
+        self.goal_state = goal_state
+
+    def __len__(self):
+        return len(self.predecessors)
@@ -0,0 +1,284 @@
+"""This module implements space-time Astar algorithm"""
+import heapq
+import itertools
+import time
+from array import array
+import numpy as np
+from Astar import AstarSolver
+from ConstraintTable import ConstraintTable
+from GridMap import GridMap
+from Heuristic import DEFAULT_CACHE, unreachable_value
+from Node import Node
+from SearchContext import SearchTree
+
+# Moves including waiting on the spot
+MOVES = ((1, 0), (-1, 0), (0, 1), (0, -1), (0, 0))
+# Heap keys hold TIME_SPAN - 1 - timestep, so keys do not change when time limit grows
+TIME_SPAN = 1 << 32
+# Saved search is continued only when it has at most this many open states per repeated expansion,
+# otherwise rebuilding its heap costs more than searching from scratch
+RESTORE_RATIO = 4
+
+
+class SpaceTimeAstarSolver(AstarSolver):
+    """Astar searching over (x, y, t) states
+       Agent can wait, every state is closed separately for every timestep
+       Constraints are stored in ConstraintTable, so any number of vertex and edge constraints
+       can be placed on one cell
+       Returned path ends at goal no sooner than all vertex constraints on goal are over,
+       so agent can stay at goal forever and the path can be reused in child CT nodes
+       Heuristic is true distance to goal taken from precomputed table
+       Map is GridMap, square grid_size x grid_size map with obstacles is created when none is given
+    """
+    def __init__(self, constraints, grid: int, start: Node, end: Node, heuristic_cache=DEFAULT_CACHE,
+                 obstacles=frozenset(), grid_map=None):
+        """
+        :param constraints: ConstraintTable (old style dictionary is converted)
+        :param grid: size of square grid, not used when grid_map is given
+        :param start: starting position
+        :param end: ending position
+        :param heuristic_cache: HeuristicCache with distance tables, shared by default
+        :param obstacles: frozenset of blocked cells, not used when grid_map is given
+        :param grid_map: GridMap the agent moves on, possibly rectangular
+        """
+        if grid_map is None:
+            grid_map = GridMap(grid, grid, obstacles)
+        super().__init__(self._as_table(constraints), max(grid_map.width, grid_map.height), start, end)
+        self.grid_map = grid_map
+        self.heuristic_cache = heuristic_cache
+        self.obstacles = grid_map.obstacles
+        self.expanded = 0
+        self.generated = 0  # states generated by last search, states kept from saved search are not counted
+        self.last_tree = None  # SearchTree of last successful run
+        self.deadline = None  # time.perf_counter() value after which search gives up
+        self.cancel = None  # object with is_set(), search gives up when it is set
+
+    @staticmethod
+    def _as_table(constraints):
+        """Converts dictionary constraints used by AstarSolver to ConstraintTable"""
+        if isinstance(constraints, dict):
+            return ConstraintTable.from_dict(constraints)
+        return constraints
+
+    def change_config(self, start, end, constraints):
+        """Used to change parameters of solver instance"""
+        super().change_config(start, end, self._as_table(constraints))
+
+    def get_neighbors(self, pos: Node):
+        """
+        :param pos: Node instance
+        :return: Nodes reachable in next timestep including waiting
+        """
+        x, y = pos.coords()
+        t = pos.timestep()
+        valid_moves = []
+        for dx, dy in MOVES:
+            node = Node(x + dx, y + dy, t + 1)
+            if self.is_valid(node) and not self.constraints.is_edge_constrained((x, y), node.coords(), t + 1):
+                valid_moves.append(node)
+        return valid_moves
+
+    def is_valid(self, pos: Node):
+        """Checks if cordinates run out of map, if there is a wall or if agent is forbidden to be there at given timestep"""
+        x, y = pos.coords()
+        if not self.grid_map.is_passable(x, y):
+            return False
+        return not self.constraints.is_constrained((x, y), pos.timestep())
+
+    def is_stopped(self):
+        """True when deadline passed or cancel is set, search loops check it every 1024 expansions"""
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            return True
+        return self.cancel is not None and self.cancel.is_set()
+
+    def get_distance_table(self):
+        """Returns table with distances of all cells to goal, indexed by cell id"""
+        return self.heuristic_cache.get_for_map(self.grid_map, self.end.coords())
+
+    def heuristic(self, pos: Node, cost):
+        """Heuristic is computed by adding cost of path to pos and true distance to end"""
+        x, y = pos.coords()
+        return cost + int(self.get_distance_table()[self.grid_map.cell(x, y)])
+
+    def get_time_limit(self):
+        """
+        Upper bound on timestep of any state worth expanding
+        After last constraint agent reaches goal in at most number of cells steps
+        """
+        return self.constraints.max_timestep + self.grid_map.size
+
+    def cell_constraints(self):
+        """
+        Constraints converted to cell ids for search loop, the table keeps them for next runs
+        :return: tuple of dictionaries timestep -> set of cells and timestep -> set of (from cell, to cell)
+        """
+        return self.constraints.cell_ids(self.grid_map.width)
+
+    def run(self, maxiter):
+        """Runs space-time astar and returns path as list of coordinates, one for each timestep
+           State (cell id, timestep) is encoded as single integer timestep * number of cells + cell id,
+           neighbours come from precomputed tuples of GridMap, so no object is allocated per neighbour
+           Every move including wait costs 1, so cost of state is its timestep
+           and state reached for the first time never needs to be updated
+           Cells that cannot reach goal are unreachable in distance table and are skipped
+           Heap holds single integers (f * TIME_SPAN + TIME_SPAN - 1 - t) * number of cells + cell,
+           so states are ordered by f, then by later timestep, then by cell without building tuples
+           Search is kept in last_tree together with log of expanded states, so it can be continued by replan
+           Search gives up and returns False when deadline passes or cancel is set
+        """
+        return self._search(maxiter)
+
+    def replan(self, tree, constraints, maxiter):
+        """
+        Continues saved search after constraints were added, in the style of Lifelong Planning A*
+        Search with more constraints repeats the saved one until the first expansion the added constraints change,
+        so search is continued from the state saved search had before that expansion
+        and the found path is the same as the one found by run, fewer states are expanded
+        :param tree: SearchTree from last_tree, saved by search with current constraints except the added ones
+        :param constraints: added vertex or edge constraint or list of them, as accepted by ConstraintTable.add
+        :param maxiter: maximum number of expanded states
+        :return: path as list of coordinates, False if it does not exist
+        """
+        return self._search(maxiter, tree, constraints)
+
+    def _search(self, maxiter, tree=None, added=None):
+        """Search loop of run and replan, starts from scratch when tree is not given or does not fit"""
+        self.expanded = 0
+        self.generated = 0
+        self.last_tree = None
+        grid_map = self.grid_map
+        moves = grid_map.moves
+        size = grid_map.size
+        vertex, edge = self.cell_constraints()
+        goal = grid_map.cell(*self.end.coords())
+        hold_time = self.constraints.goal_hold_time(self.end.coords())
+        time_limit = self.get_time_limit()
+        table = self.get_distance_table()
+        unreachable = unreachable_value(table)
+        dist = memoryview(table)
+        span = TIME_SPAN
+
+        start = grid_map.cell(*self.start.coords())
+        restored = None
+        if tree is not None and (tree.start, tree.goal) == (start, goal):
+            restored = self._restore(tree, added, hold_time, time_limit, table)
+            if restored is tree:  # added constraints do not change the search
+                self.last_tree = tree
+                return self._reconstruct(tree.predecessors, tree.goal_state)
+        if restored is not None:
+            # every state is generated at most once, so predecessors is also the closed set
+            predecessors, q, expanded, sizes, truncated = restored
+        else:
+            h = dist[start]
+            if h == unreachable or start in vertex.get(0, ()):
+                return False
+            predecessors = {start: None}
+            q = [(h * span + span - 1) * size + start]
+            expanded, sizes, truncated = array('q'), array('q'), None
+        reused = len(predecessors)
+        log_expanded = expanded.append
+        log_size = sizes.append
+        while q and self.expanded < maxiter:
+            key = heapq.heappop(q)
+            rest, cell = divmod(key, size)
+            t = span - 1 - rest % span
+            current = t * size + cell
+            self.expanded += 1
+            if not self.expanded & 1023 and self.is_stopped():
+                break
+            if cell == goal and t >= hold_time:
+                self.generated = len(predecessors) - reused
+                self.last_tree = SearchTree(start, goal, predecessors, expanded, sizes, truncated, time_limit, current)
+                return self._reconstruct(predecessors, current)
+            log_expanded(current)
+            log_size(len(predecessors))
+            nt = t + 1
+            if nt > time_limit:
+                if truncated is None:
+                    truncated = len(expanded) - 1
+                continue
+            base = nt * size
+            key = span - 1 - nt + nt * span  # part of heap key for f = nt, h is added as h * span
+            forbidden = vertex.get(nt, ())
+            forbidden_moves = edge.get(nt, ())
+            for neighbor_cell in moves[cell]:
+                neighbor = base + neighbor_cell
+                if neighbor in predecessors:
+                    continue
+                h = dist[neighbor_cell]
+                if h == unreachable or neighbor_cell in forbidden:
+                    continue
+                if forbidden_moves and (cell, neighbor_cell) in forbidden_moves:
+                    continue
+                predecessors[neighbor] = current
+                heapq.heappush(q, (key + h * span) * size + neighbor_cell)
+        self.generated = len(predecessors) - reused
+        return False
+
+    def _restore(self, tree, added, hold_time, time_limit, table):
+        """
+        State of search with current constraints before the first expansion of saved search that is changed
+        by added constraints - the one that generated a state or made a move forbidden now,
+        or truncated successors that fit into grown time limit
+        States are generated in the same order as in saved search up to that expansion, as predecessors keep
+        order of insertion their prefix is the search at that point, open states are the generated ones
+        that were not expanded yet
+        :return: tuple of predecessors, heap, expanded states, sizes and index of truncated expansion,
+                 tree when search is not changed at all, None when it changes right at the start
+        """
+        grid_map = self.grid_map
+        size = grid_map.size
+        saved = tree.predecessors
+        index = len(tree.expanded)  # number of expansions search repeats
+        added_table = ConstraintTable()
+        added_table.add(added)
+        changed = []
+        for t, cells in added_table.vertex.items():
+            changed.extend(t * size + grid_map.cell(*cell) for cell in cells)
+        for t, cell_moves in added_table.edge.items():
+            for from_cell, to_cell in cell_moves:
+                state = t * size + grid_map.cell(*to_cell)
+                if saved.get(state) == (t - 1) * size + grid_map.cell(*from_cell):
+                    changed.append(state)
+        for state in changed:
+            if state in saved:
+                parent = saved[state]
+                if parent is None:
+                    return None
+                index = min(index, tree.expanded.index(parent))
+        if tree.truncated is not None and time_limit > tree.time_limit:  # successors of truncated state may fit now
+            index = min(index, tree.truncated)
+        truncated = tree.truncated if tree.truncated is not None and tree.truncated < index else None
+        if index == len(tree.expanded) and tree.goal_state // size >= hold_time:
+            return tree
+        generated = tree.sizes[index] if index < len(tree.sizes) else len(saved)
+        if generated - index > RESTORE_RATIO * index:
+            return None
+        predecessors = dict(itertools.islice(saved.items(), generated))
+        expanded = tree.expanded[:index]
+        q = self._heap_keys(predecessors.keys() - expanded, table)
+        heapq.heapify(q)
+        return predecessors, q, expanded, tree.sizes[:index], truncated
+
+    def _heap_keys(self, states, table):
+        """Heap keys of states, many states are computed by numpy if their keys fit into 64 bits"""
+        size = self.grid_map.size
+        span = TIME_SPAN
+        if len(states) >= 64:
+            t, cell = np.divmod(np.fromiter(states, dtype=np.int64, count=len(states)), size)
+            f = t + table[cell]
+            if (int(f.max()) + 1) * span * size < 1 << 63:
+                return ((f * span + (span - 1 - t)) * size + cell).tolist()
+        dist = memoryview(table)
+        return [((t + dist[cell]) * span + span - 1 - t) * size + cell
+                for t, cell in (divmod(state, size) for state in states)]
+
+    def _reconstruct(self, predecessors, state):
+        """Reconstructs path of coordinates from start to given encoded state"""
+        size = self.grid_map.size
+        res = []
+        while state is not None:
+            res.append(self.grid_map.coords(state % size))
+            state = predecessors[state]
+        res.reverse()
+        return res
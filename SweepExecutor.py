@@ -0,0 +1,119 @@
+"""Module for class SweepExecutor"""
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from multiprocessing.connection import wait
+import benchmark
+
+
+def _worker(connection, max_tasks):
+    """Solves instances received through connection, exits after max_tasks instances"""
+    for _ in range(max_tasks):
+        task = connection.recv()
+        if task is None:
+            break
+        index, instance, solver_name, time_limit, max_iterations = task
+        try:
+            result = benchmark.solve_instance(instance, solver_name, time_limit, max_iterations)
+            connection.send((index, result, None))
+        except Exception as error:  # pylint: disable=broad-except
+            connection.send((index, None, repr(error)))
+    connection.close()
+
+
+class SweepExecutor:
+    """Solves many instances on all cores using pool of worker processes
+       Worker that runs longer than hard timeout is killed and replaced by a new one,
+       workers are also recycled after fixed number of instances so memory does not pile up
+       Results are yielded as soon as each instance finishes
+    """
+    def __init__(self, solver_name, time_limit, max_iterations, jobs=None, hard_timeout=None, max_tasks_per_worker=50):
+        """
+        :param solver_name: key of benchmark.SOLVERS
+        :param time_limit: time limit passed to solver, solver stops by itself after it
+        :param max_iterations: maximum expanded CT nodes
+        :param jobs: number of worker processes, all cores by default
+        :param hard_timeout: seconds after which worker is killed, time_limit + 10 s by default
+        :param max_tasks_per_worker: number of instances after which worker is replaced
+        """
+        self.solver_name = solver_name
+        self.time_limit = time_limit
+        self.max_iterations = max_iterations
+        self.jobs = jobs or os.cpu_count() or 1
+        self.hard_timeout = hard_timeout if hard_timeout is not None else time_limit + 10
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.context = multiprocessing.get_context()
+
+    def _spawn(self):
+        """Starts new worker, returns its end of pipe and process"""
+        parent_end, child_end = self.context.Pipe()
+        process = self.context.Process(target=_worker, args=(child_end, self.max_tasks_per_worker), daemon=True)
+        process.start()
+        child_end.close()
+        return parent_end, process
+
+    def _failed(self, instance, elapsed, timeout):
+        """Result of instance whose worker was killed or crashed"""
+        return benchmark.make_result(instance, self.solver_name, False, {'wall_time': elapsed, 'timeout': timeout})
+
+    def run(self, instances):
+        """
+        Solves instances in parallel
+        :return: generator of results in order in which instances finished
+        """
+        pending = deque(enumerate(instances))
+        workers = {}  # connection -> [process, index of running instance, start time, finished instances]
+        try:
+            while pending or any(x[1] is not None for x in workers.values()):
+                while len(workers) < self.jobs and len(workers) < len(pending) + self._busy(workers):
+                    connection, process = self._spawn()
+                    workers[connection] = [process, None, 0.0, 0]
+                for connection, worker in workers.items():
+                    if worker[1] is None and pending:
+                        index, instance = pending.popleft()
+                        connection.send((index, instance, self.solver_name, self.time_limit, self.max_iterations))
+                        worker[1], worker[2] = index, time.perf_counter()
+
+                busy = [connection for connection, worker in workers.items() if worker[1] is not None]
+                deadline = min(workers[x][2] for x in busy) + self.hard_timeout
+                for connection in wait(busy, timeout=max(0.0, deadline - time.perf_counter())):
+                    worker = workers[connection]
+                    index = worker[1]
+                    try:
+                        _, result, error = connection.recv()
+                    except EOFError:  # worker crashed
+                        result, error = None, 'worker exited unexpectedly'
+                    if result is None:
+                        print(f"{instances[index].name}: {error}", file=sys.stderr)
+                        result = self._failed(instances[index], time.perf_counter() - worker[2], False)
+                    worker[1] = None
+                    worker[3] += 1
+                    if error is not None or worker[3] >= self.max_tasks_per_worker:
+                        self._retire(workers, connection)
+                    yield result
+
+                now = time.perf_counter()
+                for connection in [x for x, worker in workers.items() if worker[1] is not None]:
+                    worker = workers[connection]
+                    if now - worker[2] > self.hard_timeout:
+                        worker[0].kill()
+                        index = worker[1]
+                        self._retire(workers, connection)
+                        yield self._failed(instances[index], now - worker[2], True)
+        finally:
+            for connection in list(workers):
+                workers[connection][0].kill()
+                self._retire(workers, connection)
+
+    @staticmethod
+    def _busy(workers):
+        return sum(1 for x in workers.values() if x[1] is not None)
+
+    @staticmethod
+    def _retire(workers, connection):
+        """Closes connection to worker and waits for its process to end"""
+        process = workers.pop(connection)[0]
+        connection.close()
+        process.join()
@@ -0,0 +1,256 @@
+"""Module for class Viewer"""
+import math
+import numpy as np
+import pygame
+from FrameRenderer import GRID_COLOR, MIN_GRID_CELL, draw_map, get_agent_colors, interpolate, pack_positions
+
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+TIMELINE_COLOR = (40, 40, 40)
+PROGRESS_COLOR = (90, 140, 220)
+# Height of timeline slider at the bottom of window in pixels
+TIMELINE_HEIGHT = 32
+TIMELINE_MARGIN = 10
+MIN_ZOOM, MAX_ZOOM = 0.05, 200
+
+
+class Viewer:
+    """Interactive viewer of solved paths for maps of any size
+       View is given by zoom (pixels per cell) and offset (cell coordinates of top left corner of window),
+       only visible part of map is scaled to the window and only agents inside the window are drawn
+       Scaled map with grid lines and goals is kept until view changes, so playing costs one blit
+       and one fill per visible agent
+       Positions of agents in all timesteps are precomputed in one array, so any timestep
+       (or time between two timesteps) is shown in O(agents) - time moves by clock, not by frames
+       Positions of Plan are not precomputed, only the two shown timesteps are read from (memory mapped) file
+       Controls: space play/pause, left/right previous/next timestep, +/- speed, home/end first/last timestep,
+       mouse wheel zoom, dragging pans, dragging timeline jumps in time, f fits map into window, escape quits
+    """
+    def __init__(self, grid_map, paths, goals, width=1000, height=800, message=None):
+        """
+        :param grid_map: GridMap the agents move on
+        :param paths: list of paths, path is list of (x, y) coordinates, or Plan opened lazily from file
+        :param goals: list of goal Nodes
+        :param width: width of window
+        :param height: height of window
+        :param message: text shown in the middle of window, e.g. that there is no solution
+        """
+        pygame.init()
+        self.screen = pygame.display.set_mode((width, height), pygame.RESIZABLE)
+        pygame.display.set_caption("MAPF")
+        self.clock = pygame.time.Clock()
+        self.font = pygame.font.Font(None, 22)
+        self.grid_map = grid_map
+        self.map_surface = draw_map(grid_map)
+        self.goals = goals
+        self.message = message
+        self.speed = 2.0  # timesteps per second
+        self.playing = False
+        self.time = 0.0
+        self.zoom = 1.0
+        self.offset = [0.0, 0.0]
+        self._view = None  # (key of view, surface of visible map)
+        self._dragging = False
+        self._scrubbing = False
+        self.set_paths(paths)
+        self.fit()
+
+    def set_paths(self, paths):
+        """Shows other paths, positions of agents are precomputed"""
+        self.positions = pack_positions(paths)
+        self.makespan = len(self.positions) - 1
+        self.colors = get_agent_colors(max(len(paths), len(self.goals)))
+        self.goal_cells = np.array([goal.coords() for goal in self.goals], dtype=np.float64).reshape(-1, 2)
+        self.time = 0.0
+        self._view = None
+
+    def get_view_size(self):
+        """Size of area showing map, window without timeline"""
+        width, height = self.screen.get_size()
+        return width, max(1, height - TIMELINE_HEIGHT)
+
+    def fit(self):
+        """Zooms so that whole map fits into window and centers it"""
+        width, height = self.get_view_size()
+        self.zoom = min(MAX_ZOOM, max(MIN_ZOOM, min(width / self.grid_map.width, height / self.grid_map.height)))
+        self.offset = [(self.grid_map.width - width / self.zoom) / 2, (self.grid_map.height - height / self.zoom) / 2]
+        self._view = None
+
+    def to_screen(self, x, y):
+        """Pixel of window where cell coordinates x, y are"""
+        return (x - self.offset[0]) * self.zoom, (y - self.offset[1]) * self.zoom
+
+    def to_cell(self, px, py):
+        """Cell coordinates (not rounded) shown at pixel px, py"""
+        return px / self.zoom + self.offset[0], py / self.zoom + self.offset[1]
+
+    def zoom_at(self, factor, pixel):
+        """Zooms by factor, cell under pixel stays under it"""
+        x, y = self.to_cell(*pixel)
+        self.zoom = min(MAX_ZOOM, max(MIN_ZOOM, self.zoom * factor))
+        self.offset = [x - pixel[0] / self.zoom, y - pixel[1] / self.zoom]
+        self._view = None
+
+    def pan(self, dx, dy):
+        """Moves view by dx, dy pixels"""
+        self.offset[0] -= dx / self.zoom
+        self.offset[1] -= dy / self.zoom
+        self._view = None
+
+    def get_visible_cells(self):
+        """Range of cells inside the view as (x0, y0, x1, y1), x1 and y1 excluded, may be empty"""
+        width, height = self.get_view_size()
+        x0, y0 = self.to_cell(0, 0)
+        x1, y1 = self.to_cell(width, height)
+        return (max(0, math.floor(x0)), max(0, math.floor(y0)),
+                min(self.grid_map.width, math.ceil(x1)), min(self.grid_map.height, math.ceil(y1)))
+
+    def draw_view(self):
+        """
+        Surface with visible part of map, grid lines and goals
+        Only visible cells are scaled, surface is reused until zoom, offset or window size changes
+        """
+        key = (self.zoom, tuple(self.offset), self.screen.get_size())
+        if self._view is not None and self._view[0] == key:
+            return self._view[1]
+        view = pygame.Surface(self.get_view_size())
+        x0, y0, x1, y1 = self.get_visible_cells()
+        if x1 > x0 and y1 > y0:
+            left, top = self.to_screen(x0, y0)
+            right, bottom = self.to_screen(x1, y1)
+            left, top = round(left), round(top)
+            cells = self.map_surface.subsurface((x0, y0, x1 - x0, y1 - y0))
+            view.blit(pygame.transform.scale(cells, (round(right) - left, round(bottom) - top)), (left, top))
+            if self.zoom >= MIN_GRID_CELL:
+                for x in range(x0, x1 + 1):
+                    px = round(self.to_screen(x, 0)[0])
+                    pygame.draw.line(view, GRID_COLOR, (px, top), (px, round(bottom)))
+                for y in range(y0, y1 + 1):
+                    py = round(self.to_screen(0, y)[1])
+                    pygame.draw.line(view, GRID_COLOR, (left, py), (round(right), py))
+            radius = max(1, int(self.zoom / 4))
+            for goal in self._cull(self.goal_cells):
+                x, y = self.goal_cells[goal]
+                px, py = self.to_screen(x + 0.5, y + 0.5)
+                pygame.draw.circle(view, self.colors[goal], (round(px), round(py)), radius)
+        self._view = (key, view)
+        return view
+
+    def _cull(self, cells):
+        """Indexes of cells (array of cell coordinates) inside the view"""
+        width, height = self.get_view_size()
+        x0, y0 = self.to_cell(0, 0)
+        x1, y1 = self.to_cell(width, height)
+        inside = (cells[:, 0] > x0 - 1) & (cells[:, 0] < x1) & (cells[:, 1] > y0 - 1) & (cells[:, 1] < y1)
+        return np.flatnonzero(inside).tolist()
+
+    def draw_agents(self):
+        """Draws agents inside the view at current time, returns number of drawn agents"""
+        positions = interpolate(self.positions, self.time)
+        visible = self._cull(positions)
+        size = max(1, round(self.zoom / 2))
+        corner = (self.zoom - size) / 2
+        offset_x, offset_y = self.offset
+        zoom = self.zoom
+        for agent, (x, y) in zip(visible, positions[visible].tolist()):
+            rect = (round((x - offset_x) * zoom + corner), round((y - offset_y) * zoom + corner), size, size)
+            self.screen.fill(self.colors[agent], rect)
+        return len(visible)
+
+    def get_timeline_rect(self):
+        width, height = self.screen.get_size()
+        return pygame.Rect(TIMELINE_MARGIN, height - TIMELINE_HEIGHT + 8, max(1, width - 2 * TIMELINE_MARGIN),
+                           TIMELINE_HEIGHT - 16)
+
+    def draw_timeline(self, drawn):
+        """Draws slider with current time and status line"""
+        width, height = self.screen.get_size()
+        self.screen.fill(BLACK, (0, height - TIMELINE_HEIGHT, width, TIMELINE_HEIGHT))
+        bar = self.get_timeline_rect()
+        self.screen.fill(TIMELINE_COLOR, bar)
+        done = bar.width * self.time / self.makespan if self.makespan else bar.width
+        self.screen.fill(PROGRESS_COLOR, (bar.x, bar.y, round(done), bar.height))
+        status = (f"t = {self.time:.1f} / {self.makespan}   speed {self.speed:g}/s   zoom {self.zoom:.2f}   "
+                  f"agents drawn {drawn}   {self.clock.get_fps():.0f} fps")
+        text = self.font.render(status, True, WHITE)
+        self.screen.blit(text, (bar.x + 4, bar.y + (bar.height - text.get_height()) // 2))
+        if self.message:
+            text = self.font.render(self.message, True, WHITE)
+            view_width, view_height = self.get_view_size()
+            self.screen.blit(text, text.get_rect(center=(view_width // 2, view_height // 2)))
+
+    def draw(self):
+        """Draws whole window, returns number of drawn agents"""
+        self.screen.blit(self.draw_view(), (0, 0))
+        drawn = self.draw_agents()
+        self.draw_timeline(drawn)
+        return drawn
+
+    def set_time(self, time):
+        self.time = min(max(time, 0.0), float(self.makespan))
+
+    def _scrub(self, px):
+        """Jumps to time at pixel px of timeline"""
+        bar = self.get_timeline_rect()
+        self.set_time((px - bar.x) / bar.width * self.makespan)
+
+    def handle_event(self, event):
+        """Reacts to one pygame event, returns False when viewer should close"""
+        if event.type == pygame.QUIT or event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+            return False
+        if event.type == pygame.VIDEORESIZE:
+            self._view = None
+        elif event.type == pygame.MOUSEWHEEL:
+            self.zoom_at(1.2 ** event.y, pygame.mouse.get_pos())
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            if self.get_timeline_rect().inflate(0, 16).collidepoint(event.pos):
+                self._scrubbing = True
+                self._scrub(event.pos[0])
+            else:
+                self._dragging = True
+        elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+            self._dragging = self._scrubbing = False
+        elif event.type == pygame.MOUSEMOTION:
+            if self._scrubbing:
+                self._scrub(event.pos[0])
+            elif self._dragging:
+                self.pan(*event.rel)
+        elif event.type == pygame.KEYDOWN:
+            self._handle_key(event.key)
+        return True
+
+    def _handle_key(self, key):
+        if key == pygame.K_SPACE:
+            if self.time >= self.makespan:
+                self.time = 0.0
+            self.playing = not self.playing
+        elif key == pygame.K_RIGHT:
+            self.playing = False
+            self.set_time(math.floor(self.time) + 1)
+        elif key == pygame.K_LEFT:
+            self.playing = False
+            self.set_time(math.ceil(self.time) - 1)
+        elif key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+            self.speed *= 2
+        elif key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+            self.speed /= 2
+        elif key == pygame.K_HOME:
+            self.set_time(0)
+        elif key == pygame.K_END:
+            self.set_time(self.makespan)
+        elif key == pygame.K_f:
+            self.fit()
+
+    def run(self, fps=60):
+        """Shows window until it is closed, time moves by speed timesteps per second while playing"""
+        running = True
+        while running:
+            seconds = self.clock.tick(fps) / 1000
+            for event in pygame.event.get():
+                running = running and self.handle_event(event)
+            if self.playing:
+                self.set_time(self.time + seconds * self.speed)
+                self.playing = self.time < self.makespan
+            self.draw()
+            pygame.display.flip()
+        pygame.quit()
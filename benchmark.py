@@ -0,0 +1,363 @@
+"""Headless benchmark of MAPF solvers over scenario files
+
+Usage:
+    python benchmark.py run tests/*.txt --output results.csv
+    python benchmark.py run maps/random.scen --agents 10 20 30 --time-limit 60 --output results.json
+    python benchmark.py run maps/*.scen --agents 50 100 --jobs 8 --output results.jsonl --resume
+    python benchmark.py run maps/random.scen --agents 50 --trace trace.json --trace-memory --profile cprofile
+    python benchmark.py run maps/random.scen --agents 500 1000 --solver pp --save-plans plans/
+    python benchmark.py compare old.json new.json --threshold 0.1
+"""
+import argparse
+import csv
+import functools
+import json
+import os
+import sys
+from EnhancedHighLevel import EnhancedHighLevel
+from FocalHighLevel import FocalHighLevel
+from HighLevel import HighLevel
+from Instance import load_instances
+from Instrumentation import Instrumentation, save_trace
+from PlanArchive import PlanArchive
+from PlanValidator import PlanValidator
+from PrioritizedHighLevel import PrioritizedHighLevel
+from PriorityBasedHighLevel import PriorityBasedHighLevel
+
+# Solver configurations selectable from command line
+SOLVERS = {
+    'cbs': HighLevel,
+    'cbs-parallel': functools.partial(HighLevel, workers=os.cpu_count() or 1),
+    'cbs-incremental': functools.partial(HighLevel, incremental=True),
+    'icbs': EnhancedHighLevel,
+    'icbs-incremental': functools.partial(EnhancedHighLevel, incremental=True),
+    'ecbs': FocalHighLevel,
+    'ecbs-1.1': functools.partial(FocalHighLevel, weight=1.1),
+    'pp': PrioritizedHighLevel,
+    'pbs': PriorityBasedHighLevel,
+}
+
+FIELDS = ['instance', 'solver', 'agents', 'success', 'sum_of_costs', 'makespan', 'ct_nodes_expanded',
+          'ct_nodes_generated', 'low_level_expansions', 'wall_time', 'timed_out', 'suboptimality', 'violations']
+# Output files results can be appended to one by one
+STREAMED_FORMATS = ('.csv', '.jsonl')
+# Fields compared as throughput, regression is a drop of work done per second
+THROUGHPUT_FIELDS = ['ct_nodes_expanded', 'low_level_expansions']
+
+
+def make_result(instance, solver_name, paths, stats, violations=None):
+    """
+    Creates one row of results from solved paths and statistics of solver
+    :param violations: list of Violations found by PlanValidator in paths, None if they were not validated
+    """
+    return {
+        'instance': instance.name,
+        'solver': solver_name,
+        'agents': len(instance.starts),
+        'success': bool(paths),
+        'sum_of_costs': sum(len(path) - 1 for path in paths) if paths else None,
+        'makespan': max(len(path) - 1 for path in paths) if paths else None,
+        'ct_nodes_expanded': stats.get('ct_nodes_expanded', 0),
+        'ct_nodes_generated': stats.get('ct_nodes_generated', 0),
+        'low_level_expansions': stats.get('low_level_expansions', 0),
+        'wall_time': stats.get('wall_time', 0.0),
+        'timed_out': stats.get('timeout', False),
+        'suboptimality': stats.get('suboptimality', 1.0) if paths else None,
+        'violations': len(violations) if violations is not None else None,
+    }
+
+
+def solve_instance(instance, solver_name, time_limit, max_iterations, instrumentation=None, archive=None):
+    """
+    Runs one solver configuration on one instance and returns row of results
+    :param instrumentation: Instrumentation attached to the solver for this run, None runs it without any
+    :param archive: PlanArchive, found paths are saved into it as plan solver/instance
+    Found paths are always checked by PlanValidator, number of violations is part of results
+    """
+    solver = SOLVERS[solver_name]()
+    solver.load_instance(instance)
+    if instrumentation is None:
+        paths = solver.run(max_iterations, time_limit)
+    else:
+        with instrumentation.attach(solver):
+            paths = solver.run(max_iterations, time_limit)
+    if archive is not None and paths:
+        archive.add(f"{solver_name}/{instance.name}", paths, instance.width, instance.height)
+    violations = PlanValidator.from_instance(instance, solver.grid_map).validate(paths) if paths else None
+    return make_result(instance, solver_name, paths, solver.stats, violations)
+
+
+def run_benchmark(instances, solver_name, time_limit, max_iterations, verbose=True, instrumented=None,
+                  archive=None, trace_memory=False):
+    """
+    Solves all instances one after another
+    :param instrumented: list, every run is instrumented and (instance name, Instrumentation) is appended to it
+    :param trace_memory: instrumented runs measure their peak memory with tracemalloc
+    :param archive: PlanArchive for found paths
+    """
+    results = []
+    for instance in instances:
+        instrumentation = None
+        if instrumented is not None:
+            instrumentation = Instrumentation(trace=True, trace_memory=trace_memory)
+            instrumented.append((instance.name, instrumentation))
+        result = solve_instance(instance, solver_name, time_limit, max_iterations, instrumentation, archive)
+        if verbose:
+            print(format_result(result), flush=True)
+        results.append(result)
+    return results
+
+
+def run_sweep(instances, solver_name, time_limit, max_iterations, jobs, hard_timeout=None, output=None):
+    """Solves instances on pool of worker processes, every result is appended to output as soon as it is known"""
+    from SweepExecutor import SweepExecutor  # pylint: disable=import-outside-toplevel  # imports this module
+    executor = SweepExecutor(solver_name, time_limit, max_iterations, jobs, hard_timeout)
+    results = []
+    for result in executor.run(instances):
+        print(format_result(result), flush=True)
+        if output:
+            append_result(result, output)
+        results.append(result)
+    return results
+
+
+def format_result(result):
+    """One line summary of result"""
+    status = 'solved' if result['success'] else 'failed'
+    if result.get('violations'):
+        status = 'INVALID'
+    return (f"{result['instance']:<30} {result['solver']:<6} {status:<7} soc={result['sum_of_costs']} "
+            f"ct={result['ct_nodes_expanded']} ll={result['low_level_expansions']} {result['wall_time']:.3f}s")
+
+
+def summarize(results):
+    """Aggregated statistics of list of results"""
+    solved = [x for x in results if x['success']]
+    return {
+        'instances': len(results),
+        'success_rate': len(solved) / len(results) if results else 0.0,
+        'invalid': sum(1 for x in solved if x.get('violations')),
+        'sum_of_costs': sum(x['sum_of_costs'] for x in solved),
+        'makespan': max((x['makespan'] for x in solved), default=0),
+        'ct_nodes_expanded': sum(x['ct_nodes_expanded'] for x in results),
+        'low_level_expansions': sum(x['low_level_expansions'] for x in results),
+        'wall_time': sum(x['wall_time'] for x in results),
+    }
+
+
+def save_results(results, path):
+    """Saves results as CSV, JSON lines (.jsonl) or JSON depending on file extension"""
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        if path.endswith('.csv'):
+            writer = csv.DictWriter(file, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+        elif path.endswith('.jsonl'):
+            file.writelines(json.dumps(result) + '\n' for result in results)
+        else:
+            json.dump({'summary': summarize(results), 'results': results}, file, indent=2)
+
+
+def append_result(result, path):
+    """Appends one result to .csv or .jsonl file, so results survive crash of the sweep"""
+    if not path.endswith(STREAMED_FORMATS):
+        raise ValueError(f"{path}: results can be streamed only to .csv or .jsonl file")
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, 'a', encoding='utf-8', newline='') as file:
+        if path.endswith('.csv'):
+            writer = csv.DictWriter(file, fieldnames=FIELDS)
+            if new_file:
+                writer.writeheader()
+            writer.writerow(result)
+        else:
+            file.write(json.dumps(result) + '\n')
+
+
+def completed_keys(path):
+    """Returns (instance, solver) of all results already in file, empty set if file does not exist"""
+    if not os.path.exists(path):
+        return set()
+    return {(x['instance'], x['solver']) for x in load_results(path)}
+
+
+def _parse_csv_value(field, value):
+    """Converts CSV string back to value of results row"""
+    if field in ('instance', 'solver'):
+        return value
+    if value == '':
+        return None
+    if field in ('success', 'timed_out'):
+        return value == 'True'
+    if field in ('wall_time', 'suboptimality'):
+        return float(value)
+    return int(value)
+
+
+def load_results(path):
+    """Loads results saved by save_results or append_result
+       Unfinished last line of JSON lines file written during crash is skipped
+    """
+    with open(path, encoding='utf-8', newline='') as file:
+        if path.endswith('.csv'):
+            return [{field: _parse_csv_value(field, row.get(field) or '') for field in FIELDS}
+                    for row in csv.DictReader(file) if row.get('wall_time')]
+        if path.endswith('.jsonl'):
+            results = []
+            for line in file:
+                try:
+                    results.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+            return results
+        return json.load(file)['results']
+
+
+def compare_results(old, new, threshold, min_time=0.05):
+    """
+    Compares two runs instance by instance
+    :param threshold: relative drop of throughput that is reported, 0.1 means 10 %
+    :param min_time: throughput of instances solved faster than this in both runs is not compared, it is mostly noise
+    :return: list of messages describing regressions
+    """
+    old_rows = {(x['instance'], x['solver']): x for x in old}
+    regressions = []
+    for row in new:
+        key = (row['instance'], row['solver'])
+        if key not in old_rows:
+            continue
+        before = old_rows[key]
+        if before['success'] and not row['success']:
+            regressions.append(f"{key[0]} ({key[1]}): no longer solved")
+        if row.get('violations'):
+            regressions.append(f"{key[0]} ({key[1]}): plan has {row['violations']} violations")
+        if max(before['wall_time'], row['wall_time']) < min_time:
+            continue
+        for field in THROUGHPUT_FIELDS:
+            if not before['wall_time'] or not row['wall_time'] or not before[field]:
+                continue
+            old_rate = before[field] / before['wall_time']
+            new_rate = row[field] / row['wall_time']
+            if new_rate < old_rate * (1 - threshold):
+                regressions.append(f"{key[0]} ({key[1]}): {field}/s dropped from {old_rate:.0f} to {new_rate:.0f} "
+                                   f"({(1 - new_rate / old_rate) * 100:.0f} %)")
+    return regressions
+
+
+def profiled(profiler, output, function, *args, **kwargs):
+    """
+    Calls function under profiler, prints the slowest functions and saves the profile
+    :param profiler: 'cprofile', 'pyinstrument' or None to call function without profiling
+    :param output: file of cProfile stats or pyinstrument HTML report, default is profile.prof or profile.html
+    :return: value returned by function
+    """
+    if profiler is None:
+        return function(*args, **kwargs)
+    if profiler == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler  # pylint: disable=import-outside-toplevel  # optional dependency
+        except ImportError as error:
+            raise SystemExit("pyinstrument is not installed, run pip install pyinstrument") from error
+        profile = Profiler()
+        profile.start()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profile.stop()
+            print(profile.output_text())
+            with open(output or 'profile.html', 'w', encoding='utf-8') as file:
+                file.write(profile.output_html())
+    import cProfile  # pylint: disable=import-outside-toplevel
+    import pstats  # pylint: disable=import-outside-toplevel
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        profile.disable()
+        profile.dump_stats(output or 'profile.prof')
+        pstats.Stats(profile).sort_stats('cumulative').print_stats(20)
+
+
+def parse_args(argv):
+    """Parses command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark of MAPF solvers')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='solve instances and save results')
+    run.add_argument('instances', nargs='+', help='tests/NN.txt, MovingAI .scen or .npz files')
+    run.add_argument('--solver', choices=sorted(SOLVERS), default='cbs')
+    run.add_argument('--agents', type=int, nargs='+', help='numbers of agents taken from every .scen file')
+    run.add_argument('--map-dir', help='directory with .map files, default is directory of .scen file')
+    run.add_argument('--time-limit', type=float, default=60.0, help='seconds per instance')
+    run.add_argument('--max-iterations', type=int, default=99999, help='maximum expanded CT nodes per instance')
+    run.add_argument('--output', help='.csv, .jsonl or .json file with results')
+    run.add_argument('--jobs', type=int, help='solve instances on this many processes, results are streamed to output')
+    run.add_argument('--hard-timeout', type=float, help='seconds after which worker process is killed')
+    run.add_argument('--resume', action='store_true', help='skip instances already present in output')
+    run.add_argument('--trace', help='.json file with counters, timers and timeline of every run')
+    run.add_argument('--trace-memory', action='store_true', help='trace also peak memory of every run, slower')
+    run.add_argument('--profile', choices=['cprofile', 'pyinstrument'], help='profile the whole benchmark')
+    run.add_argument('--profile-output', help='file with profile, profile.prof or profile.html by default')
+    run.add_argument('--save-plans', help='directory where found paths are saved as binary PlanArchive')
+
+    compare = commands.add_parser('compare', help='compare two saved runs')
+    compare.add_argument('old')
+    compare.add_argument('new')
+    compare.add_argument('--threshold', type=float, default=0.1, help='reported relative drop of throughput')
+    compare.add_argument('--min-time', type=float, default=0.05, help='seconds, faster instances are not compared')
+    args = parser.parse_args(argv)
+    if args.command == 'run' and args.trace_memory and not args.trace:
+        run.error("--trace-memory is saved into --trace file, which is missing")
+    # results are appended one by one with --jobs and --resume, checked before anything is solved
+    if args.command == 'run' and (args.jobs or args.resume) and args.output \
+            and not args.output.endswith(STREAMED_FORMATS):
+        run.error(f"--jobs and --resume stream results, --output must be .csv or .jsonl, not {args.output}")
+    return args
+
+
+def main(argv=None):
+    """Entry point of command line interface, returns exit code"""
+    args = parse_args(argv)
+    if args.command == 'compare':
+        regressions = compare_results(load_results(args.old), load_results(args.new), args.threshold,
+                                      args.min_time)
+        for message in regressions:
+            print(message)
+        print(f"{len(regressions)} regressions found")
+        return 1 if regressions else 0
+
+    if args.jobs and (args.trace or args.profile or args.save_plans):
+        print("--trace, --profile and --save-plans work only without --jobs", file=sys.stderr)
+        return 2
+    instances = load_instances(args.instances, args.agents, args.map_dir)
+    if args.resume and args.output:
+        done = completed_keys(args.output)
+        instances = [x for x in instances if (x.name, args.solver) not in done]
+        print(f"resuming, {len(done)} instances already in {args.output}")
+    if args.jobs:
+        results = run_sweep(instances, args.solver, args.time_limit, args.max_iterations, args.jobs,
+                            args.hard_timeout, args.output)
+    else:
+        instrumented = [] if args.trace else None
+        results = profiled(args.profile, args.profile_output, run_benchmark, instances, args.solver,
+                           args.time_limit, args.max_iterations, instrumented=instrumented,
+                           archive=PlanArchive(args.save_plans) if args.save_plans else None,
+                           trace_memory=args.trace_memory)
+        if args.trace:
+            save_trace(args.trace, instrumented)
+    summary = summarize(results)
+    print(f"solved {summary['success_rate'] * 100:.1f} % of {summary['instances']} instances, "
+          f"sum of costs {summary['sum_of_costs']}, {summary['wall_time']:.2f}s")
+    if summary['invalid']:
+        print(f"{summary['invalid']} plans are not valid solutions", file=sys.stderr)
+    if args.output and not args.jobs:
+        if args.resume:
+            for result in results:
+                append_result(result, args.output)
+        else:
+            save_results(results, args.output)
+    return 1 if summary['invalid'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,19 +1,39 @@
-"""Runs conflict based search"""
+"""Runs conflict based search
+
+Usage:
+    python main.py               instance is entered interactively
+    python main.py tests/05.txt  instance is loaded from .txt, .scen or .npz file
+"""
+import sys
 from Visualise import Visualise
 from HighLevel import HighLevel
+from AnytimeSolver import AnytimeSolver
+from Instance import load_instances
 
 # Some constants for visualisation
 WIDTH, HEIGHT = 600, 600
+# Seconds the solver may run, the best solution found by then is shown
+TIME_LIMIT = 60
+
+def report(progress):
+    """Prints one line about progress of the search"""
+    cost = 'none yet' if progress.cost is None else f'{progress.cost} ({progress.source})'
+    print(f'{progress.status:<11} {progress.elapsed:6.1f}s  lower bound {progress.lower_bound}  '
+          f'best cost {cost}  CT nodes {progress.ct_nodes_expanded}')
 
-def run():
-    """Runs algorithm"""
+def run(path=None):
+    """Runs algorithm, instance is read from file at path or from user inputs"""
     solver = HighLevel()
-    solver.get_inputs()
-    paths = solver.run(99999)
-    vis = Visualise(WIDTH,HEIGHT,solver.grid_size,paths,solver.end_coords)
+    if path:
+        solver.load_instance(load_instances([path])[0])
+    else:
+        solver.get_inputs()
+    progress = AnytimeSolver(solver, interval=1).solve(TIME_LIMIT, callback=report)
+    paths = progress.paths or False
+    vis = Visualise(WIDTH,HEIGHT,solver.grid_size,paths,solver.end_coords,solver.grid_map)
     if not paths:
         vis.no_solution(solver.start_coords)
     vis.run()
 
 
-run()
+run(sys.argv[1] if len(sys.argv) > 1 else None)
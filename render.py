@@ -0,0 +1,65 @@
+"""Renders solution of instance without any window
+
+Usage:
+    python render.py tests/05.txt --output run.gif
+    python render.py maps/random.scen --agents 1000 --solver pp --output frames/run.png --cell-size 4 --fps 60
+    python render.py maps/random.scen --agents 1000 --solver pp --plan plans/ --output run.mp4
+"""
+import argparse
+import os
+import sys
+import time
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # must be set before pygame is imported
+# pylint: disable=wrong-import-position
+from benchmark import SOLVERS
+from FrameRenderer import export
+from Instance import load_instances
+from PlanArchive import open_plan
+
+
+def parse_args(argv):
+    """Parses command line arguments"""
+    parser = argparse.ArgumentParser(description='Headless rendering of MAPF solution')
+    parser.add_argument('instance', help='tests/NN.txt, MovingAI .scen or .npz file')
+    parser.add_argument('--output', required=True, help='.mp4 or .gif (needs ffmpeg), .png saves numbered frames')
+    parser.add_argument('--solver', choices=sorted(SOLVERS), default='cbs')
+    parser.add_argument('--agents', type=int, help='number of agents taken from .scen file')
+    parser.add_argument('--map-dir', help='directory with .map files, default is directory of .scen file')
+    parser.add_argument('--time-limit', type=float, default=60.0, help='seconds for the solver')
+    parser.add_argument('--cell-size', type=int, help='pixels per cell, by default map fits into 1000 pixels')
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--step-time', type=float, default=0.5, help='seconds per timestep')
+    parser.add_argument('--plan', help='.npz plan or directory with plans saved by benchmark, nothing is solved')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Entry point of command line interface, returns exit code"""
+    args = parse_args(argv)
+    instance = load_instances([args.instance], [args.agents] if args.agents else None, args.map_dir)[0]
+    solver = SOLVERS[args.solver]()
+    solver.load_instance(instance)
+    if args.plan:
+        try:
+            paths = open_plan(args.plan, f"{args.solver}/{instance.name}")
+        except KeyError as error:
+            print(error.args[0], file=sys.stderr)
+            return 1
+    else:
+        paths = solver.run(99999, args.time_limit)
+    if not paths:
+        print(f"{instance.name}: no solution found", file=sys.stderr)
+        return 1
+    cell_size = args.cell_size or max(1, min(40, 1000 // max(instance.width, instance.height)))
+    started = time.perf_counter()
+    try:
+        frames = export(solver.grid_map, paths, solver.end_coords, args.output, cell_size, args.fps, args.step_time)
+    except RuntimeError as error:
+        print(error, file=sys.stderr)
+        return 1
+    print(f"{frames} frames written to {args.output} in {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,45 @@
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
 import unittest
+import numpy as np
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # must be set before pygame is imported
+# pylint: disable=wrong-import-position
+import pygame
+import benchmark
 from Astar import AstarSolver
 from Node import Node
 from HighLevel import HighLevel
 from CTNode import CTNode
+from ConflictDetector import ConflictDetector
+from ConflictTable import ConflictTable
+from ConstraintTable import ConstraintTable
+from SpaceTimeAstar import SpaceTimeAstarSolver
+from Instance import Instance, load_instances, load_npz, load_txt, save_npz
+from SweepExecutor import SweepExecutor
+from Heuristic import HeuristicCache, backward_bfs, unreachable_value
+from MDD import MDD
+from EnhancedHighLevel import EnhancedHighLevel
+from FocalAstar import FocalAstarSolver
+from FocalHighLevel import FocalHighLevel
+from GridMap import GridMap
+from SearchContext import SearchContext
+from PrioritizedPlanner import PrioritizedPlanner
+from ParallelPlanner import ParallelPlanner
+from AnytimeSolver import AnytimeSolver
+from PrioritizedHighLevel import PrioritizedHighLevel
+from PriorityBasedHighLevel import PriorityBasedHighLevel, PriorityNode
+from LargeNeighborhoodSearch import LargeNeighborhoodSearch, OPERATORS
+from Instrumentation import Instrumentation, save_trace
+from FrameRenderer import FrameRenderer, export, get_agent_colors
+from Viewer import Viewer
+from PlanArchive import Plan, PlanArchive, PositionView, load_plan, open_plan
+from PlanValidator import PlanValidator, Violation
 
 class MyTestCase(unittest.TestCase):
     def test_astar_coords_validation(self):
@@ -31,6 +68,15 @@ class MyTestCase(unittest.TestCase):
         self.assertEqual(len(solver.get_neighbors(Node(0,0,0))),3)
         self.assertEqual(len(solver.get_neighbors(Node(1,1,4))),5)
 
+    def test_astar_run(self):
+        solver = AstarSolver({(1, 0): 1}, 4, Node(0, 0, 0), Node(3, 0, 0))
+        path = solver.run(100)
+        self.assertEqual((len(path), path[0], path[-1]), (6, (0, 0), (3, 0)))
+        self.assertNotEqual(path[1], (1, 0))
+        self.assertTrue(all(abs(x1 - x2) + abs(y1 - y2) == 1 for (x1, y1), (x2, y2) in zip(path, path[1:])))
+        # cells are numbered like in GridMap
+        self.assertEqual(solver.context.g[GridMap(4, 4).cell(3, 0)], 5)
+
     def test_colissions(self):
         ct = CTNode({})
         ct.paths = [
@@ -49,6 +95,554 @@ class MyTestCase(unittest.TestCase):
         ]
         self.assertEqual(ct.get_first_colission(), False)
 
+    def test_child_ctnode_shares_parent(self):
+        root = CTNode([[], []])
+        root.set_path([(0, 0), (1, 0), (2, 0)])
+        root.set_path([(2, 0), (1, 0), (0, 0)])
+        child = CTNode(parent=root, agent=0, constraint=Node(1, 0, 1), path=[(0, 0), (0, 1), (1, 1), (2, 1), (2, 0)])
+        self.assertEqual(child.get_cost(), 8)
+        self.assertTrue(child.get_constraint(0).is_constrained((1, 0), 1))
+        self.assertEqual(len(child.get_constraint(1)), 0)
+        self.assertIs(child.paths[1], root.paths[1])
+        self.assertEqual(root.paths[0], [(0, 0), (1, 0), (2, 0)])
+        grandchild = CTNode(parent=child, agent=0, constraint=Node(0, 1, 1), path=[(0, 0), (0, 0)])
+        self.assertEqual(len(grandchild.get_constraint(0)), 2)
+        self.assertTrue(grandchild.get_constraint(0).is_constrained((0, 1), 1))
+        self.assertLess(grandchild.get_memory_usage(), root.get_memory_usage())
+
+    def test_space_time_astar_waits(self):
+        constraints = ConstraintTable([Node(1, 0, 1), Node(1, 0, 2), Node(0, 1, 1)])
+        solver = SpaceTimeAstarSolver(constraints, 3, Node(0, 0, 0), Node(2, 0, 0))
+        path = solver.run(1000)
+        self.assertEqual(path, [(0, 0), (0, 0), (0, 0), (1, 0), (2, 0)])
+
+    def test_space_time_astar_goal_holding(self):
+        constraints = ConstraintTable([Node(1, 0, 3), (Node(0, 0, 0), Node(1, 0, 1))])
+        solver = SpaceTimeAstarSolver(constraints, 3, Node(0, 0, 0), Node(1, 0, 0))
+        path = solver.run(1000)
+        self.assertEqual(len(path), 5)
+        self.assertEqual(path[-1], (1, 0))
+        self.assertNotEqual(path[1], (1, 0))
+
+    def test_distance_table(self):
+        table = backward_bfs(3, 3, frozenset({(1, 0), (1, 1)}), (2, 0))
+        self.assertEqual(table[0 * 3 + 2], 0)
+        self.assertEqual(table[0 * 3 + 0], 6)
+        self.assertEqual(table[0 * 3 + 1], unreachable_value(table))
+
+    def test_heuristic_cache_reused(self):
+        cache = HeuristicCache(maxsize=2)
+        solver = SpaceTimeAstarSolver(ConstraintTable(), 4, Node(0, 0, 0), Node(3, 3, 0), heuristic_cache=cache)
+        self.assertEqual(len(solver.run(1000)), 7)
+        self.assertEqual(len(solver.run(1000)), 7)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        for goal in ((0, 1), (0, 2)):
+            cache.get(4, 4, frozenset(), goal)
+        self.assertEqual(len(cache.tables), 2)
+
+    def test_swap_conflict_gives_edge_constraints(self):
+        ct = CTNode([[], []])
+        ct.paths = [[(0, 0), (1, 0)], [(1, 0), (0, 0)]]
+        collision = ct.get_first_collision()
+        self.assertEqual(collision, [(0, (Node(0, 0, 0), Node(1, 0, 1))), (1, (Node(1, 0, 0), Node(0, 0, 1)))])
+
+    def test_conflict_detector(self):
+        paths = [
+            [(0, 0), (1, 0), (2, 0), (3, 0)],
+            [(1, 1), (1, 0), (0, 0)],
+            [(3, 1), (2, 1), (2, 0)],
+            [(0, 2), (0, 1), (0, 0)],
+        ]
+        detector = ConflictDetector(paths)
+        self.assertEqual(detector.get_first_conflict(), [(0, Node(1, 0, 1)), (1, Node(1, 0, 1))])
+        conflicts = detector.get_all_conflicts()
+        self.assertEqual(conflicts, [
+            [(0, Node(1, 0, 1)), (1, Node(1, 0, 1))],
+            [(0, Node(2, 0, 2)), (2, Node(2, 0, 2))],
+            [(1, Node(0, 0, 2)), (3, Node(0, 0, 2))],
+        ])
+        self.assertEqual(detector.count_conflicts(), len(conflicts))
+        self.assertEqual(ConflictDetector([[(0, 0)], [(1, 0), (0, 0)]]).get_first_conflict(),
+                         [(0, Node(0, 0, 1)), (1, Node(0, 0, 1))])
+        self.assertEqual(ConflictDetector([[(0, 0), (1, 0)], [(1, 1), (0, 1)]]).count_conflicts(), 0)
+
+    def test_conflict_table_incremental(self):
+        root = CTNode([[], [], []])
+        root.set_path([(0, 0), (1, 0), (2, 0)])
+        root.set_path([(2, 0), (1, 0), (0, 0)])
+        root.set_path([(0, 2), (0, 1), (0, 0), (0, 1)])
+        table = ConflictTable(root)
+        self.assertEqual(root.conflict_pairs, {(0, 1): 1, (1, 2): 1})
+        path = [(0, 0), (0, 0), (1, 0), (2, 0)]
+        child = CTNode(parent=root, agent=0, constraint=Node(1, 0, 1), path=path,
+                       conflict_pairs=table.get_child_pairs(root, 0, path))
+        self.assertEqual(child.conflict_pairs, {(1, 2): 1, (0, 1): 1})
+        self.assertEqual(child.count_collisions(), ConflictDetector(child.paths).count_conflicts())
+        self.assertEqual(child.get_first_collision(), ConflictDetector(child.paths).get_first_conflict())
+        path = [(2, 0), (2, 1), (1, 1), (1, 2)]
+        sibling = CTNode(parent=root, agent=1, constraint=Node(1, 0, 1), path=path,
+                         conflict_pairs=table.get_child_pairs(root, 1, path))
+        table.move_to(child)
+        table.move_to(sibling)
+        self.assertEqual(table.occupancy[(0, 0, 0)], [0])
+        self.assertEqual(sibling.conflict_pairs, {})
+        self.assertFalse(sibling.get_first_collision())
+
+    def test_load_txt_instance(self):
+        instance = load_txt('tests/01.txt')
+        self.assertEqual((instance.width, instance.height), (4, 4))
+        self.assertEqual(instance.starts, [Node(0, 0, 0), Node(3, 0, 0)])
+        self.assertEqual(instance.goals, [Node(3, 3, 0), Node(0, 3, 0)])
+
+    def test_benchmark_instance(self):
+        instance = Instance('corridor', 3, 2, frozenset({(1, 1)}), [Node(0, 0, 0)], [Node(2, 0, 0)])
+        result = benchmark.solve_instance(instance, 'cbs', 10, 100)
+        self.assertEqual((result['success'], result['sum_of_costs'], result['makespan']), (True, 2, 2))
+        before = dict(result, wall_time=1.0, ct_nodes_expanded=10)
+        self.assertEqual(len(benchmark.compare_results([before], [dict(before, wall_time=2.0)], 0.1)), 2)
+        self.assertEqual(benchmark.compare_results([result], [result], 0.1), [])
+
+    def test_sweep_streams_and_resumes(self):
+        instances = [load_txt('tests/01.txt'), load_txt('tests/02.txt')]
+        results = list(SweepExecutor('cbs', 10, 100, jobs=2).run(instances))
+        self.assertEqual(sorted(x['instance'] for x in results), ['01.txt', '02.txt'])
+        self.assertTrue(all(x['success'] for x in results))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.csv')
+            benchmark.append_result(results[0], path)
+            benchmark.append_result(results[1], path)
+            self.assertEqual(benchmark.completed_keys(path), {('01.txt', 'cbs'), ('02.txt', 'cbs')})
+            self.assertEqual(benchmark.load_results(path)[0], results[0])
+        # streamed output format is checked before solving
+        with contextlib.redirect_stderr(io.StringIO()):
+            for options in (['--jobs', '1'], ['--resume']):
+                self.assertRaises(SystemExit, benchmark.parse_args,
+                                  ['run', 'tests/01.txt', '--output', 'x.json'] + options)
+        self.assertEqual(benchmark.parse_args(['run', 'tests/01.txt', '--output', 'x.json']).output, 'x.json')
+
+    def test_parallel_low_level_matches_serial(self):
+        instance = load_txt('tests/03.txt')
+        serial = HighLevel()
+        serial.load_instance(instance)
+        parallel = HighLevel(workers=2)
+        parallel.load_instance(instance)
+        self.assertEqual(parallel.run(1000), serial.run(1000))
+        self.assertEqual(parallel.stats['low_level_expansions'], serial.stats['low_level_expansions'])
+        self.assertIsNone(parallel.planner)
+        # workers of benchmark sweep are daemonic and may not start pools, solvers plan in their own process
+        context = multiprocessing.get_context('fork')
+        receiver, sender = context.Pipe(duplex=False)
+
+        def solve():
+            lns = LargeNeighborhoodSearch(serial.grid_map, serial.start_coords, serial.end_coords, workers=2)
+            solver = HighLevel(workers=2)
+            solver.load_instance(instance)
+            paths = solver.run(1000)
+            sender.send((paths, lns.improve(paths, 0.2, max_iterations=2)))
+        process = context.Process(target=solve, daemon=True)
+        process.start()
+        self.assertTrue(receiver.poll(30))
+        found, improved = receiver.recv()
+        process.join()
+        self.assertEqual(found, serial.run(1000))
+        self.assertEqual(len(improved), len(found))
+
+    def test_mdd(self):
+        solver = SpaceTimeAstarSolver(ConstraintTable(), 3, Node(0, 0, 0), Node(1, 1, 0))
+        mdd = MDD(solver, 2)
+        self.assertEqual(mdd.levels, [{(0, 0)}, {(1, 0), (0, 1)}, {(1, 1)}])
+        self.assertFalse(mdd.is_singleton((1, 0), 1))
+        self.assertTrue(mdd.is_singleton((1, 1), 5))
+        solver.change_config(Node(0, 0, 0), Node(1, 1, 0), ConstraintTable([Node(1, 0, 1)]))
+        self.assertTrue(MDD(solver, 2).is_singleton((0, 1), 1))
+
+    def test_rectangle_barrier(self):
+        high = EnhancedHighLevel()
+        root = CTNode([[], []])
+        root.set_path([(0, 1), (1, 1), (2, 1), (3, 1), (3, 2), (3, 3), (4, 3)])
+        root.set_path([(1, 0), (2, 0), (3, 0), (3, 1), (3, 2), (3, 3), (3, 4)])
+        barriers = high.rectangle_constraints(root, [(0, Node(3, 1, 3)), (1, Node(3, 1, 3))])
+        self.assertEqual(barriers, [(0, [Node(3, 1, 3), Node(3, 2, 4), Node(3, 3, 5)]),
+                                    (1, [Node(1, 3, 3), Node(2, 3, 4), Node(3, 3, 5)])])
+        self.assertIsNone(high.rectangle_constraints(root, [(0, Node(0, 1, 0)), (1, Node(0, 1, 0))]))
+
+    def test_enhanced_cbs_keeps_optimal_cost(self):
+        corridor = Instance('corridor', 7, 7, frozenset((x, y) for x in range(1, 6) for y in (0, 2)),
+                            [Node(0, 1, 0), Node(6, 1, 0)], [Node(6, 1, 0), Node(0, 0, 0)])
+        for instance in [load_txt(f'tests/0{i}.txt') for i in range(1, 8)] + [corridor]:
+            high = HighLevel()
+            high.load_instance(instance)
+            enhanced = EnhancedHighLevel()
+            enhanced.load_instance(instance)
+            paths = enhanced.run(1000)
+            self.assertFalse(ConflictDetector(paths).get_all_conflicts())
+            self.assertEqual(sum(map(len, paths)), sum(map(len, high.run(1000))))
+            self.assertLessEqual(enhanced.stats['ct_nodes_generated'], high.stats['ct_nodes_generated'])
+        # corridor reasoning does not put tables of maps with blocked corridor into heuristic cache
+        enhanced = EnhancedHighLevel(max_mdds=1)
+        enhanced.load_instance(corridor)
+        enhanced.solver.heuristic_cache = cache = HeuristicCache()
+        self.assertEqual(sum(map(len, enhanced.run(1000))), sum(map(len, high.run(1000))))
+        self.assertEqual(enhanced.stats['corridor_conflicts'], 1)
+        self.assertEqual(len(cache.map_ids), 1)
+        self.assertEqual(len(enhanced.mdds), 1)
+
+    def test_focal_astar(self):
+        constraints = ConstraintTable([Node(1, 0, 1), Node(1, 0, 2), Node(0, 1, 1)])
+        solver = FocalAstarSolver(constraints, 3, Node(0, 0, 0), Node(2, 0, 0), weight=1)
+        self.assertEqual(solver.run(1000), [(0, 0), (0, 0), (0, 0), (1, 0), (2, 0)])
+        self.assertEqual(solver.lower_bound, 4)
+        # cells of other agent cost one conflict each, longer path around them fits into bound
+        solver = FocalAstarSolver(ConstraintTable(), 3, Node(0, 0, 0), Node(2, 0, 0), weight=2)
+        solver.set_conflict_counter(lambda x, y, t, from_x, from_y: int(y == 0 and x == 1))
+        path = solver.run(1000)
+        self.assertNotIn((1, 0), path)
+        self.assertLessEqual(len(path) - 1, 2 * solver.lower_bound)
+
+    def test_ecbs_bound(self):
+        for i in range(1, 8):
+            instance = load_txt(f'tests/0{i}.txt')
+            optimal = HighLevel()
+            optimal.load_instance(instance)
+            cost = sum(len(path) - 1 for path in optimal.run(1000))
+            focal = FocalHighLevel(weight=1.5)
+            focal.load_instance(instance)
+            paths = focal.run(1000)
+            self.assertFalse(ConflictDetector(paths).get_all_conflicts())
+            self.assertLessEqual(focal.stats['lower_bound'], cost)
+            self.assertLessEqual(sum(len(path) - 1 for path in paths), 1.5 * focal.stats['lower_bound'])
+            self.assertLessEqual(focal.stats['suboptimality'], 1.5)
+
+    def test_grid_map(self):
+        grid_map = GridMap(4, 2, frozenset({(1, 0)}))
+        self.assertEqual(grid_map.cell(3, 1), 7)
+        self.assertEqual(grid_map.coords(7), (3, 1))
+        self.assertEqual(sorted(grid_map.neighbours(grid_map.cell(1, 1))), [4, 6])
+        self.assertEqual(grid_map.moves[grid_map.cell(1, 0)], ())
+        self.assertEqual(grid_map.moves[0], (0, 4))
+        self.assertEqual(list(grid_map.distances((3, 0))), list(backward_bfs(4, 2, frozenset({(1, 0)}), (3, 0))))
+        solver = SpaceTimeAstarSolver(ConstraintTable(), 4, Node(0, 0, 0), Node(3, 0, 0), grid_map=grid_map)
+        path = solver.run(1000)
+        self.assertEqual((len(path), path[1], path[-1]), (6, (0, 1), (3, 0)))
+        wide = Instance('wide', 5, 1, frozenset(), [Node(0, 0, 0), Node(4, 0, 0)], [Node(2, 0, 0), Node(3, 0, 0)])
+        result = benchmark.solve_instance(wide, 'cbs', 10, 100)
+        self.assertEqual((result['success'], result['sum_of_costs']), (True, 3))
+
+    def test_search_context(self):
+        context = SearchContext(4)
+        context.set(2, 5, 1)
+        self.assertTrue(context.is_reached(2))
+        self.assertEqual((context.g[2], context.parent[2]), (5, 1))
+        context.reset()
+        self.assertFalse(context.is_reached(2))
+
+    def test_space_time_astar_replan(self):
+        solver = SpaceTimeAstarSolver(ConstraintTable(), 5, Node(0, 2, 0), Node(4, 2, 0))
+        path = solver.run(1000)
+        tree = solver.last_tree
+        for constraint in (Node(*path[2], 2), (Node(*path[1], 1), Node(*path[2], 2)), [Node(4, 2, 4), Node(4, 2, 5)]):
+            constraints = ConstraintTable([constraint] if not isinstance(constraint, list) else constraint)
+            solver.change_config(Node(0, 2, 0), Node(4, 2, 0), constraints)
+            path = solver.replan(tree, constraint, 1000)
+            replanned = solver.expanded
+            # search continues as search from scratch would, so ties are broken in the same way
+            self.assertEqual(path, solver.run(1000))
+            self.assertLessEqual(replanned, solver.expanded)
+            for t, cell in enumerate(path):
+                self.assertFalse(constraints.is_constrained(cell, t))
+        self.assertEqual(len(path), 7)
+
+    def test_incremental_cbs_keeps_optimal_cost(self):
+        for name in ('tests/03.txt', 'tests/05.txt'):
+            instance = load_txt(name)
+            high = HighLevel()
+            high.load_instance(instance)
+            incremental = HighLevel(incremental=True)
+            incremental.load_instance(instance)
+            paths = incremental.run(1000)
+            self.assertFalse(ConflictDetector(paths).get_all_conflicts())
+            self.assertEqual(paths, high.run(1000))
+            self.assertEqual(incremental.stats['ct_nodes_expanded'], high.stats['ct_nodes_expanded'])
+            self.assertLessEqual(incremental.stats['low_level_expansions'], high.stats['low_level_expansions'])
+            self.assertTrue(incremental.search_trees)
+
+    def test_prioritized_planning(self):
+        instance = load_txt('tests/05.txt')
+        planner = PrioritizedPlanner(GridMap(instance.width, instance.height, instance.obstacles),
+                                     instance.starts, instance.goals)
+        paths = planner.plan()
+        self.assertFalse(ConflictDetector(paths).get_all_conflicts())
+        self.assertEqual([path[-1] for path in paths], [goal.coords() for goal in instance.goals])
+        # the second agent waits for the first one, which crosses its goal
+        grid_map = GridMap(3, 1)
+        paths = PrioritizedPlanner(grid_map, [Node(0, 0, 0), Node(2, 0, 0)], [Node(2, 0, 0), Node(1, 0, 0)]).plan()
+        self.assertFalse(paths)
+
+    def test_anytime_solver(self):
+        instance = load_txt('tests/03.txt')
+        high = HighLevel()
+        high.load_instance(instance)
+        progresses = []
+        result = AnytimeSolver(high, interval=0).solve(10, callback=progresses.append)
+        self.assertEqual((result.status, progresses[0].source), ('solved', 'prioritized'))
+        self.assertEqual(result.lower_bound, result.cost)
+        self.assertEqual(sum(map(len, result.paths)), sum(map(len, high.run(1000))))
+        cancel = threading.Event()
+        cancel.set()
+        self.assertEqual(AnytimeSolver(high).solve(10, cancel=cancel).status, 'cancelled')
+        self.assertTrue(high.stats['cancelled'])
+        # search that runs out of time leaves the refinement its share of the budget
+        rng = random.Random(1)
+        cells = [(x, y) for x in range(16) for y in range(16)]
+        obstacles = frozenset(rng.sample(cells, 40))
+        free = [cell for cell in cells if cell not in obstacles]
+        starts, goals = ([Node(x, y, 0) for x, y in rng.sample(free, 30)] for _ in range(2))
+        high.load_instance(Instance('crowded', 16, 16, obstacles, starts, goals))
+        anytime = AnytimeSolver(high, refine=True, refine_share=0.5)
+        result = anytime.solve(1)
+        self.assertEqual((result.status, result.source), ('timeout', 'lns'))
+        self.assertLess(high.stats['wall_time'], 0.6)
+        self.assertGreater(anytime.lns.stats['iterations'], 0)
+
+    def test_root_and_low_level_searches_stop_at_deadline(self):
+        starts = [Node(x, 0, 0) for x in range(0, 64, 2)]
+        goals = [Node(63 - x, 63, 0) for x in range(0, 64, 2)]
+        instance = Instance('open', 64, 64, frozenset(), starts, goals)
+        for solver in (HighLevel(), FocalHighLevel(1.5), PriorityBasedHighLevel()):
+            solver.load_instance(instance)
+            self.assertFalse(solver.run(1000, 1e-9))
+            self.assertTrue(solver.stats['timeout'])
+            self.assertEqual(solver.stats['ct_nodes_expanded'], 0)
+            self.assertIsNone(solver.solver.deadline)
+        cancel = threading.Event()
+        cancel.set()
+        constraints = ConstraintTable()
+        constraints.add(Node(8, 8, 300))  # agent waits long before it may stay at goal
+        for solver_class in (SpaceTimeAstarSolver, FocalAstarSolver):
+            low_level = solver_class(constraints, 16, Node(0, 0, 0), Node(8, 8, 0))
+            low_level.cancel = cancel
+            self.assertFalse(low_level.run(99999))
+            self.assertEqual(low_level.expanded, 1024)
+            low_level.cancel = None
+            self.assertEqual(len(low_level.run(99999)), 302)
+
+    def test_prioritized_and_priority_based_search(self):
+        for name in ['tests/03.txt', 'tests/05.txt']:
+            instance = load_txt(name)
+            high = HighLevel()
+            high.load_instance(instance)
+            optimal = sum(map(len, high.run(1000)))
+            for solver in (PrioritizedHighLevel(), PriorityBasedHighLevel()):
+                solver.load_instance(instance)
+                paths = solver.run(1000, 10)
+                self.assertFalse(ConflictDetector(paths).get_all_conflicts())
+                self.assertGreaterEqual(sum(map(len, paths)), optimal)
+                self.assertGreaterEqual(solver.stats['suboptimality'], 1.0)
+                self.assertLessEqual(solver.stats['lower_bound'], optimal - len(paths))
+                self.assertGreater(solver.stats['low_level_expansions'], 0)
+        node = PriorityNode([[(0, 0)], [(1, 1)], [(2, 2)]], [frozenset()] * 3)
+        node = PriorityNode(node.paths, node.add_priority(0, 1))
+        node = PriorityNode(node.paths, node.add_priority(1, 2))
+        self.assertEqual(node.higher, [frozenset(), {0}, {0, 1}])
+        self.assertIsNone(node.add_priority(2, 0))
+
+    def test_constraint_table_add_path(self):
+        path = [(0, 0), (1, 0), (1, 0), (1, 1)]
+        table = ConstraintTable()
+        table.cell_ids(4)
+        table.add_path(path, 5)
+        expected = ConstraintTable([Node(x, y, t) for t, (x, y) in enumerate(path)] +
+                                   [(Node(*path[t], t - 1), Node(*path[t - 1], t)) for t in (1, 3)] +
+                                   [Node(1, 1, t) for t in (4, 5)])
+        self.assertEqual((table.vertex, table.edge, table.last_vertex),
+                         (expected.vertex, expected.edge, expected.last_vertex))
+        self.assertEqual(table.cell_ids(4), expected.cell_ids(4))
+        self.assertEqual(table.max_timestep, 5)
+
+    def test_large_neighborhood_search(self):
+        instance = load_txt('tests/05.txt')
+        high = HighLevel()
+        high.load_instance(instance)
+        optimal = sum(len(path) - 1 for path in high.run(1000))
+        # agent 0 waits 4 steps at its start
+        paths = PrioritizedPlanner(high.grid_map, instance.starts, instance.goals).plan()
+        paths[0] = paths[0][:1] * 4 + paths[0]
+        self.assertFalse(ConflictDetector(paths).count_conflicts())
+        lns = LargeNeighborhoodSearch(high.grid_map, instance.starts, instance.goals, neighborhood_size=2)
+        for operator in OPERATORS:
+            self.assertTrue(1 <= len(lns.choose_neighborhood(operator, paths)) <= 2)
+        cost = lns.get_cost(paths)
+        improved = lns.improve(paths, 10, max_iterations=200)
+        self.assertFalse(ConflictDetector(improved).count_conflicts())
+        self.assertLess(lns.get_cost(improved), cost)
+        self.assertGreaterEqual(lns.get_cost(improved), optimal)
+        self.assertEqual(lns.log[0], (0.0, 0, cost))
+        self.assertEqual(lns.log[-1][2], lns.stats['cost'])
+        self.assertEqual(lns.stats['iterations'], sum(lns.stats['operators'].values()))
+        with ParallelPlanner(high.grid_map, instance.starts, instance.goals, 2) as pool:
+            replanned = pool.replan(Plan.from_paths(paths, high.grid_map.width, high.grid_map.height), [[1, 0], [2]])
+        self.assertEqual(replanned, [(lns.planner.replan(paths, [1, 0]), lns.planner.expanded),
+                                     (lns.planner.replan(paths, [2]), lns.planner.expanded)])
+        parallel = LargeNeighborhoodSearch(high.grid_map, instance.starts, instance.goals, neighborhood_size=2,
+                                           workers=2)
+        improved = parallel.improve(paths, 10, max_iterations=50)
+        self.assertFalse(ConflictDetector(improved).count_conflicts())
+        self.assertLess(parallel.get_cost(improved), cost)
+
+    def test_instrumentation(self):
+        instance = load_txt('tests/05.txt')
+        high = HighLevel()
+        high.load_instance(instance)
+        expected = high.run(1000)
+        with Instrumentation(trace=True).attach(high) as instrumentation:
+            self.assertIn('plan_path', high.__dict__)
+            self.assertEqual(high.run(1000), expected)
+        self.assertNotIn('plan_path', high.__dict__)
+        report = instrumentation.report()
+        self.assertEqual(report['counters']['low_level_expanded'], high.stats['low_level_expansions'])
+        self.assertGreaterEqual(report['counters']['low_level_generated'], report['counters']['low_level_expanded'])
+        self.assertEqual(report['timers']['high_level_expansion']['calls'], high.stats['ct_nodes_expanded'])
+        self.assertEqual(report['timers']['low_level_search']['calls'], report['counters']['low_level_searches'])
+        self.assertGreaterEqual(report['peaks']['open_list'], 1)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'trace.json')
+            save_trace(path, [('05', instrumentation)])
+            with open(path, encoding='utf-8') as file:
+                data = json.load(file)
+        self.assertEqual(data['runs'][0]['label'], '05')
+        self.assertEqual(len(data['traceEvents']), sum(x['calls'] for x in report['timers'].values()) + 1)
+        for solver in (PrioritizedHighLevel(), PriorityBasedHighLevel()):
+            solver.load_instance(instance)
+            with Instrumentation(trace_memory=True).attach(solver) as instrumentation:
+                solver.run(1000)
+            report = instrumentation.report()
+            self.assertEqual(report['counters']['low_level_expanded'], solver.stats['low_level_expansions'])
+            self.assertGreaterEqual(report['timers']['low_level_search']['calls'], len(instance.starts))
+            self.assertGreater(report['peaks']['traced_bytes'], 0)
+            self.assertNotIn('plan_agent', solver.prioritized.__dict__)
+
+    def test_frame_renderer(self):
+        grid_map = GridMap(4, 3, frozenset({(3, 2)}))
+        paths = [[(0, 0), (1, 0), (2, 0)], [(0, 2), (0, 2), (0, 2)], [(1, 1)]]
+        goals = [Node(2, 0, 0), Node(0, 2, 0), Node(1, 1, 0)]
+        renderer = FrameRenderer(grid_map, paths, goals, cell_size=10, fps=4, step_time=1)
+        self.assertEqual(renderer.size, (40, 30))
+        self.assertEqual(renderer.get_frame_count(), 9)
+        self.assertEqual(renderer.get_positions(0.5).tolist(), [[7, 2], [2, 22], [12, 12]])
+        self.assertEqual(renderer.background.get_at((35, 25))[:3], (90, 90, 90))
+        renderer.draw(0)
+        # only the moving agent is redrawn, its old and new square
+        self.assertEqual(len(renderer.draw(0.25)), 2)
+        self.assertEqual(renderer.surface.get_at((3, 6))[:3], renderer.background.get_at((3, 6))[:3])
+        self.assertEqual(renderer.surface.get_at((8, 6))[:3], (255, 0, 0))
+        with tempfile.TemporaryDirectory() as directory:
+            frames = export(grid_map, paths, goals, os.path.join(directory, 'frames', 'run.png'), 10, 4, 1)
+            self.assertEqual(frames, 9)
+            self.assertEqual(len(os.listdir(os.path.join(directory, 'frames'))), 9)
+
+    def test_viewer(self):
+        grid_map = GridMap(100, 50)
+        paths = [[(x, 10), (x + 1, 10), (x + 2, 10)] for x in range(0, 100, 10)]
+        goals = [Node(x + 2, 10, 0) for x in range(0, 100, 10)]
+        viewer = Viewer(grid_map, paths, goals, width=400, height=232)
+        self.assertEqual((viewer.zoom, viewer.offset), (4.0, [0.0, 0.0]))
+        self.assertEqual(viewer.draw(), 10)
+        # cell under the cursor stays under it
+        viewer.zoom_at(2, (100, 40))
+        self.assertEqual(viewer.to_cell(100, 40), (25.0, 10.0))
+        self.assertEqual(viewer.get_visible_cells(), (12, 5, 63, 30))
+        self.assertEqual(viewer.draw(), 5)
+        bar = viewer.get_timeline_rect()
+        event = pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=(bar.centerx, bar.centery))
+        self.assertTrue(viewer.handle_event(event))
+        self.assertAlmostEqual(viewer.time, 1.0)
+        viewer.handle_event(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_RIGHT))
+        self.assertEqual(viewer.time, 2.0)
+        self.assertFalse(viewer.handle_event(pygame.event.Event(pygame.QUIT)))
+        pygame.quit()
+        colors = get_agent_colors(1000)
+        self.assertEqual(len(set(colors)), 1000)
+
+    def test_plan_archive(self):
+        paths = [[(0, 0), (1, 0), (2, 0)], [(3, 2)], [(0, 2), (0, 1)]]
+        plan = Plan.from_paths(paths, 4, 3, 'small')
+        self.assertEqual(plan.cells.dtype, np.uint16)
+        # rows are timesteps, finished agents stay at their goals
+        self.assertEqual(plan.cells.tolist(), [[0, 11, 8], [1, 11, 4], [2, 11, 4]])
+        self.assertEqual((len(plan), plan.makespan, plan.get_sum_of_costs()), (3, 2, 3))
+        self.assertEqual(plan.to_paths(), paths)
+        self.assertEqual(plan.get_positions(1).tolist(), [[1, 0], [3, 2], [0, 1]])
+        self.assertEqual([goal.coords() for goal in plan.get_goals()], [(2, 0), (3, 2), (0, 1)])
+        self.assertEqual(Plan.from_paths(paths, 300, 300).cells.dtype, np.uint32)
+        with tempfile.TemporaryDirectory() as directory:
+            plan.save(os.path.join(directory, 'small.npz'))
+            loaded = load_plan(os.path.join(directory, 'small.npz'))
+            self.assertEqual((loaded.name, loaded.width, loaded.to_paths()), ('small', 4, paths))
+
+            archive = PlanArchive(os.path.join(directory, 'plans'))
+            archive.add('cbs/small', paths, 4, 3)
+            archive.add('pp/small', plan)
+            archive.add('cbs/small', paths[:2], 4, 3)
+            archive = PlanArchive(os.path.join(directory, 'plans'))
+            self.assertEqual(sorted(archive), ['cbs/small', 'pp/small'])
+            opened = open_plan(os.path.join(directory, 'plans'), 'cbs/small')
+            self.assertIsInstance(opened.cells, np.memmap)
+            self.assertEqual(list(opened), paths[:2])
+            self.assertRaises(KeyError, lambda: archive['ecbs/small'])
+
+            # viewer reads only the shown timesteps of lazily opened plan
+            viewer = Viewer(GridMap(4, 3), archive['pp/small'], plan.get_goals(), width=40, height=62)
+            viewer.set_time(0.5)
+            self.assertEqual(viewer.draw(), 3)
+            pygame.quit()
+            renderer = FrameRenderer(GridMap(4, 3), opened, plan.get_goals()[:2], cell_size=10, fps=2, step_time=1)
+            self.assertIsInstance(renderer.positions, PositionView)
+            self.assertEqual(renderer.get_positions(0.5).tolist(), [[7, 2], [32, 22]])
+
+            instance = Instance('small', 5, 3, frozenset({(4, 0), (2, 2)}), [Node(0, 0, 0), Node(1, 1, 0)],
+                                [Node(3, 2, 0), Node(0, 1, 0)])
+            save_npz(instance, os.path.join(directory, 'small.npz'))
+            loaded = load_npz(os.path.join(directory, 'small.npz'))
+            self.assertEqual((loaded.name, loaded.width, loaded.height, loaded.obstacles),
+                             ('small', 5, 3, instance.obstacles))
+            self.assertEqual([x.coords() for x in loaded.goals], [(3, 2), (0, 1)])
+            instances = load_instances([os.path.join(directory, 'small.npz')], [1, 2])
+            self.assertEqual([x.name for x in instances], ['small:1', 'small:2'])
+            result = benchmark.solve_instance(instance, 'cbs', 10, 100, archive=archive)
+            self.assertEqual(archive['cbs/small'].get_sum_of_costs(), result['sum_of_costs'])
+
+    def test_plan_validator(self):
+        grid_map = GridMap(4, 3, frozenset({(3, 2)}))
+        starts = [Node(0, 0, 0), Node(2, 0, 0), Node(0, 2, 0)]
+        goals = [Node(2, 0, 0), Node(0, 0, 0), Node(1, 1, 0)]
+        validator = PlanValidator(grid_map, starts, goals)
+        valid = [[(0, 0), (0, 1), (0, 2), (1, 2), (2, 2), (2, 1), (2, 0)], [(2, 0), (1, 0), (0, 0)],
+                 [(0, 2), (1, 2), (1, 1)]]
+        self.assertEqual(validator.validate(valid, 10, 6), [])
+        self.assertEqual((validator.stats['sum_of_costs'], validator.stats['makespan']), (10, 6))
+        # agent 2 waits at its goal when agent 0 enters it
+        paths = [[(0, 0), (0, 1), (0, 1), (1, 1), (2, 0), (2, 0)], [(2, 0), (1, 0), (0, 0)], [(0, 2), (0, 1), (1, 1)]]
+        self.assertEqual([str(x) for x in validator.validate(paths, sum_of_costs=8)],
+                         ['cost claimed 8, real 9', 'vertex t=1 agents=[0, 2] cell=(0, 1)',
+                          'move t=3 agents=[0] cell=(1, 1) to (2, 0)', 'goal_conflict t=3 agents=[0, 2] cell=(1, 1)'])
+        paths = [[(0, 0), (1, 0), (2, 0)], [(2, 0), (1, 0), (0, 0)], [(0, 2), (1, 2), (1, 1)]]
+        self.assertEqual([(x.kind, x.timestep, x.agents) for x in validator.validate(paths)],
+                         [('vertex', 1, (0, 1))])
+        paths = [[(0, 0), (0, 0), (1, 0), (2, 0)], [(2, 0), (1, 0), (0, 0)], [(0, 2), (1, 2), (1, 1)]]
+        self.assertEqual(validator.validate(paths), [Violation('edge', 1, (0, 1), (0, 0), 'to (1, 0)')])
+        paths = [[(1, 0), (2, 0)], [(2, 0), (3, 0), (4, 0), (3, 1), (3, 2), (2, 2), (1, 2), (1, 1), (1, 0), (0, 0)]]
+        self.assertEqual([str(x) for x in validator.validate(paths)],
+                         ['agents 2 paths for 3 agents', 'start t=0 agents=[0] cell=(1, 0) start is (0, 0)',
+                          'off_map t=2 agents=[1] cell=(4, 0)', 'obstacle t=4 agents=[1] cell=(3, 2)'])
+        # plan read in chunks of two timesteps gives the same violations
+        paths = [[(0, 0), (0, 0), (1, 0), (2, 0)], [(2, 0), (1, 0), (0, 0)], [(0, 2), (1, 2), (1, 1)]]
+        validator.chunk_size = 6
+        self.assertEqual(validator.validate(Plan.from_paths(paths, 4, 3)), [Violation('edge', 1, (0, 1), (0, 0),
+                                                                                        'to (1, 0)')])
+        instance = Instance('small', 4, 3, frozenset({(3, 2)}), starts, goals)
+        self.assertTrue(PlanValidator.from_instance(instance).is_valid(valid))
+        self.assertEqual(benchmark.solve_instance(instance, 'cbs', 10, 100)['violations'], 0)
+
     def test_creating_children_ctnodes(self):
         high = HighLevel()
         high.grid_size = 5
@@ -0,0 +1,61 @@
+"""Checks plans saved by benchmark.py --save-plans or Plan.save without solving anything
+
+Usage:
+    python validate.py tests/05.txt --plan plans/
+    python validate.py maps/random.scen --agents 100 500 1000 --solver pp --plan plans/ --output violations.json
+"""
+import argparse
+import json
+import sys
+from benchmark import SOLVERS
+from Instance import load_instances
+from PlanArchive import open_plan
+from GridMap import GridMap
+from PlanValidator import PlanValidator
+
+
+def parse_args(argv):
+    """Parses command line arguments"""
+    parser = argparse.ArgumentParser(description='Validation of MAPF plans')
+    parser.add_argument('instances', nargs='+', help='tests/NN.txt, MovingAI .scen or .npz files')
+    parser.add_argument('--plan', required=True, help='.npz plan or directory with plans saved by benchmark')
+    parser.add_argument('--solver', choices=sorted(SOLVERS), default='cbs', help='solver whose plans are checked')
+    parser.add_argument('--agents', type=int, nargs='+', help='numbers of agents taken from every .scen file')
+    parser.add_argument('--map-dir', help='directory with .map files, default is directory of .scen file')
+    parser.add_argument('--limit', type=int, default=20, help='violations printed per plan')
+    parser.add_argument('--output', help='.json file with all violations of every plan')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Entry point of command line interface, returns exit code"""
+    args = parse_args(argv)
+    report = {}
+    grid_maps = {}  # instances with different numbers of agents share their map
+    for instance in load_instances(args.instances, args.agents, args.map_dir):
+        try:
+            plan = open_plan(args.plan, f"{args.solver}/{instance.name}")
+        except KeyError as error:
+            print(error.args[0], file=sys.stderr)
+            report[instance.name] = None
+            continue
+        key = (instance.width, instance.height, instance.obstacles)
+        if key not in grid_maps:
+            grid_maps[key] = GridMap(*key)
+        validator = PlanValidator.from_instance(instance, grid_maps[key])
+        violations = validator.validate(plan)
+        report[instance.name] = [x.to_dict() for x in violations]
+        stats = validator.stats
+        status = 'valid' if not violations else f'{len(violations)} violations'
+        print(f"{instance.name:<30} {status:<16} soc={stats['sum_of_costs']} makespan={stats['makespan']} "
+              f"{stats['wall_time']:.3f}s")
+        for violation in violations[:args.limit]:
+            print(f"    {violation}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=1)
+    return 0 if all(x == [] for x in report.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())